@@ -0,0 +1,88 @@
+"""
+Время сериализации ответа /api/robot/data/all: прежний путь через
+response_model (проверка и копирование каждого элемента pydantic, затем
+json или orjson) против прямой записи массивов NumPy (ArrayJSONResponse).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_serialization [--points 10000] [--repeat 5]
+"""
+
+import argparse
+import time
+
+import numpy as np
+from fastapi.responses import ORJSONResponse
+from starlette.responses import JSONResponse
+
+from python_simulation_engine.models import AllDataResponse
+from python_simulation_engine.services.simulation_service.app import (
+    ELECTRICAL_CHANNELS,
+    MECHANICAL_CHANNELS,
+    TRAJECTORY_CHANNELS,
+)
+from python_simulation_engine.shared.app_factory import ArrayJSONResponse
+
+
+def make_payload(points: int) -> dict:
+    """Ответ /data/all с points отсчётами в каждом канале"""
+    rng = np.random.default_rng(0)
+    time_array = np.arange(points) * 1e-3
+
+    def group(channels):
+        return {"time": time_array, **{key: np.cumsum(rng.normal(size=points)) * 1e-2 for key in channels}}
+
+    quality = {"errors": [0.01] * 8, "avg_error": 0.01, "median_error": 0.01,
+               "regulation_times": [0.2] * 8, "avg_reg_time": 0.2, "median_reg_time": 0.2}
+    cyclogram = {key: [0.0] * 9 for key in ("cyclogram_x", "cyclogram_y", "cyclogram_t", "cyclogram_q1", "cyclogram_q2")}
+    return {
+        "success": True,
+        "trajectory": {**group(TRAJECTORY_CHANNELS), **cyclogram},
+        "electrical": group(ELECTRICAL_CHANNELS),
+        "mechanical": group(MECHANICAL_CHANNELS),
+        "quality_link_1": quality,
+        "quality_link_2": quality,
+    }
+
+
+def via_model(response_class):
+    """Путь FastAPI с response_model: проверка, копия в Python, затем кодирование"""
+    def serialize(payload):
+        content = AllDataResponse.model_validate(payload).model_dump(mode="json")
+        return response_class(content).body
+    return serialize
+
+
+SERIALIZERS = {
+    "response_model + json": via_model(JSONResponse),
+    "response_model + orjson": via_model(ORJSONResponse),
+    "ArrayJSONResponse": lambda payload: ArrayJSONResponse(payload).body,
+}
+
+
+def best_time(serialize, payload, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        serialize(payload)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--points", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    payload = make_payload(args.points)
+    size = len(ArrayJSONResponse(payload).body)
+    print(f"{args.points} отсчётов на канал, ответ {size / 1e6:.1f} МБ, лучшее из {args.repeat}")
+    baseline = None
+    for name, serialize in SERIALIZERS.items():
+        elapsed = best_time(serialize, payload, args.repeat)
+        baseline = baseline or elapsed
+        print(f"{name:<26} {elapsed * 1e3:8.1f} мс  x{baseline / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Интегрирование динамики робота методами scipy.integrate.solve_ivp
+с адаптивным шагом — неявными методами Radau и BDF.
+
+Это эталонный расчёт с контролем погрешности (ADAPTIVE_RTOL, ADAPTIVE_ATOL)
+для проверки шага метода Эйлера, а не способ ускорить расчёт: на циклограмме
+60 с из 9 точек он в 10-20 раз медленнее (Декартовый — 4,5 с против 0,44 с,
+СКАРА — 9-13 с против 0,7 с). Причина — звено запаздывания ускорения
+с постоянной 1 мс: оно делает систему жёсткой. Убрать его, считая ускорение
+из уравнения J a = M_ed - filter(M(a)), нельзя: у фильтра СКАРА бывает
+несколько устойчивых корней, и пошаговый цикл выбирает между ними
+по ускорению предыдущего шага. Явные методы (RK45 и т.п.) не предлагаются:
+на жёсткой системе они дробят шаг ещё сильнее.
+
+Непрерывная модель повторяет шаговый цикл TrajectoryCalculator.robot_function:
+- дифференциальный канал ПИД — производная ошибки (-W) с тем же ограничением ±10;
+- запаздывание ускорения на один шаг в расчёте момента нагрузки заменено
+  апериодическим звеном с постоянной времени, равной эталонному шагу 1 мс;
+- выход звена за границу — событие: координата фиксируется на границе,
+  скорость и ускорение обнуляются, звено стоит, пока привод толкает наружу;
+- точки циклограммы — разрывы задающего воздействия: каждый участок
+  интегрируется отдельно.
+Результаты выдаются на равномерной сетке участков циклограммы с шагом
+integration_dt * output_decimation; шаг интегратора от неё не зависит,
+поэтому integration_dt задаёт только шаг вывода. Произвольные моменты
+времени вывода не поддерживаются.
+"""
+
+from types import SimpleNamespace
+from typing import Dict, List, Sequence
+
+import numpy as np
+from scipy.integrate import solve_ivp
+
+from python_simulation_engine.dynamics import (
+    LINK_CHANNELS,
+    excess_fluctuation_filter,
+    load_moments,
+    safe_divide,
+)
+
+
+ADAPTIVE_METHODS = ("Radau", "BDF")
+ADAPTIVE_RTOL = 1e-6
+ADAPTIVE_ATOL = 1e-9
+ACCELERATION_LAG = 1e-3  # Постоянная времени запаздывания ускорения, с
+RELEASE_THRESHOLD = 1e-6  # Ускорение привода внутрь зоны, при котором звено снимается с границы
+RELEASE_OFFSET = 1e-9  # Отступ от границы при снятии звена, чтобы событие границы не сработало сразу
+MAX_STALLED_EVENTS = 100  # Событий подряд без продвижения по времени — дребезг на границе
+K_U = 1
+T_U = 0.07
+
+# Строки вектора состояния: по две (звено 1, звено 2) на величину
+Q, W, U, I_A, INTEGRAL, A_LAG = (slice(2 * i, 2 * i + 2) for i in range(6))
+STATE_SIZE = 12
+
+
+class _Model:
+    """Правая часть системы и выходные каналы при фиксированных
+    задающих воздействиях и состоянии фиксации звеньев на границах"""
+
+    def __init__(self, robot_type: str, p: SimpleNamespace, q_input: np.ndarray, locks: np.ndarray):
+        self.robot_type = robot_type
+        self.p = p
+        self.q_input = q_input
+        self.locks = locks  # (2, 1): 0 — свободно, -1 — на нижней границе, +1 — на верхней
+        self.Ra_nonzero = p.Ra != 0
+        self.Ra_safe = np.where(self.Ra_nonzero, p.Ra, 1)
+        self.J_nonzero = p.J != 0
+        self.J_safe = np.where(self.J_nonzero, p.J, 1)
+        self.inv_T_I = safe_divide(1, p.T_e)
+
+    def evaluate(self, y: np.ndarray):
+        """Производные состояния и выходные каналы для столбцов y (12, k)"""
+        p = self.p
+        q, W_, U_, I_a, integral, a_lag = y[Q], y[W], y[U], y[I_A], y[INTEGRAL], y[A_LAG]
+        locked = self.locks != 0
+
+        q_error = self.q_input - q
+        differential = np.minimum(np.maximum(p.Kd * -W_, -10), 10)
+        SAU_SUM = p.Kp * q_error + integral + differential
+
+        U_need = np.minimum(SAU_SUM * K_U, p.Umax)
+        U_changed = U_ - W_ * p.Ce * p.Fi
+        nI_Ra = np.where(self.Ra_nonzero, U_changed / self.Ra_safe, 0)
+        M_ed = I_a * p.Cm * p.Fi
+
+        M = np.array(load_moments(self.robot_type, p, q[0], q[1], W_[0], W_[1], a_lag[0], a_lag[1]))
+        M = excess_fluctuation_filter(self.robot_type, M_ed, M)
+        M_ed_corrected = M_ed - M
+        a_w = np.where(self.J_nonzero, M_ed_corrected / self.J_safe, 0)
+        a_drive = a_w
+        a_w = np.where(locked, 0, a_w)
+
+        dydt = np.empty_like(y)
+        dydt[Q] = np.where(locked, 0, W_)
+        dydt[W] = a_w
+        dydt[U] = (U_need - U_) * (1 / T_U)
+        dydt[I_A] = (nI_Ra - I_a) * self.inv_T_I
+        dydt[INTEGRAL] = p.Ki * q_error
+        dydt[A_LAG] = (a_w - a_lag) * (1 / ACCELERATION_LAG)
+
+        channels = (q_error, SAU_SUM, U_, U_changed, I_a, M_ed, M, M_ed_corrected, a_w, W_, q)
+        return dydt, channels, a_drive
+
+    def rhs(self, t, y):
+        column = y.reshape(STATE_SIZE, -1)
+        return self.evaluate(column)[0].reshape(y.shape)
+
+    def drive(self, y: np.ndarray, link: int) -> float:
+        """Ускорение, которое развивал бы привод звена без фиксации"""
+        return float(self.evaluate(y.reshape(STATE_SIZE, 1))[2][link, 0])
+
+
+def _limit_event(link: int, limit: float, direction: int):
+    """Событие выхода звена за границу"""
+    def event(t, y):
+        return y[Q][link] - limit
+    event.terminal = True
+    event.direction = direction
+    return event
+
+
+def _release_margin(model: _Model, y: np.ndarray, link: int, side: int) -> float:
+    """Отрицательно, когда привод тянет зафиксированное звено внутрь зоны сильнее порога"""
+    return side * model.drive(y, link) + RELEASE_THRESHOLD
+
+
+def _release_event(model: _Model, link: int, side: int):
+    """Событие: привод зафиксированного звена начал тянуть его внутрь зоны"""
+    def event(t, y):
+        return _release_margin(model, y, link, side)
+    event.terminal = True
+    event.direction = -1
+    return event
+
+
+def _lock(y: np.ndarray, locks: np.ndarray, link: int, side: int, limit: float):
+    """Зафиксировать звено на границе: координата = граница, скорость и ускорение = 0"""
+    y[Q][link] = limit
+    y[W][link] = 0
+    y[A_LAG][link] = 0
+    locks[link, 0] = side
+
+
+def _release(y: np.ndarray, locks: np.ndarray, link: int):
+    """Снять звено с границы, отступив от неё внутрь рабочей зоны"""
+    y[Q][link] -= locks[link, 0] * RELEASE_OFFSET
+    locks[link, 0] = 0
+
+
+def _settle_locks(model: _Model, y: np.ndarray, locks: np.ndarray):
+    """Зафиксировать звенья за границами и освободить те,
+    которые привод уже тянет внутрь рабочей зоны"""
+    p = model.p
+    for link in range(2):
+        if y[Q][link] < p.q_min[link, 0]:
+            _lock(y, locks, link, -1, p.q_min[link, 0])
+        elif y[Q][link] > p.q_max[link, 0]:
+            _lock(y, locks, link, 1, p.q_max[link, 0])
+    for link in range(2):
+        side = locks[link, 0]
+        if side and _release_margin(model, y, link, side) < 0:
+            _release(y, locks, link)
+
+
+def integrate_adaptive(method: str, robot_type: str, p: SimpleNamespace,
+                       q1: Sequence[float], q2: Sequence[float],
+                       segments: List[np.ndarray], decimation: int = 1) -> Dict[str, np.ndarray]:
+    """Рассчитать динамику решателем solve_ivp.
+
+    p — параметры одного сценария (dynamics.collect_parameters),
+    segments — моменты времени шагов по участкам циклограммы; на выход
+    попадает каждый decimation-й из них (сквозная нумерация).
+    Возвращает те же каналы, что и TrajectoryCalculator.robot_function.
+    """
+    if method not in ADAPTIVE_METHODS:
+        raise ValueError(f"Неизвестный метод интегрирования: {method}")
+
+    grids, offset = [], 0
+    for steps in segments:
+        grids.append(steps[-offset % decimation::decimation])
+        offset += len(steps)
+    total_steps = sum(len(grid) for grid in grids)
+    buffer = np.empty((len(LINK_CHANNELS), 2, total_steps))
+    result = {'output_time_array': np.concatenate(grids) if grids else np.empty(0)}
+    for index, (name_1, name_2) in enumerate(LINK_CHANNELS):
+        result[name_1] = buffer[index, 0]
+        result[name_2] = buffer[index, 1]
+
+    y = np.zeros(STATE_SIZE)
+    locks = np.zeros((2, 1), dtype=int)
+    time_start = 0.0
+    stalled = 0
+    k = 0
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for i, (steps, grid) in enumerate(zip(segments, grids)):
+            if not len(steps):
+                continue
+            q_input = np.array([[q1[i]], [q2[i]]], dtype=float)
+            time_stop = float(steps[-1])
+
+            while True:
+                # Модель держит свою копию locks: события ссылаются на неё
+                _settle_locks(_Model(robot_type, p, q_input, locks), y, locks)
+                model = _Model(robot_type, p, q_input, locks.copy())
+
+                if time_stop <= time_start:
+                    # Участок нулевой длины: записать текущее состояние
+                    buffer[:, :, k:k + len(grid)] = model.evaluate(np.repeat(y[:, None], len(grid), axis=1))[1]
+                    k += len(grid)
+                    break
+
+                events, actions = [], []
+                for link in range(2):
+                    side = locks[link, 0]
+                    if side:
+                        events.append(_release_event(model, link, side))
+                        actions.append((link, 0))
+                    else:
+                        events.append(_limit_event(link, p.q_min[link, 0], -1))
+                        events.append(_limit_event(link, p.q_max[link, 0], 1))
+                        actions.extend([(link, -1), (link, 1)])
+                # Конец участка добавляется в сетку, чтобы получить конечное состояние
+                t_eval = grid if len(grid) and grid[-1] == time_stop else np.append(grid, time_stop)
+                sol = solve_ivp(model.rhs, (time_start, time_stop), y, method=method, t_eval=t_eval,
+                                events=events, vectorized=True,
+                                rtol=ADAPTIVE_RTOL, atol=ADAPTIVE_ATOL)
+                if sol.status < 0:
+                    raise RuntimeError(f"Интегратор {method} не сошёлся: {sol.message}")
+
+                count = min(len(sol.t), len(grid))
+                if count:
+                    buffer[:, :, k:k + count] = model.evaluate(sol.y[:, :count])[1]
+                    k += count
+                    grid = grid[count:]
+
+                if sol.status == 0:
+                    y = sol.y[:, -1].copy()
+                    time_start = time_stop
+                    break
+
+                # Остановка на событии: переключить фиксацию звена и продолжить
+                event_time, index = min((times[0], index) for index, times in enumerate(sol.t_events) if len(times))
+                stalled = stalled + 1 if event_time <= time_start else 0
+                if stalled > MAX_STALLED_EVENTS:
+                    raise RuntimeError(f"Интегратор {method}: дребезг звена на границе при t={event_time}")
+                y = sol.y_events[index][0].copy()
+                time_start = float(event_time)
+                link, side = actions[index]
+                if side:
+                    _lock(y, locks, link, side, p.q_min[link, 0] if side < 0 else p.q_max[link, 0])
+                else:
+                    _release(y, locks, link)
+
+    return result
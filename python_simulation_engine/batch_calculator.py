@@ -0,0 +1,192 @@
+"""
+Пакетный расчёт динамики робота.
+Несколько наборов параметров (ПИД, двигатели, звенья) для одной циклограммы
+рассчитываются за один проход по времени: переменные состояния хранятся
+массивами формы (2, N) — по строке на звено, по столбцу на сценарий.
+"""
+
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from python_simulation_engine.dynamics import (
+    LINK_CHANNELS,
+    collect_parameters,
+    excess_fluctuation_filter,
+    load_moments,
+    safe_divide,
+)
+from python_simulation_engine.trajectory_calculator import (
+    RESULT_CHANNELS,
+    RobotState,
+    TrajectoryCalculator,
+    _cyclogram_segments,
+    _decimate,
+)
+
+
+def _stop_at_limit(outside, limit, q_output, W, a_w):
+    """Остановить звено на границе: координата = граница, скорость и ускорение = 0"""
+    if not outside.any():
+        return q_output, W, a_w
+    return np.where(outside, limit, q_output), np.where(outside, 0, W), np.where(outside, 0, a_w)
+
+
+class BatchTrajectoryCalculator:
+    """Расчёт одной циклограммы для N наборов параметров робота.
+
+    Все сценарии должны иметь одинаковые тип робота, тип управления, шаг
+    интегрирования и прореживание вывода; задающие воздействия (циклограмма,
+    сплайн или контур) берутся из base. Расчёт всегда идёт пошагово
+    (integration_method не учитывается).
+    """
+
+    def __init__(self, states: List[RobotState], base: Optional[TrajectoryCalculator] = None):
+        if not states:
+            raise ValueError("Нужен хотя бы один набор параметров")
+        robot_types = {state.robot_type for state in states}
+        control_types = {state.type_of_control for state in states}
+        if len(robot_types) != 1 or len(control_types) != 1:
+            raise ValueError("Все сценарии должны иметь одинаковый тип робота и тип управления")
+        if len({(state.integration_dt, state.output_decimation) for state in states}) != 1:
+            raise ValueError("Все сценарии должны иметь одинаковый шаг интегрирования и прореживание вывода")
+        self.states = list(states)
+        self.base = base or TrajectoryCalculator(self.states[0])
+        self.robot_type = self.states[0].robot_type
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def _parameters(self) -> SimpleNamespace:
+        """Параметры сценариев в виде массивов (см. dynamics.collect_parameters)"""
+        limits = [
+            (TrajectoryCalculator(s).get_true_q_min_max(1), TrajectoryCalculator(s).get_true_q_min_max(2))
+            for s in self.states
+        ]
+        return collect_parameters(self.states, limits)
+
+    def robot_function(self, q1: List[float], q2: List[float], t: List[float],
+                       channels: Iterable[str] = RESULT_CHANNELS) -> Dict[str, np.ndarray]:
+        """Расчёт динамики всех сценариев.
+
+        Возвращает 'output_time_array' формы (steps,) и запрошенные каналы
+        формы (N, steps). Каналы, не попавшие в channels, не сохраняются.
+        Переменные состояния имеют форму (2, N): звенья x сценарии.
+        """
+        p = self._parameters()
+        robot_type = self.robot_type
+        count = len(self.states)
+        accuracy = self.states[0].integration_dt
+        decimation = self.states[0].output_decimation
+        K_U = 1
+        T_U = 0.07
+
+        # Защита от нулевых параметров, как в скалярном цикле
+        Ra_nonzero = p.Ra != 0
+        Ra_safe = np.where(Ra_nonzero, p.Ra, 1)
+        J_nonzero = p.J != 0
+        J_safe = np.where(J_nonzero, p.J, 1)
+        inv_T_I = safe_divide(1, p.T_e)
+
+        # Переменные состояния всех сценариев
+        q_output = np.zeros((2, count))
+        U = np.zeros((2, count))
+        I_a = np.zeros((2, count))
+        a_w = np.zeros((2, count))
+        W = np.zeros((2, count))
+        q_error_prev = np.zeros((2, count))
+        Integral_channel = np.zeros((2, count))
+
+        segments = _cyclogram_segments(t, accuracy)
+        output_time = _decimate(segments, decimation)
+
+        # Буфер результатов: (величина, звено, сценарий, шаг)
+        requested = set(channels)
+        recorded = [index for index, names in enumerate(LINK_CHANNELS) if requested.intersection(names)]
+        buffer = np.empty((len(recorded), 2, count, len(output_time)))
+        result = {'output_time_array': output_time}
+        for position, index in enumerate(recorded):
+            name_1, name_2 = LINK_CHANNELS[index]
+            result[name_1] = buffer[position, 0]
+            result[name_2] = buffer[position, 1]
+
+        # Вырожденные параметры дают inf/nan так же, как скалярный цикл на np.float64
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            n = 0  # Номер шага
+            k = 0  # Номер сохранённого шага
+            for i, steps in enumerate(segments):
+                q_input = np.array([[q1[i]], [q2[i]]], dtype=float)
+
+                for _ in range(len(steps)):
+                    q_error = q_input - q_output
+
+                    # ПИД-регулятор
+                    Proportional_channel = p.Kp * q_error
+                    Integral_channel = Integral_channel + p.Ki * q_error * accuracy
+                    Differential_channel = np.minimum(np.maximum(p.Kd * ((q_error - q_error_prev) / accuracy), -10), 10)
+                    SAU_SUM = Proportional_channel + Integral_channel + Differential_channel
+                    q_error_prev = q_error
+
+                    # Расчёт напряжения
+                    U_need = np.minimum(SAU_SUM * K_U, p.Umax)
+                    U = U + (U_need * (1 / T_U) - U * (1 / T_U)) * accuracy
+                    U_changed = U - W * p.Ce * p.Fi
+
+                    # Расчёт тока и момента двигателя
+                    nI_Ra = np.where(Ra_nonzero, U_changed / Ra_safe, 0)
+                    I_a = I_a + (nI_Ra * inv_T_I - I_a * inv_T_I) * accuracy
+                    M_ed = I_a * p.Cm * p.Fi
+
+                    # Расчёт моментов звеньев
+                    M = np.array(load_moments(robot_type, p, q_output[0], q_output[1], W[0], W[1], a_w[0], a_w[1]))
+                    M = excess_fluctuation_filter(robot_type, M_ed, M)
+                    M_ed_corrected = M_ed - M
+
+                    # Ускорение, скорость, координата
+                    a_w = np.where(J_nonzero, M_ed_corrected / J_safe, 0)
+                    W = W + a_w * accuracy
+                    q_output = q_output + W * accuracy
+
+                    # Проверка границ
+                    q_output, W, a_w = _stop_at_limit(q_output < p.q_min, p.q_min, q_output, W, a_w)
+                    q_output, W, a_w = _stop_at_limit(q_output > p.q_max, p.q_max, q_output, W, a_w)
+
+                    # Прореживание: сохраняется каждый decimation-й шаг
+                    n += 1
+                    if (n - 1) % decimation:
+                        continue
+
+                    # Сохранение результатов (порядок как в LINK_CHANNELS)
+                    if recorded:
+                        values = (q_error, SAU_SUM, U, U_changed, I_a, M_ed, M,
+                                  M_ed_corrected, a_w, W, q_output)
+                        buffer[..., k] = [values[index] for index in recorded]
+                    k += 1
+
+        return result
+
+    def calculate_trajectory(self, channels: Iterable[str] = RESULT_CHANNELS) -> List[TrajectoryCalculator]:
+        """Рассчитать все сценарии и вернуть по калькулятору на сценарий.
+
+        Траектории звеньев сохраняются всегда — по ним считается качество
+        регулирования (avg_error_*, avg_reg_time_* и т.д.).
+        """
+        base = self.base
+        targets = base.control_targets()
+        channels = set(channels) | {'trajectory_q_1', 'trajectory_q_2'}
+        result = self.robot_function(*targets, channels=channels) if targets is not None else {}
+
+        calculators = []
+        for index, state in enumerate(self.states):
+            calc = TrajectoryCalculator(state)
+            for name in ('t_contur', 'x_contur', 'y_contur', 't_contur_control',
+                         'q1_contur_control', 'q2_contur_control', 'q_1_spline', 'q_2_spline', 't_spline'):
+                setattr(calc, name, getattr(base, name))
+            calc.output_time_array = result.get('output_time_array', np.empty(0))
+            for name in RESULT_CHANNELS[1:]:
+                if name in result:
+                    setattr(calc, name, result[name][index])
+            calc.evaluate_quality()
+            calculators.append(calc)
+        return calculators
@@ -0,0 +1,114 @@
+"""
+Кэш калькуляторов сессий в памяти процесса (L1 перед Redis).
+
+Запросы одной сессии идут пачками (/data/all, несколько /plot/*, /state
+за секунду), и каждый заново разбирал калькулятор из Redis. Здесь
+хранятся уже разобранные калькуляторы; актуальность проверяется по
+метке версии сессии в Redis (calculator:{session_id}:version), новой
+при каждой записи сессии, — поэтому несколько процессов
+и реплик не видят устаревших данных, а попадание стоит одного GET.
+
+Обработчики изменяют полученный калькулятор, поэтому кэш отдаёт копии
+(см. redis_client._clone): массивы результатов общие, состояние — своё.
+
+Настройки (переменные окружения):
+- SIMULATION_CALCULATOR_CACHE_BYTES — предел суммарного размера массивов
+  в кэше, байт (0 — кэш отключён).
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Optional, Tuple
+
+import numpy as np
+
+CALCULATOR_CACHE_BYTES = int(os.getenv("SIMULATION_CALCULATOR_CACHE_BYTES", str(256 * 1024 * 1024)))
+
+_entries: "OrderedDict[str, Tuple[bytes, Any, int]]" = OrderedDict()
+_size = 0
+_lock = threading.Lock()
+
+
+def _values_size(values: Iterable[Any]) -> int:
+    """Размер массивов и списков чисел, байт"""
+    size = 0
+    for value in values:
+        if isinstance(value, np.ndarray):
+            size += value.nbytes
+        elif isinstance(value, (list, tuple)):
+            size += 8 * len(value)
+    return size
+
+
+def calculator_size(calc) -> int:
+    """Размер массивов калькулятора, включая каналы, загруженные его копиями"""
+    size = _values_size(vars(calc).values()) + _values_size(vars(calc.state).values())
+    shared = vars(calc).get("_shared")
+    if shared:
+        size += _values_size(shared.values())
+    return size
+
+
+def _evict() -> None:
+    global _size
+    while _size > CALCULATOR_CACHE_BYTES and _entries:
+        _, (_, _, evicted) = _entries.popitem(last=False)
+        _size -= evicted
+
+
+def get(session_id: str, version: Optional[bytes]) -> Optional[Any]:
+    """Калькулятор сессии той же версии или None.
+
+    Возвращается сам закэшированный объект — изменять его нельзя.
+    """
+    if version is None or CALCULATOR_CACHE_BYTES <= 0:
+        return None
+    global _size
+    with _lock:
+        entry = _entries.get(session_id)
+        if entry is None or entry[0] != version:
+            return None
+        _, calc, size = entry
+        # Копии могли загрузить новые каналы — размер пересчитывается
+        new_size = calculator_size(calc)
+        _entries[session_id] = (version, calc, new_size)
+        _entries.move_to_end(session_id)
+        _size += new_size - size
+        _evict()
+        return calc
+
+
+def put(session_id: str, version: Optional[bytes], calc) -> None:
+    """Запомнить калькулятор сессии версии version"""
+    if version is None or CALCULATOR_CACHE_BYTES <= 0:
+        return
+    size = calculator_size(calc)
+    if size > CALCULATOR_CACHE_BYTES:
+        discard(session_id)
+        return
+    global _size
+    with _lock:
+        previous = _entries.pop(session_id, None)
+        if previous is not None:
+            _size -= previous[2]
+        _entries[session_id] = (version, calc, size)
+        _size += size
+        _evict()
+
+
+def discard(session_id: str) -> None:
+    """Удалить калькулятор сессии из кэша"""
+    global _size
+    with _lock:
+        previous = _entries.pop(session_id, None)
+        if previous is not None:
+            _size -= previous[2]
+
+
+def clear() -> None:
+    """Очистить кэш"""
+    global _size
+    with _lock:
+        _entries.clear()
+        _size = 0
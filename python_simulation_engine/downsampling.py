@@ -0,0 +1,115 @@
+"""
+Прореживание результатов для графиков с сохранением формы сигнала.
+
+Каналы одной группы (/data/all: trajectory, electrical, mechanical) имеют
+общую ось времени, поэтому функции выбирают общие для группы номера
+отсчётов, учитывая все её каналы. Вклад каждого канала нормируется
+по его размаху, чтобы крупные величины не заслоняли мелкие.
+
+Алгоритмы:
+- lttb — Largest-Triangle-Three-Buckets: в каждом интервале — отсчёт,
+  дающий наибольший треугольник с соседними интервалами;
+- minmax — минимум и максимум в каждом интервале у канала с наибольшим
+  размахом в этом интервале (пики и насыщения не теряются);
+- stride — каждый k-й отсчёт (прежнее прореживание, пики теряются).
+"""
+
+from typing import Callable, Dict, Sequence
+
+import numpy as np
+
+
+def _span(low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    """Размах каналов по их минимумам и максимумам; вырожденный — 1"""
+    with np.errstate(invalid='ignore'):
+        span = np.nanmax(high, axis=-1, keepdims=True) - np.nanmin(low, axis=-1, keepdims=True)
+    return np.where(np.isfinite(span) & (span > 0), span, 1)
+
+
+def stride_indices(time: np.ndarray, channels: Sequence[np.ndarray], max_points: int) -> np.ndarray:
+    """Каждый k-й отсчёт, k = n // max_points"""
+    n = len(time)
+    return np.arange(0, n, max(1, n // max_points))
+
+
+def minmax_indices(time: np.ndarray, channels: Sequence[np.ndarray], max_points: int) -> np.ndarray:
+    """Минимум и максимум в каждом из max_points // 2 интервалов"""
+    n = len(time)
+    if n <= max_points:
+        return np.arange(n)
+    size = -(-n // max(1, max_points // 2))
+    starts = np.arange(0, n, size)
+    channels = [np.asarray(channel, dtype=float) for channel in channels]
+    low = np.array([np.minimum.reduceat(channel, starts) for channel in channels])
+    high = np.array([np.maximum.reduceat(channel, starts) for channel in channels])
+    # Канал с наибольшим нормированным размахом в каждом интервале
+    with np.errstate(invalid='ignore'):
+        spans = (high - low) / _span(low, high)
+    chosen = np.argmax(np.where(np.isfinite(spans), spans, 0), axis=0)
+
+    # Номера отсчётов интервалов; последний, неполный, дополнен последним отсчётом
+    window = np.minimum(starts[:, None] + np.arange(size), n - 1)
+    picked = np.empty((2, len(starts)), dtype=np.intp)
+    for c, channel in enumerate(channels):
+        buckets = np.flatnonzero(chosen == c)
+        if len(buckets):
+            rows = window[buckets]
+            values = channel[rows]
+            picked[0, buckets] = rows[np.arange(len(buckets)), np.argmin(values, axis=1)]
+            picked[1, buckets] = rows[np.arange(len(buckets)), np.argmax(values, axis=1)]
+    return np.unique(picked)
+
+
+def lttb_indices(time: np.ndarray, channels: Sequence[np.ndarray], max_points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets для нескольких каналов:
+    площадь треугольника — сумма площадей по нормированным каналам"""
+    n = len(time)
+    if n <= max_points:
+        return np.arange(n)
+    if max_points < 3:
+        # Треугольников нет — только крайние отсчёты
+        return np.array([0, n - 1])
+    x = time
+    y = np.array(channels, dtype=float, ndmin=2)
+    # Нормировка каналов — весами площадей, без пересчёта массивов
+    weights = 1 / _span(y.min(axis=1, keepdims=True), y.max(axis=1, keepdims=True))[:, 0]
+    # Первый и последний отсчёты сохраняются, между ними — max_points - 2 интервала
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:, :-1], edges[:-1], axis=1) / counts
+    # Вершина треугольника справа — среднее следующего интервала,
+    # для последнего интервала — последний отсчёт
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.concatenate([mean_y[:, 1:], y[:, -1:]], axis=1)
+
+    # Цикл последовательный (вершина слева — выбранный отсчёт предыдущего
+    # интервала), поэтому скаляры — числа Python, а не элементы массивов
+    next_x = next_x.tolist()
+    next_y = next_y.T.copy()
+    edges = edges.tolist()
+    indices = [0]
+    a = 0
+    for i in range(max_points - 2):
+        start, stop = edges[i], edges[i + 1]
+        y_a = y[:, a:a + 1]
+        x_a = float(x[a])
+        area = weights @ np.abs((x_a - next_x[i]) * (y[:, start:stop] - y_a) -
+                                (x_a - x[start:stop]) * (next_y[i][:, None] - y_a))
+        a = start + int(area.argmax())
+        indices.append(a)
+    indices.append(n - 1)
+    return np.array(indices)
+
+
+DOWNSAMPLING: Dict[str, Callable[..., np.ndarray]] = {
+    "lttb": lttb_indices,
+    "minmax": minmax_indices,
+    "stride": stride_indices,
+}
+
+
+def downsample_indices(algorithm: str, time: np.ndarray, channels: Sequence[np.ndarray], max_points: int) -> np.ndarray:
+    """Номера отсчётов (по возрастанию), общие для каналов группы; не больше max_points
+    (для stride — как раньше, до 2 * max_points)"""
+    return DOWNSAMPLING[algorithm](np.asarray(time, dtype=float), channels, max_points)
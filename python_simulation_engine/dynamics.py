@@ -0,0 +1,266 @@
+"""
+Функции динамики робота.
+
+Векторные функции — общие для пакетного расчёта (batch_calculator)
+и интегратора с адаптивным шагом (adaptive_integrator): параметры
+и переменные состояния — массивы NumPy, звенья складываются по первой оси.
+
+Скалярные стратегии (RobotDynamics и наследники) — для пошагового цикла
+TrajectoryCalculator.iter_robot_function: выбираются один раз на расчёт
+по типу робота и заранее вычисляют постоянные коэффициенты, так что шаг
+цикла — один вызов moments() без ветвлений по типу и обращений к состоянию.
+"""
+
+import math
+from types import SimpleNamespace
+from typing import Dict, Sequence, Tuple, Type
+
+import numpy as np
+
+
+# Поля RobotState, участвующие в расчёте моментов звеньев
+LINK_PARAMS = (
+    "massd_1", "massd_2",
+    "moment_1", "moment_2", "masss_2", "length_1", "length_2",
+    "momentc_1", "momentc_2", "massc_2", "lengthc_1", "lengthc_2",
+    "momentcol_2", "masscol_2", "lengthcol_2",
+)
+
+# Поля-списки параметров ПИД и двигателей (по элементу на звено)
+LINK_LIST_PARAMS = ("Kp", "Ki", "Kd", "J", "Umax", "T_e", "Fi", "Ce", "Ra", "Cm")
+
+
+# Величины, сохраняемые по обоим звеньям: (канал звена 1, канал звена 2)
+LINK_CHANNELS = (
+    ('q_error_array_1', 'q_error_array_2'),
+    ('SAU_SUM_array_1', 'SAU_SUM_array_2'),
+    ('U_array_1', 'U_array_2'),
+    ('Ustar_array_1', 'Ustar_array_2'),
+    ('I_array_1', 'I_array_2'),
+    ('M_ed_array_1', 'M_ed_array_2'),
+    ('M1_array', 'M2_array'),
+    ('M_ed_corrected_array_1', 'M_ed_corrected_array_2'),
+    ('acceleration_array_1', 'acceleration_array_2'),
+    ('speed_array_1', 'speed_array_2'),
+    ('trajectory_q_1', 'trajectory_q_2'),
+)
+
+
+def safe_divide(numerator, denominator):
+    """Деление с нулём там, где знаменатель равен нулю (как `x / y if y != 0 else 0`)"""
+    nonzero = np.not_equal(denominator, 0)
+    return np.where(nonzero, numerator / np.where(nonzero, denominator, 1), 0)
+
+
+def excess_fluctuation_filter(robot_type: str, M_ed, M):
+    """Векторная версия TrajectoryCalculator.excess_fluctuation_filter.
+
+    M_ed и M — моменты двигателей и нагрузки любой одинаковой формы
+    (например, (2, N): звенья x сценарии). Вырожденные случаи (деление
+    на ноль) дают inf/nan, как и скалярная версия на np.float64;
+    предупреждения NumPy гасит вызывающий код.
+    """
+    if robot_type == "Скара":
+        M = np.where(np.sign(M_ed) != np.sign(M), 0.5 * M_ed, M)
+        ratio = safe_divide(2 * M, M_ed)
+        M = np.where(M_ed != 0, M_ed * (ratio / (1 + ratio)), M)
+
+    ratio = safe_divide(2 * M, M_ed)
+    excess = np.where(M >= 0, M > 0.5 * M_ed, M < 0.5 * M_ed)
+    return np.where((np.sign(M_ed) == np.sign(M)) & excess & (M_ed != 0), M_ed * (ratio / (1 + ratio)), M)
+
+
+def load_moments(robot_type: str, p, q_output_1, q_output_2, W_1, W_2, a_w_1, a_w_2):
+    """Моменты нагрузки звеньев; параметры p — скаляры или массивы сценариев"""
+    if robot_type == "Декартовый":
+        d1 = (p.massd_1 + p.massd_2) / 2
+        d3 = p.massd_2 / 2
+        M1 = 2 * d1 * a_w_1
+        M2 = 2 * d3 * a_w_2
+    elif robot_type == "Скара":
+        sin_q_2 = np.sin(q_output_2)
+        d1 = (p.moment_1 + p.masss_2 * p.length_1**2 +
+              2 * p.masss_2 * p.length_2**2 * p.length_1 * np.cos(q_output_1) +
+              p.masss_2 * p.length_2**2 + p.moment_2 / 2) / 2
+        d2 = (2 * p.masss_2 * p.length_2**2 * p.length_1 +
+              p.masss_2 * p.length_2**2 + p.moment_2 / 2) / 2
+        d3 = (p.masss_2 * p.length_2**2 + p.moment_2 / 2) / 2
+        M1 = (2 * d1 * a_w_1 + 2 * d2 * a_w_2 -
+              2 * p.masss_2 * p.length_2 * p.length_1 * sin_q_2 * W_1 * W_2 -
+              p.masss_2 * p.length_2 * p.length_1 * sin_q_2 * W_2**2)
+        M2 = (2 * d1 * a_w_1 + 2 * d3 * a_w_2 +
+              p.masss_2 * p.length_2 * p.length_1 * sin_q_2 * W_1**2)
+    elif robot_type == "Цилиндрический":
+        d1 = 0.5 * (p.momentc_1 + (p.momentc_2 / 2 +
+                   p.massc_2 * (p.lengthc_1 - 0.5 * p.lengthc_2 + q_output_2)**2))
+        d3 = p.massc_2 / 2
+        M1 = (2 * d1 * a_w_1 +
+              2 * p.massc_2 * (p.lengthc_1 - 0.5 * p.lengthc_2 + q_output_2) * W_1 * W_2)
+        M2 = (2 * d3 * a_w_1 -
+              p.massc_2 * (p.lengthc_1 - 0.5 * p.lengthc_2 + q_output_2) * W_1**2)
+    elif robot_type == "Колер":
+        d1 = (1 + p.masscol_2) / 2
+        d2 = p.masscol_2 * p.lengthcol_2 * np.sin(q_output_2) / 2
+        d3 = (p.momentcol_2 + p.masscol_2 * p.lengthcol_2**2) / 2
+        M1 = 2 * d1 * a_w_1 + 2 * d1 * a_w_1 + p.masscol_2 * p.lengthcol_2 * np.cos(q_output_2) * W_2**2
+        M2 = 2 * d2 * a_w_1 + 2 * d3 * a_w_1
+    else:
+        M1 = np.zeros(np.shape(a_w_1))
+        M2 = np.zeros(np.shape(a_w_2))
+    return M1, M2
+
+
+def _sign(x: float) -> float:
+    """np.sign для чисел Python: 1, -1, 0; NaN остаётся NaN"""
+    if x > 0:
+        return 1.0
+    if x < 0:
+        return -1.0
+    return x
+
+
+class RobotDynamics:
+    """Моменты нагрузки звеньев на одном шаге пошагового цикла.
+
+    Базовый класс — неизвестный тип робота: моменты нагрузки нулевые.
+    Наследники вычисляют в __init__ постоянные части формул load_moments
+    (порядок операций сохранён, результат совпадает до бита).
+    """
+
+    def __init__(self, s):
+        self.robot_type = s.robot_type
+        self.state = s
+
+    def load(self, q_output_1, q_output_2, W_1, W_2, a_w_1, a_w_2) -> Tuple[float, float]:
+        """Моменты нагрузки звеньев без фильтра"""
+        return 0, 0
+
+    def filter(self, M_ed_1, M_ed_2, M1, M2) -> Tuple[float, float]:
+        """Фильтр избыточных колебаний (скалярная версия excess_fluctuation_filter)"""
+        return _limit(M_ed_1, M1), _limit(M_ed_2, M2)
+
+    def moments(self, q_output_1, q_output_2, W_1, W_2, a_w_1, a_w_2, M_ed_1, M_ed_2) -> Tuple[float, float]:
+        """Моменты нагрузки звеньев после фильтра избыточных колебаний"""
+        try:
+            M1, M2 = self.load(q_output_1, q_output_2, W_1, W_2, a_w_1, a_w_2)
+        except (OverflowError, ValueError):
+            # Расчёт разошёлся (переполнение, cos(inf)): как раньше на np.float64 —
+            # inf/nan вместо исключения
+            with np.errstate(all='ignore'):
+                M1, M2 = load_moments(self.robot_type, self.state, *map(
+                    np.float64, (q_output_1, q_output_2, W_1, W_2, a_w_1, a_w_2)))
+        return self.filter(M_ed_1, M_ed_2, M1, M2)
+
+
+def _limit(M_ed, M):
+    """Ограничение момента нагрузки звена, если он превышает половину момента двигателя"""
+    if M_ed != 0 and _sign(M_ed) == _sign(M):
+        if (M > 0.5 * M_ed) if M >= 0 else (M < 0.5 * M_ed):
+            M = M_ed * ((2 * M / M_ed) / (1 + (2 * M / M_ed)))
+    return M
+
+
+class CartesianDynamics(RobotDynamics):
+    def __init__(self, s):
+        super().__init__(s)
+        self.k1 = 2 * ((s.massd_1 + s.massd_2) / 2)
+        self.k2 = 2 * (s.massd_2 / 2)
+
+    def load(self, q_output_1, q_output_2, W_1, W_2, a_w_1, a_w_2):
+        return self.k1 * a_w_1, self.k2 * a_w_2
+
+
+class ScaraDynamics(RobotDynamics):
+    def __init__(self, s):
+        super().__init__(s)
+        m, l1, l2 = s.masss_2, s.length_1, s.length_2
+        self.base = s.moment_1 + m * l1**2
+        self.k_cos = 2 * m * l2**2 * l1
+        self.tail = m * l2**2
+        self.half_moment_2 = s.moment_2 / 2
+        self.k_d2 = 2 * ((2 * m * l2**2 * l1 + m * l2**2 + s.moment_2 / 2) / 2)
+        self.k_d3 = 2 * ((m * l2**2 + s.moment_2 / 2) / 2)
+        self.k_coriolis = 2 * m * l2 * l1
+        self.k_centrifugal = m * l2 * l1
+
+    def load(self, q_output_1, q_output_2, W_1, W_2, a_w_1, a_w_2):
+        sin_q_2 = math.sin(q_output_2)
+        d1 = (self.base + self.k_cos * math.cos(q_output_1) + self.tail + self.half_moment_2) / 2
+        M1 = (2 * d1 * a_w_1 + self.k_d2 * a_w_2 -
+              self.k_coriolis * sin_q_2 * W_1 * W_2 -
+              self.k_centrifugal * sin_q_2 * W_2**2)
+        M2 = 2 * d1 * a_w_1 + self.k_d3 * a_w_2 + self.k_centrifugal * sin_q_2 * W_1**2
+        return M1, M2
+
+    def filter(self, M_ed_1, M_ed_2, M1, M2):
+        # SCARA: момент другого знака заменяется половиной момента двигателя,
+        # затем момент всегда сглаживается
+        if _sign(M_ed_1) != _sign(M1):
+            M1 = 0.5 * M_ed_1
+        if _sign(M_ed_2) != _sign(M2):
+            M2 = 0.5 * M_ed_2
+        if M_ed_1 != 0:
+            M1 = M_ed_1 * ((2 * M1 / M_ed_1) / (1 + (2 * M1 / M_ed_1)))
+        if M_ed_2 != 0:
+            M2 = M_ed_2 * ((2 * M2 / M_ed_2) / (1 + (2 * M2 / M_ed_2)))
+        return _limit(M_ed_1, M1), _limit(M_ed_2, M2)
+
+
+class CylindricalDynamics(RobotDynamics):
+    def __init__(self, s):
+        super().__init__(s)
+        self.m = s.massc_2
+        self.offset = s.lengthc_1 - 0.5 * s.lengthc_2
+        self.momentc_1 = s.momentc_1
+        self.half_momentc_2 = s.momentc_2 / 2
+        self.k_coriolis = 2 * s.massc_2
+        self.k_d3 = 2 * (s.massc_2 / 2)
+
+    def load(self, q_output_1, q_output_2, W_1, W_2, a_w_1, a_w_2):
+        r = self.offset + q_output_2
+        d1 = 0.5 * (self.momentc_1 + (self.half_momentc_2 + self.m * r**2))
+        M1 = 2 * d1 * a_w_1 + self.k_coriolis * r * W_1 * W_2
+        M2 = self.k_d3 * a_w_1 - self.m * r * W_1**2
+        return M1, M2
+
+
+class ColerDynamics(RobotDynamics):
+    def __init__(self, s):
+        super().__init__(s)
+        self.k_d1 = 2 * ((1 + s.masscol_2) / 2)
+        self.k_ml = s.masscol_2 * s.lengthcol_2
+        self.k_d3 = 2 * ((s.momentcol_2 + s.masscol_2 * s.lengthcol_2**2) / 2)
+
+    def load(self, q_output_1, q_output_2, W_1, W_2, a_w_1, a_w_2):
+        d2 = self.k_ml * math.sin(q_output_2) / 2
+        M1 = self.k_d1 * a_w_1 + self.k_d1 * a_w_1 + self.k_ml * math.cos(q_output_2) * W_2**2
+        M2 = 2 * d2 * a_w_1 + self.k_d3 * a_w_1
+        return M1, M2
+
+
+ROBOT_DYNAMICS: Dict[str, Type[RobotDynamics]] = {
+    "Декартовый": CartesianDynamics,
+    "Скара": ScaraDynamics,
+    "Цилиндрический": CylindricalDynamics,
+    "Колер": ColerDynamics,
+}
+
+
+def robot_dynamics(s) -> RobotDynamics:
+    """Стратегия динамики для типа робота состояния s (RobotState)"""
+    return ROBOT_DYNAMICS.get(s.robot_type, RobotDynamics)(s)
+
+
+def collect_parameters(states: Sequence, limits: Sequence[Tuple[Tuple[float, float], Tuple[float, float]]]) -> SimpleNamespace:
+    """Собрать параметры сценариев в массивы: (N,) для звеньев робота,
+    (2, N) для ПИД, двигателей и границ координат.
+
+    limits — по сценарию ((q_min_1, q_max_1), (q_min_2, q_max_2)).
+    """
+    params = {name: np.array([getattr(s, name) for s in states], dtype=float) for name in LINK_PARAMS}
+    for name in LINK_LIST_PARAMS:
+        params[name] = np.array([getattr(s, name)[:2] for s in states], dtype=float).T
+    limits = np.array(limits, dtype=float).reshape(len(states), 2, 2)
+    params["q_min"] = limits[:, :, 0].T
+    params["q_max"] = limits[:, :, 1].T
+    return SimpleNamespace(**params)
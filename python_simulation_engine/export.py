@@ -0,0 +1,129 @@
+"""
+Выгрузка результатов расчёта в полном разрешении в столбцовых форматах
+(/api/robot/data/export).
+
+Столбцы — массивы результатов как есть (float64, без копирования в списки
+Python и JSON); файл отдаётся по частям: после каждого канала (npz) или
+пачки строк (arrow, parquet) готовые байты уходят клиенту.
+
+Форматы:
+- npz — архив NumPy, по файлу .npy на канал (np.load);
+- arrow — Arrow IPC stream (pyarrow.ipc.open_stream, pandas, polars);
+- parquet — Parquet, группа строк на пачку.
+arrow и parquet требуют pyarrow; без него доступен только npz.
+"""
+
+import io
+import zipfile
+from typing import Callable, Dict, Iterator, NamedTuple
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - зависит от окружения
+    pa = None
+    pq = None
+
+EXPORT_BATCH_ROWS = 64 * 1024  # Строк в пачке arrow и группе строк parquet
+
+
+class ExportUnavailable(RuntimeError):
+    """Формат требует не установленной библиотеки"""
+
+
+class _ChunkSink(io.RawIOBase):
+    """Файл только для записи: записанные байты забираются по частям (drain)"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        # Писатели форматов переиспользуют свои буферы — байты копируются
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        chunks, self._chunks = self._chunks, []
+        return b"".join(chunks)
+
+
+def export_npz(columns: Dict[str, np.ndarray]) -> Iterator[bytes]:
+    """Архив .npz без сжатия; запись потоковая (дескрипторы данных zip)"""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for name, values in columns.items():
+            values = np.ascontiguousarray(values, dtype=float)
+            with archive.open(f"{name}.npy", mode="w", force_zip64=values.nbytes >= zipfile.ZIP64_LIMIT) as entry:
+                np.lib.format.write_array(entry, values, allow_pickle=False)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _arrow_batches(columns: Dict[str, np.ndarray]) -> Iterator["pa.RecordBatch"]:
+    """Пачки строк; столбцы — представления массивов результатов без копирования"""
+    arrays = [pa.array(np.asarray(values, dtype=float)) for values in columns.values()]
+    rows = len(arrays[0]) if arrays else 0
+    for start in range(0, max(rows, 1), EXPORT_BATCH_ROWS):
+        yield pa.record_batch([array.slice(start, EXPORT_BATCH_ROWS) for array in arrays], names=list(columns))
+
+
+def _schema(columns: Dict[str, np.ndarray]) -> "pa.Schema":
+    return pa.schema([(name, pa.float64()) for name in columns])
+
+
+def export_arrow(columns: Dict[str, np.ndarray]) -> Iterator[bytes]:
+    """Arrow IPC stream"""
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(sink, _schema(columns)) as writer:
+        for batch in _arrow_batches(columns):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def export_parquet(columns: Dict[str, np.ndarray]) -> Iterator[bytes]:
+    """Parquet: группа строк на пачку. Словари для float64 бесполезны
+    и медленны; BYTE_STREAM_SPLIT — та же перестановка байтов, что и в
+    redis_client._pack: файл вдвое меньше, запись на порядок быстрее"""
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, _schema(columns), use_dictionary=False,
+                          column_encoding="BYTE_STREAM_SPLIT") as writer:
+        for batch in _arrow_batches(columns):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+class ExportFormat(NamedTuple):
+    write: Callable[[Dict[str, np.ndarray]], Iterator[bytes]]
+    media_type: str
+    extension: str
+    needs_pyarrow: bool
+
+
+EXPORT_FORMATS: Dict[str, ExportFormat] = {
+    "npz": ExportFormat(export_npz, "application/octet-stream", "npz", False),
+    "arrow": ExportFormat(export_arrow, "application/vnd.apache.arrow.stream", "arrows", True),
+    "parquet": ExportFormat(export_parquet, "application/vnd.apache.parquet", "parquet", True),
+}
+
+
+def export_columns(file_format: str, columns: Dict[str, np.ndarray]) -> Iterator[bytes]:
+    """Части файла формата file_format. ExportUnavailable бросается сразу,
+    до первой части, — чтобы обработчик успел ответить ошибкой."""
+    export = EXPORT_FORMATS[file_format]
+    if export.needs_pyarrow and pa is None:
+        raise ExportUnavailable(f"Для формата {file_format} нужен пакет pyarrow")
+    return export.write(columns)
@@ -0,0 +1,198 @@
+"""
+Очередь фоновых расчётов на Redis Streams.
+
+API кладёт задание в поток SIMULATION_JOB_STREAM и сразу возвращает job_id;
+задания читают воркеры (группа потребителей, любое число процессов или
+контейнеров). Статус и сводка результата хранятся в хэше job:{job_id},
+сам калькулятор — как обычно, в ключах calculator:{session_id}:*.
+
+Пока задание выполняется, воркер продлевает его захват (XCLAIM), поэтому
+другим воркерам достаются только задания упавших. Задание, которое
+выдавалось больше JOB_MAX_DELIVERIES раз (воркер падает на нём), помечается
+неудавшимся и не выполняется снова.
+
+Запуск воркера: python -m python_simulation_engine.job_queue
+"""
+
+import datetime as dt
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+import redis
+
+from python_simulation_engine import redis_client
+from python_simulation_engine.shared.simulation_core import (
+    calculation_summary,
+    get_calculator,
+    load_cached_result,
+    load_checkpoints,
+    save_calculator,
+)
+
+logger = logging.getLogger(__name__)
+
+JOB_STREAM = os.getenv("SIMULATION_JOB_STREAM", "simulation:jobs")
+JOB_GROUP = os.getenv("SIMULATION_JOB_GROUP", "simulation-workers")
+JOB_TTL = redis_client.CALCULATOR_TTL
+JOB_STREAM_MAXLEN = 10000  # Приблизительная длина потока (XADD MAXLEN ~)
+JOB_CLAIM_IDLE_MS = 5 * 60 * 1000  # Задания упавших воркеров забираются через 5 минут
+JOB_HEARTBEAT_S = 60  # Как часто продлевается захват выполняемого задания
+JOB_MAX_DELIVERIES = 3  # Попыток выполнить задание, после которых оно считается неудавшимся
+JOB_BLOCK_MS = 5000
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+def _job_key(job_id: str) -> str:
+    """Ключ хэша со статусом задания"""
+    return f"job:{job_id}"
+
+
+def _now() -> str:
+    return dt.datetime.utcnow().isoformat()
+
+
+def _set_status(r: redis.Redis, job_id: str, status: str, **fields: Any) -> None:
+    key = _job_key(job_id)
+    r.hset(key, mapping={"status": status, **fields})
+    r.expire(key, JOB_TTL)
+
+
+def ensure_group(r: Optional[redis.Redis] = None) -> None:
+    """Создать поток и группу потребителей, если их ещё нет"""
+    r = r or redis_client.get_redis()
+    try:
+        r.xgroup_create(JOB_STREAM, JOB_GROUP, id="0", mkstream=True)
+    except redis.ResponseError as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
+
+
+def enqueue_calculation(session_id: str) -> str:
+    """Поставить расчёт траектории сессии в очередь. Возвращает job_id."""
+    r = redis_client.get_redis()
+    job_id = uuid.uuid4().hex
+    _set_status(r, job_id, STATUS_QUEUED, kind="calculate", session_id=session_id, created_at=_now())
+    r.xadd(JOB_STREAM, {"job_id": job_id, "kind": "calculate", "session_id": session_id},
+           maxlen=JOB_STREAM_MAXLEN, approximate=True)
+    return job_id
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Статус задания; None — задание не найдено или истекло"""
+    data = redis_client.get_redis().hgetall(_job_key(job_id))
+    if not data:
+        return None
+    job = {"job_id": job_id, **data}
+    if "result" in job:
+        job["result"] = json.loads(job["result"])
+    return job
+
+
+def _run_calculate(session_id: str) -> Dict[str, Any]:
+    calc = get_calculator(session_id)
+    if not load_cached_result(calc):
+        load_checkpoints(calc)
+        calc.calculate_trajectory()
+        calc.coordinate_transform()
+    save_calculator(session_id, calc)
+    return calculation_summary(calc)
+
+
+JOB_HANDLERS: Dict[str, Callable[[str], Dict[str, Any]]] = {
+    "calculate": _run_calculate,
+}
+
+
+def process_job(r: redis.Redis, fields: Dict[str, str]) -> None:
+    """Выполнить одно задание и записать статус"""
+    job_id = fields["job_id"]
+    _set_status(r, job_id, STATUS_RUNNING, started_at=_now(), worker=socket.gethostname())
+    try:
+        handler = JOB_HANDLERS[fields.get("kind", "calculate")]
+        result = handler(fields["session_id"])
+    except Exception as exc:
+        logger.exception(f"Ошибка выполнения задания {job_id}")
+        _set_status(r, job_id, STATUS_FAILED, finished_at=_now(), error=str(exc))
+        return
+    _set_status(r, job_id, STATUS_DONE, finished_at=_now(), result=json.dumps(result))
+
+
+@contextmanager
+def _claim_held(r: redis.Redis, consumer: str, message_id: str):
+    """Продлевать захват задания, пока оно выполняется: иначе через
+    JOB_CLAIM_IDLE_MS его заберёт другой воркер и выполнит второй раз"""
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(JOB_HEARTBEAT_S):
+            try:
+                # JUSTID: сбросить время простоя, не увеличивая счётчик выдач
+                r.xclaim(JOB_STREAM, JOB_GROUP, consumer, 0, [message_id], justid=True)
+            except redis.RedisError:
+                logger.warning(f"Не удалось продлить захват задания {message_id}", exc_info=True)
+
+    thread = threading.Thread(target=heartbeat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _deliveries(r: redis.Redis, message_id: str) -> int:
+    """Сколько раз задание выдавалось воркерам (XPENDING)"""
+    pending = r.xpending_range(JOB_STREAM, JOB_GROUP, min=message_id, max=message_id, count=1)
+    return pending[0]["times_delivered"] if pending else 1
+
+
+def run_worker(consumer: Optional[str] = None, block_ms: int = JOB_BLOCK_MS,
+               max_jobs: Optional[int] = None) -> int:
+    """Цикл воркера: читать задания группы и выполнять их.
+
+    max_jobs — остановиться после стольких заданий (для тестов);
+    None — работать бесконечно. Возвращает число выполненных заданий.
+    """
+    r = redis_client.get_redis()
+    consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+    ensure_group(r)
+    processed = 0
+
+    while max_jobs is None or processed < max_jobs:
+        # Сначала — зависшие задания упавших воркеров, затем новые
+        _, claimed, *_ = r.xautoclaim(JOB_STREAM, JOB_GROUP, consumer, JOB_CLAIM_IDLE_MS, count=1)
+        if claimed:
+            messages = claimed
+        else:
+            response = r.xreadgroup(JOB_GROUP, consumer, {JOB_STREAM: ">"}, count=1, block=block_ms)
+            messages = response[0][1] if response else []
+        if not messages and max_jobs is not None:
+            break
+
+        for message_id, fields in messages:
+            deliveries = _deliveries(r, message_id) if claimed else 1
+            if deliveries > JOB_MAX_DELIVERIES:
+                logger.error(f"Задание {fields['job_id']} выдавалось {deliveries} раз, выполнение прекращено")
+                _set_status(r, fields["job_id"], STATUS_FAILED, finished_at=_now(),
+                            error=f"Воркер прерывался на задании {JOB_MAX_DELIVERIES} раз")
+            else:
+                with _claim_held(r, consumer, message_id):
+                    process_job(r, fields)
+            r.xack(JOB_STREAM, JOB_GROUP, message_id)
+            processed += 1
+    return processed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_worker()
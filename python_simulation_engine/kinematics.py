@@ -0,0 +1,108 @@
+"""
+Кинематика роботов: обобщённые координаты (q1, q2) <-> декартовы (x, y).
+Функции работают с целыми массивами NumPy (и со скалярами) — без циклов
+по отсчётам. a_1, a_2 — длины звеньев (см. TrajectoryCalculator.get_true_a1_a2).
+"""
+
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+
+def cartesian_forward(q1: np.ndarray, q2: np.ndarray, a_1: float, a_2: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Декартовый робот: координаты звеньев и есть x, y"""
+    return q1.copy(), q2.copy()
+
+
+def cylindrical_forward(q1: np.ndarray, q2: np.ndarray, a_1: float, a_2: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Цилиндрический робот: q1 — поворот, q2 — выдвижение"""
+    return -(a_1 + q2) * np.sin(q1), (a_1 + q2) * np.cos(q1)
+
+
+def scara_forward(q1: np.ndarray, q2: np.ndarray, a_1: float, a_2: float) -> Tuple[np.ndarray, np.ndarray]:
+    """SCARA: q1, q2 — углы звеньев"""
+    return (-a_1 * np.sin(q1) - a_2 * np.sin(q1 + q2),
+            a_1 * np.cos(q1) + a_2 * np.cos(q1 + q2))
+
+
+def coler_forward(q1: np.ndarray, q2: np.ndarray, a_1: float, a_2: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Колер: q1 — вертикальное перемещение, q2 — поворот второго звена"""
+    return -a_2 * np.sin(q2), q1 + a_2 * np.cos(q2)
+
+
+FORWARD_KINEMATICS: Dict[str, Callable[..., Tuple[np.ndarray, np.ndarray]]] = {
+    "Декартовый": cartesian_forward,
+    "Цилиндрический": cylindrical_forward,
+    "Скара": scara_forward,
+    "Колер": coler_forward,
+}
+
+
+def forward_kinematics(robot_type: str, q1, q2, a_1: float, a_2: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Декартовы координаты для массивов обобщённых координат;
+    для неизвестного типа робота — пустые массивы"""
+    forward = FORWARD_KINEMATICS.get(robot_type)
+    if forward is None:
+        return np.empty(0), np.empty(0)
+    return forward(np.asarray(q1, dtype=float), np.asarray(q2, dtype=float), a_1, a_2)
+
+
+# === Обратная кинематика: декартовы координаты контура -> обобщённые ===
+# Ветвления повторяют поэлементный расчёт: особые точки (x = 0 или y = 0)
+# и NaN из arctan2/arccos/arcsin заменяются так же, как раньше.
+
+def cartesian_inverse(x: np.ndarray, y: np.ndarray, a_1: float, a_2: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Декартовый робот: x, y и есть координаты звеньев"""
+    return x.copy(), y.copy()
+
+
+def cylindrical_inverse(x: np.ndarray, y: np.ndarray, a_1: float, a_2: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Цилиндрический робот: угол поворота и выдвижение"""
+    with np.errstate(invalid='ignore'):
+        a = np.where(y == 0, np.where(x == 0, 0.25 * np.pi, np.pi / 2), np.arctan2(x, y))
+        q1 = -1 * a
+        q1 = np.where(np.isnan(q1), 0, q1)
+        q2 = np.sqrt(x**2 + y**2) - a_1
+    return q1, q2
+
+
+def scara_inverse(x: np.ndarray, y: np.ndarray, a_1: float, a_2: float) -> Tuple[np.ndarray, np.ndarray]:
+    """SCARA: углы звеньев по теореме косинусов"""
+    ratio = a_1 / a_2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = np.where(x == 0, np.where(y == 0, 0.25 * np.pi, np.pi / 2), np.arctan2(y, x))
+        a = np.where(np.isnan(a), 0, a)
+        r = np.sqrt(x**2 + y**2)
+        g1 = np.arccos(((a_1**2) - (a_2**2) + (r**2)) / (2 * a_1 * r))
+        g1 = np.where(np.isnan(g1), 0, g1)
+        g2 = np.arcsin(ratio * np.sin(g1))
+        g2 = np.where(np.isnan(g2), 0, g2)
+    arm = np.sign(-1)  # Конфигурация «локоть влево»
+    return -np.pi / 2 + a - g1 * arm, (g1 + g2) * arm
+
+
+def coler_inverse(x: np.ndarray, y: np.ndarray, a_1: float, a_2: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Колер: высота и угол второго звена; точки вне досягаемости — на границе"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        square = 1 - (x / a_2)**2
+        square = np.where(square > 0, square, 0)
+        q1 = y - a_2 * np.sqrt(square)
+        q2 = -np.arcsin(x / a_2)
+        q2 = np.where(np.isnan(q2), 0, q2)
+    return q1, q2
+
+
+INVERSE_KINEMATICS: Dict[str, Callable[..., Tuple[np.ndarray, np.ndarray]]] = {
+    "Декартовый": cartesian_inverse,
+    "Цилиндрический": cylindrical_inverse,
+    "Скара": scara_inverse,
+    "Колер": coler_inverse,
+}
+
+
+def inverse_kinematics(robot_type: str, x, y, a_1: float, a_2: float) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Обобщённые координаты для массивов декартовых; None — неизвестный тип робота"""
+    inverse = INVERSE_KINEMATICS.get(robot_type)
+    if inverse is None:
+        return None
+    return inverse(np.asarray(x, dtype=float), np.asarray(y, dtype=float), a_1, a_2)
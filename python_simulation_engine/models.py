@@ -19,6 +19,18 @@ class ControlType(str, Enum):
     CONTOUR = "Контурное"
 
 
+class IntegrationMethod(str, Enum):
+    EULER = "euler"
+    # Адаптивные методы — эталон с контролем погрешности, медленнее euler (см. adaptive_integrator)
+    RADAU = "Radau"
+    BDF = "BDF"
+
+
+class TuneObjective(str, Enum):
+    AVG_ERROR = "avg_error"
+    AVG_REG_TIME = "avg_reg_time"
+
+
 class PlotType(str, Enum):
     DECART_PLANE = "decart_plane"
     OBOBSHENNIE_COORDINATES = "obobshennie_coordinates"
@@ -33,6 +45,20 @@ class PlotType(str, Enum):
     ACCELERATION = "acceleration"
 
 
+class DownsamplingAlgorithm(str, Enum):
+    """Прореживание данных /data/all (см. downsampling)"""
+    MINMAX = "minmax"
+    LTTB = "lttb"
+    STRIDE = "stride"
+
+
+class ExportFileFormat(str, Enum):
+    """Формат выгрузки /data/export (см. export)"""
+    NPZ = "npz"
+    ARROW = "arrow"
+    PARQUET = "parquet"
+
+
 # === Модели для настройки робота ===
 
 class RobotTypeRequest(BaseModel):
@@ -70,6 +96,37 @@ class PIDRequest(BaseModel):
         return v
 
 
+class GainRange(BaseModel):
+    """Диапазон перебора одного коэффициента"""
+    min: float = 0
+    max: float = 0
+    steps: int = 1  # Число значений в диапазоне (включая границы)
+    
+    @model_validator(mode='after')
+    def check_range(self):
+        if self.steps < 1:
+            raise ValueError('Число шагов должно быть не меньше 1')
+        if self.max < self.min:
+            raise ValueError('Верхняя граница диапазона меньше нижней')
+        return self
+
+
+class PIDTuneRequest(BaseModel):
+    """Запрос на подбор коэффициентов ПИД-регулятора перебором по сетке"""
+    Kp: List[GainRange]  # [звено 1, звено 2]
+    Ki: List[GainRange]
+    Kd: List[GainRange]
+    objective: TuneObjective = TuneObjective.AVG_ERROR
+    apply: bool = False  # Сохранить лучшие коэффициенты в сессии
+    
+    @field_validator('Kp', 'Ki', 'Kd')
+    @classmethod
+    def check_length(cls, v):
+        if len(v) < 2:
+            raise ValueError('Массив должен содержать минимум 2 элемента')
+        return v
+
+
 class MotorParamsRequest(BaseModel):
     """Запрос на установку параметров двигателей"""
     J: List[float]     # Моменты инерции
@@ -173,7 +230,29 @@ class ColerParamsRequest(BaseModel):
     masscol_3: float = 0
 
 
-class LineContourRequest(BaseModel):
+# Предел точек контура (как MAX_DATA_POINTS сервиса): контур и его обратная
+# кинематика считаются целиком и хранятся в сессии
+MAX_CONTOUR_POINTS = 10000
+
+
+class ContourRequest(BaseModel):
+    """Разрешение контура: число точек и отрезок времени"""
+    points: int = 1000
+    t_start: float = 10
+    t_stop: float = 110
+    
+    @model_validator(mode='after')
+    def check_resolution(self):
+        if self.points < 2:
+            raise ValueError('Контур должен содержать минимум 2 точки')
+        if self.points > MAX_CONTOUR_POINTS:
+            raise ValueError(f'Контур должен содержать не больше {MAX_CONTOUR_POINTS} точек')
+        if self.t_stop <= self.t_start:
+            raise ValueError('Время окончания контура должно быть больше времени начала')
+        return self
+
+
+class LineContourRequest(ContourRequest):
     """Параметры линейного контура"""
     x1: float
     x2: float
@@ -182,7 +261,7 @@ class LineContourRequest(BaseModel):
     speed: float = 1.0
 
 
-class CircleContourRequest(BaseModel):
+class CircleContourRequest(ContourRequest):
     """Параметры кругового контура"""
     x: float
     y: float
@@ -204,6 +283,9 @@ class FullRobotConfig(BaseModel):
     type_of_control: ControlType = ControlType.POSITIONAL
     spline: bool = False
     num_splain_dots: int = 100
+    integration_method: IntegrationMethod = IntegrationMethod.EULER
+    integration_dt: float = 1e-3
+    output_decimation: int = 1
     
     # ПИД
     Kp: List[float] = [1.0, 1.0, 0, 0]
@@ -300,6 +382,20 @@ class FullRobotConfig(BaseModel):
     circle_x: float = 0
     circle_y: float = 0
     circle_radius: float = 0
+    
+    @field_validator('integration_dt')
+    @classmethod
+    def check_integration_dt(cls, v):
+        if v <= 0:
+            raise ValueError('Шаг интегрирования должен быть больше 0')
+        return v
+    
+    @field_validator('output_decimation')
+    @classmethod
+    def check_output_decimation(cls, v):
+        if v < 1:
+            raise ValueError('Прореживание вывода должно быть не меньше 1')
+        return v
 
 
 # === Модели ответов ===
@@ -332,6 +428,42 @@ class TrajectoryResult(BaseModel):
     real_trajectory_y: Optional[List[float]] = None
 
 
+class PIDTunePoint(BaseModel):
+    """Результат расчёта для одного набора коэффициентов"""
+    Kp: List[float]
+    Ki: List[float]
+    Kd: List[float]
+    avg_error_1: float
+    avg_error_2: float
+    avg_reg_time_1: float
+    avg_reg_time_2: float
+    objective: Optional[float]  # None — расчёт разошёлся или не установился
+
+
+class PIDTuneResponse(BaseModel):
+    """Результат подбора коэффициентов ПИД-регулятора"""
+    success: bool
+    objective: str
+    evaluated: int
+    best: PIDTunePoint
+    grid: List[PIDTunePoint]
+
+
+class JobStatusResponse(BaseModel):
+    """Статус фонового задания"""
+    success: bool
+    job_id: str
+    status: str
+    kind: Optional[str] = None
+    session_id: Optional[str] = None
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    worker: Optional[str] = None
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+
+
 class PlotResponse(BaseModel):
     """Ответ с графиком"""
     success: bool
@@ -405,6 +537,23 @@ class MechanicalData(BaseModel):
     acceleration_2: List[float]
 
 
+class ChannelEnvelope(BaseModel):
+    """Минимумы и максимумы канала в блоках отрезка времени"""
+    min: List[float]
+    max: List[float]
+
+
+class RangeDataResponse(BaseModel):
+    """Данные отрезка времени из пирамиды минимумов и максимумов"""
+    success: bool
+    t0: float
+    t1: float
+    level: int  # Уровень пирамиды, 0 — исходные отсчёты
+    block: int  # Отсчётов в точке
+    time: List[float]  # Начало каждого блока
+    channels: Dict[str, ChannelEnvelope]
+
+
 class AllDataResponse(BaseModel):
     """Все данные расчёта"""
     success: bool
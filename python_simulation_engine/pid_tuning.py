@@ -0,0 +1,131 @@
+"""
+Подбор коэффициентов ПИД-регулятора перебором по сетке.
+Наборы коэффициентов считаются пакетами (BatchTrajectoryCalculator):
+plan_tuning делит сетку на пакеты, сервис симуляции считает их
+evaluate_chunk в пуле процессов (shared.compute_pool), tuning_result
+собирает итог.
+"""
+
+import copy
+import itertools
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from python_simulation_engine.batch_calculator import BatchTrajectoryCalculator
+from python_simulation_engine.trajectory_calculator import RobotState, TrajectoryCalculator
+
+
+MAX_TUNE_EVALUATIONS = 2000
+MIN_CHUNK_SIZE = 8  # Меньшие пакеты не окупают накладные расходы процесса
+
+# (min, max, steps) для одного коэффициента одного звена
+GainRange = Tuple[float, float, int]
+Gains = Tuple[List[float], List[float], List[float]]
+
+
+def _axis(gain_range: GainRange) -> List[float]:
+    low, high, steps = gain_range
+    return [float(value) for value in np.linspace(low, high, max(1, int(steps)))]
+
+
+def gain_grid(Kp: Sequence[GainRange], Ki: Sequence[GainRange], Kd: Sequence[GainRange]) -> List[Gains]:
+    """Все сочетания (Kp, Ki, Kd) для двух звеньев"""
+    axes = [_axis(Kp[0]), _axis(Ki[0]), _axis(Kd[0]), _axis(Kp[1]), _axis(Ki[1]), _axis(Kd[1])]
+    size = math.prod(len(axis) for axis in axes)
+    if size > MAX_TUNE_EVALUATIONS:
+        raise ValueError(f"Слишком большая сетка: {size} наборов (максимум {MAX_TUNE_EVALUATIONS})")
+    return [
+        ([kp_1, kp_2], [ki_1, ki_2], [kd_1, kd_2])
+        for kp_1, ki_1, kd_1, kp_2, ki_2, kd_2 in itertools.product(*axes)
+    ]
+
+
+def _with_gains(state: RobotState, gains: Gains) -> RobotState:
+    """Копия состояния с заменёнными коэффициентами первых двух звеньев"""
+    candidate = copy.deepcopy(state)
+    for name, values in zip(("Kp", "Ki", "Kd"), gains):
+        coefficients = list(getattr(candidate, name))
+        coefficients[:2] = values
+        setattr(candidate, name, coefficients)
+    return candidate
+
+
+def _targets_only(calc: TrajectoryCalculator) -> TrajectoryCalculator:
+    """Калькулятор с тем же состоянием и контуром, но без массивов результатов"""
+    base = TrajectoryCalculator(copy.deepcopy(calc.state))
+    for name in ('t_contur', 'x_contur', 'y_contur', 't_contur_control', 'q1_contur_control', 'q2_contur_control'):
+        setattr(base, name, list(getattr(calc, name)))
+    return base
+
+
+def _unsettled(calc: TrajectoryCalculator) -> bool:
+    """Есть точка циклограммы, после которой траектория не вошла в полосу.
+    Такие точки не попадают в reg_time_*, а без них avg_reg_time_* = 0;
+    точки в самом конце расчёта (после них нет отсчётов) не считаются"""
+    s = calc.state
+    t = s.t if s.type_of_control == "Позиционное" else calc.t_contur_control
+    output_time = np.asarray(calc.output_time_array, dtype=float)
+    if len(output_time) == 0 or len(t) == 0:
+        return False
+    reachable = int(np.count_nonzero(np.asarray(t, dtype=float) <= output_time[-1]))
+    return len(calc.reg_time_1) < reachable or len(calc.reg_time_2) < reachable
+
+
+def _objective(calc: TrajectoryCalculator, objective: str) -> Optional[float]:
+    """Значение критерия; None — расчёт разошёлся (inf/nan) или,
+    для avg_reg_time, регулирование не установилось"""
+    if objective == "avg_reg_time":
+        if _unsettled(calc):
+            return None
+        value = calc.avg_reg_time_1 + calc.avg_reg_time_2
+    else:
+        value = calc.avg_error_1 + calc.avg_error_2
+    return float(value) if math.isfinite(value) else None
+
+
+def evaluate_chunk(base: TrajectoryCalculator, gains: List[Gains], objective: str) -> List[Dict[str, Any]]:
+    """Рассчитать один пакет наборов коэффициентов.
+
+    objective: "avg_error" — сумма avg_error_1 + avg_error_2,
+    "avg_reg_time" — сумма avg_reg_time_1 + avg_reg_time_2.
+    """
+    states = [_with_gains(base.state, candidate) for candidate in gains]
+    calculators = BatchTrajectoryCalculator(states, base).calculate_trajectory(channels=())
+    return [
+        {
+            "Kp": candidate[0],
+            "Ki": candidate[1],
+            "Kd": candidate[2],
+            "avg_error_1": calc.avg_error_1,
+            "avg_error_2": calc.avg_error_2,
+            "avg_reg_time_1": calc.avg_reg_time_1,
+            "avg_reg_time_2": calc.avg_reg_time_2,
+            "objective": _objective(calc, objective),
+        }
+        for candidate, calc in zip(gains, calculators)
+    ]
+
+
+def plan_tuning(calc: TrajectoryCalculator, Kp: Sequence[GainRange], Ki: Sequence[GainRange],
+                Kd: Sequence[GainRange], workers: int) -> Tuple[TrajectoryCalculator, List[List[Gains]]]:
+    """Калькулятор без результатов и сетка, разбитая не больше чем на workers пакетов
+    (для evaluate_chunk). ValueError — слишком большая сетка или сессия
+    с адаптивным методом: пакетный расчёт идёт только методом Эйлера."""
+    if calc.state.integration_method != "euler":
+        raise ValueError(f"Подбор ПИД считает методом Эйлера, а сессия использует "
+                         f"{calc.state.integration_method}: переключите integration_method на euler")
+    grid = gain_grid(Kp, Ki, Kd)
+    chunk_count = max(1, min(workers, len(grid) // MIN_CHUNK_SIZE))
+    chunk_size = math.ceil(len(grid) / chunk_count)
+    return _targets_only(calc), [grid[start:start + chunk_size] for start in range(0, len(grid), chunk_size)]
+
+
+def tuning_result(objective: str, parts: Sequence[List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Итог подбора по результатам пакетов"""
+    evaluated = [point for part in parts for point in part]
+    # Если ни один набор не годится, лучший — первый, с objective = None
+    best = min(evaluated, key=lambda point: math.inf if point["objective"] is None else point["objective"])
+    return {"objective": objective, "evaluated": len(evaluated), "best": best, "grid": evaluated}
+
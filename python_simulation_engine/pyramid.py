@@ -0,0 +1,96 @@
+"""
+Пирамида минимумов и максимумов канала результатов (mipmap) для запросов
+произвольного отрезка времени (/api/robot/data/range).
+
+Уровень k (k >= 1) — минимумы и максимумы блоков по PYRAMID_FANOUT**k
+отсчётов; уровни строятся один раз после расчёта и хранятся рядом
+с результатами одним массивом на канал: [min_1, max_1, min_2, max_2, ...].
+Размеры уровней определяются длиной канала (см. level_sizes).
+Запрос отрезка читает самый подробный уровень, на котором отрезок
+укладывается в заданное число точек, — O(points), а не O(отсчётов).
+"""
+
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+PYRAMID_FANOUT = 4  # Отсчётов нижнего уровня в блоке верхнего; хранение — +2/3 длины канала
+
+
+def pyramid_attribute(channel: str) -> str:
+    """Атрибут калькулятора с пирамидой канала"""
+    return f"{channel}_pyramid"
+
+
+def level_sizes(n: int) -> List[int]:
+    """Число блоков на уровнях 1, 2, ... до уровня из одного блока"""
+    sizes = []
+    while n > 1:
+        n = -(-n // PYRAMID_FANOUT)
+        sizes.append(n)
+    return sizes
+
+
+def build_pyramid(values: np.ndarray) -> np.ndarray:
+    """Пирамида канала одним массивом (формат — в описании модуля)"""
+    low = high = np.asarray(values, dtype=float)
+    levels = []
+    while len(low) > 1:
+        # Неполный последний блок дополняется своим последним отсчётом
+        pad = (0, -len(low) % PYRAMID_FANOUT)
+        low = np.pad(low, pad, mode='edge').reshape(-1, PYRAMID_FANOUT).min(axis=1)
+        high = np.pad(high, pad, mode='edge').reshape(-1, PYRAMID_FANOUT).max(axis=1)
+        levels += [low, high]
+    return np.concatenate(levels) if levels else np.empty(0)
+
+
+def pyramid_level(pyramid: np.ndarray, n: int, level: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Минимумы и максимумы блоков уровня level (>= 1) пирамиды канала длины n"""
+    offset = 0
+    for number, size in enumerate(level_sizes(n), 1):
+        if number == level:
+            return pyramid[offset:offset + size], pyramid[offset + size:offset + 2 * size]
+        offset += 2 * size
+    raise ValueError(f"В пирамиде нет уровня {level}")
+
+
+def is_pyramid_of(pyramid: np.ndarray, n: int) -> bool:
+    """Пирамида соответствует каналу длины n (а не пуста или устарела)"""
+    return len(pyramid) == 2 * sum(level_sizes(n))
+
+
+class RangeWindow(NamedTuple):
+    """Блоки уровня пирамиды, покрывающие отрезок времени"""
+    level: int  # 0 — исходные отсчёты
+    block: int  # Отсчётов в блоке
+    start: int  # Первый отсчёт отрезка
+    first: int  # Первый блок
+    last: int   # За последним блоком
+
+
+def range_window(time: np.ndarray, t0: float, t1: float, points: int) -> RangeWindow:
+    """Самый подробный уровень, на котором отрезок [t0, t1] занимает не больше
+    points блоков. Крайние блоки могут захватывать отсчёты вне отрезка."""
+    start = int(np.searchsorted(time, t0, side='left'))
+    stop = int(np.searchsorted(time, t1, side='right'))
+    if stop <= start:
+        return RangeWindow(0, 1, start, start, start)
+    level, block = 0, 1
+    while (stop - 1) // block + 1 - start // block > points:
+        level += 1
+        block *= PYRAMID_FANOUT
+    return RangeWindow(level, block, start, start // block, (stop - 1) // block + 1)
+
+
+def range_envelope(values: np.ndarray, pyramid: np.ndarray, n: int, window: RangeWindow) -> Dict[str, np.ndarray]:
+    """Минимумы и максимумы канала длины n в блоках окна; на уровне 0
+    нужен только values, на остальных — только pyramid"""
+    if window.level == 0:
+        return {"min": values[window.first:window.last], "max": values[window.first:window.last]}
+    low, high = pyramid_level(pyramid, n, window.level)
+    return {"min": low[window.first:window.last], "max": high[window.first:window.last]}
+
+
+def window_time(time: np.ndarray, window: RangeWindow) -> np.ndarray:
+    """Время начала каждого блока окна; первый блок — не раньше начала отрезка"""
+    return time[np.maximum(np.arange(window.first, window.last) * window.block, window.start)]
@@ -1,24 +1,74 @@
 """
 Модуль для работы с Redis — хранение состояний калькуляторов по сессиям.
 Замена in-memory dict robot_calculators.
+
+Сессия:
+- calculator:{session_id}:state — хэш полей RobotState (JSON на поле),
+  изменение параметра переписывает только его поле;
+- calculator:{session_id}:session — хэш полей сессии (формат _pack на поле):
+  контур, циклограмма в декартовых координатах и ссылка на результаты.
+Запись сессии переписывает только поля, изменившиеся с её загрузки
+(см. _loaded_fields): параметр, изменённый, пока шёл расчёт, не теряется
+при сохранении результатов. Запись старого формата calculator:{session_id}
+(одна строка) читается и удаляется при первой полной записи.
+Результаты расчёта хранятся один раз на конфигурацию в result:{simulation_key}
+и общие для всех сессий.
+Вытеснение — по TTL, продлеваемому при чтении, и политикой Redis
+maxmemory-policy volatile-lru (см. docker-compose.yml).
+
+Операции с несколькими ключами выполняются одним конвейером (MULTI при
+записи). Каждая запись сессии пишет в calculator:{session_id}:version новую
+случайную метку — по ней проверяются калькуляторы, закэшированные в памяти
+процесса (см. calculator_cache). Метка, в отличие от счётчика, не повторяется
+после удаления сессии или истечения TTL ключа версии. У каждой операции есть асинхронный вариант (*_async) на
+redis.asyncio с ограниченным пулом соединений — для обработчиков FastAPI.
+
+Формат записей — двоичный (см. _pack): массивы float64 little-endian
+с перестановкой байтов и сжатием zlib, остальные поля — JSON-заголовок.
+Записи старого формата (JSON) читаются как раньше.
 """
 
+import copy
 import os
 import json
 import logging
+import struct
+import uuid
+import zlib
 from dataclasses import asdict
-from typing import Optional
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
+import numpy as np
 import redis
+import redis.asyncio as redis_asyncio
 
-from python_simulation_engine.trajectory_calculator import TrajectoryCalculator, RobotState
+from python_simulation_engine import calculator_cache
+from python_simulation_engine.trajectory_calculator import (
+    KINEMATIC_CHANNELS,
+    PYRAMID_ARRAYS,
+    RESULT_CHANNELS,
+    TrajectoryCalculator,
+    RobotState,
+)
 
 logger = logging.getLogger(__name__)
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 CALCULATOR_TTL = 60 * 60 * 24  # 24 часа
+RESULT_TTL = int(os.getenv("SIMULATION_RESULT_TTL", str(CALCULATOR_TTL)))  # Продлевается при каждом чтении
+
+# Двоичный формат записей: FORMAT_MAGIC, байт версии, тело, сжатое zlib
+FORMAT_MAGIC = b"RSIM"
+FORMAT_VERSION = 1
+COMPRESSION_LEVEL = 1  # Быстрое сжатие: основной выигрыш даёт перестановка байтов
+
+# Предел соединений асинхронного клиента; при исчерпании запрос ждёт свободное
+REDIS_MAX_CONNECTIONS = int(os.getenv("SIMULATION_REDIS_MAX_CONNECTIONS", "64"))
+REDIS_POOL_TIMEOUT = float(os.getenv("SIMULATION_REDIS_POOL_TIMEOUT", "5"))
 
 _redis_client: Optional[redis.Redis] = None
+_binary_redis_client: Optional[redis.Redis] = None
+_async_redis_client: Optional[redis_asyncio.Redis] = None
 
 
 def get_redis() -> redis.Redis:
@@ -29,187 +79,695 @@ def get_redis() -> redis.Redis:
     return _redis_client
 
 
+def get_binary_redis() -> redis.Redis:
+    """Клиент Redis без декодирования ответов — для записей в двоичном формате"""
+    global _binary_redis_client
+    if _binary_redis_client is None:
+        _binary_redis_client = redis.from_url(REDIS_URL, decode_responses=False)
+    return _binary_redis_client
+
+
+def get_async_redis() -> redis_asyncio.Redis:
+    """Асинхронный клиент (двоичный) с ограниченным пулом соединений"""
+    global _async_redis_client
+    if _async_redis_client is None:
+        pool = redis_asyncio.BlockingConnectionPool.from_url(
+            REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS, timeout=REDIS_POOL_TIMEOUT)
+        _async_redis_client = redis_asyncio.Redis(connection_pool=pool)
+    return _async_redis_client
+
+
+async def close_async_redis() -> None:
+    """Закрыть асинхронный клиент и его пул (при остановке приложения)"""
+    global _async_redis_client
+    if _async_redis_client is not None:
+        await _async_redis_client.aclose()
+        _async_redis_client = None
+
+
 def _calculator_key(session_id: str) -> str:
     """Ключ для хранения калькулятора в Redis"""
     return f"calculator:{session_id}"
 
 
-def _serialize_calculator(calc: TrajectoryCalculator) -> str:
-    """Сериализовать состояние калькулятора в JSON"""
-    data = {
-        # Состояние робота (dataclass -> dict)
-        "state": asdict(calc.state),
-
-        # Результаты расчётов
-        "output_time_array": calc.output_time_array,
-        "trajectory_q_1": calc.trajectory_q_1,
-        "trajectory_q_2": calc.trajectory_q_2,
-        "real_trajectory_x": calc.real_trajectory_x,
-        "real_trajectory_y": calc.real_trajectory_y,
-        "cyclogram_real_x": calc.cyclogram_real_x,
-        "cyclogram_real_y": calc.cyclogram_real_y,
-
-        # Массивы звена 1
-        "q_error_array_1": calc.q_error_array_1,
-        "SAU_SUM_array_1": calc.SAU_SUM_array_1,
-        "U_array_1": calc.U_array_1,
-        "Ustar_array_1": calc.Ustar_array_1,
-        "I_array_1": calc.I_array_1,
-        "M_ed_array_1": calc.M_ed_array_1,
-        "M1_array": calc.M1_array,
-        "M_ed_corrected_array_1": calc.M_ed_corrected_array_1,
-        "acceleration_array_1": calc.acceleration_array_1,
-        "speed_array_1": calc.speed_array_1,
-
-        # Массивы звена 2
-        "q_error_array_2": calc.q_error_array_2,
-        "SAU_SUM_array_2": calc.SAU_SUM_array_2,
-        "U_array_2": calc.U_array_2,
-        "Ustar_array_2": calc.Ustar_array_2,
-        "I_array_2": calc.I_array_2,
-        "M_ed_array_2": calc.M_ed_array_2,
-        "M2_array": calc.M2_array,
-        "M_ed_corrected_array_2": calc.M_ed_corrected_array_2,
-        "acceleration_array_2": calc.acceleration_array_2,
-        "speed_array_2": calc.speed_array_2,
-
-        # Контурное управление
-        "t_contur": calc.t_contur,
-        "x_contur": calc.x_contur,
-        "y_contur": calc.y_contur,
-        "t_contur_control": calc.t_contur_control,
-        "q1_contur_control": calc.q1_contur_control,
-        "q2_contur_control": calc.q2_contur_control,
-
-        # Сплайн
-        "q_1_spline": calc.q_1_spline,
-        "q_2_spline": calc.q_2_spline,
-        "t_spline": calc.t_spline,
-
-        # Качество регулирования
-        "error_1": calc.error_1,
-        "avg_error_1": calc.avg_error_1,
-        "median_error_1": calc.median_error_1,
-        "reg_time_1": calc.reg_time_1,
-        "avg_reg_time_1": calc.avg_reg_time_1,
-        "median_reg_time_1": calc.median_reg_time_1,
-
-        "error_2": calc.error_2,
-        "avg_error_2": calc.avg_error_2,
-        "median_error_2": calc.median_error_2,
-        "reg_time_2": calc.reg_time_2,
-        "avg_reg_time_2": calc.avg_reg_time_2,
-        "median_reg_time_2": calc.median_reg_time_2,
+def _state_key(session_id: str) -> str:
+    """Ключ хэша с полями RobotState сессии"""
+    return f"calculator:{session_id}:state"
+
+
+def _version_key(session_id: str) -> str:
+    """Ключ метки версии сессии (новая случайная при каждой записи)"""
+    return f"calculator:{session_id}:version"
+
+
+def _session_key(session_id: str) -> str:
+    """Ключ хэша с полями сессии помимо RobotState"""
+    return f"calculator:{session_id}:session"
+
+
+def _session_results_key(session_id: str) -> str:
+    """Ключ результатов сессии, не попавших в общее хранилище"""
+    return f"calculator:{session_id}:results"
+
+
+def _json_default(value: Any) -> Any:
+    """Преобразовать массивы NumPy в JSON-совместимые значения"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _pack(data: dict) -> bytes:
+    """Упаковать словарь: массивы NumPy — двоичные, остальное — JSON-заголовок.
+
+    Байты всех чисел переставлены (сначала первые байты всех чисел, затем
+    вторые и т.д.): старшие байты соседних значений совпадают, и zlib
+    сжимает их гораздо лучше.
+    """
+    arrays = {name: value for name, value in data.items() if isinstance(value, np.ndarray)}
+    header = {
+        "fields": {name: value for name, value in data.items() if name not in arrays},
+        "arrays": [[name, len(value)] for name, value in arrays.items()],
     }
-    return json.dumps(data)
+    header_bytes = json.dumps(header, default=_json_default).encode()
+    values = np.concatenate([value.ravel() for value in arrays.values()]) if arrays else np.empty(0)
+    shuffled = values.astype("<f8").view(np.uint8).reshape(-1, 8).T.tobytes()
+    body = struct.pack("<I", len(header_bytes)) + header_bytes + shuffled
+    return FORMAT_MAGIC + bytes([FORMAT_VERSION]) + zlib.compress(body, COMPRESSION_LEVEL)
+
+
+def _unpack(payload: Union[bytes, str]) -> dict:
+    """Распаковать запись двоичного формата или старого формата JSON"""
+    if isinstance(payload, str) or not payload.startswith(FORMAT_MAGIC):
+        return json.loads(payload)
+    version = payload[len(FORMAT_MAGIC)]
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Неизвестная версия формата записи: {version}")
+    body = zlib.decompress(payload[len(FORMAT_MAGIC) + 1:])
+    (header_size,) = struct.unpack_from("<I", body)
+    header = json.loads(body[4:4 + header_size])
+    shuffled = np.frombuffer(body, dtype=np.uint8, offset=4 + header_size)
+    values = shuffled.reshape(8, -1).T.copy().view("<f8").ravel().astype(float, copy=False)
+
+    data = header["fields"]
+    offset = 0
+    for name, size in header["arrays"]:
+        data[name] = values[offset:offset + size]
+        offset += size
+    return data
+
+
+def _load_array(data: dict, key: str) -> np.ndarray:
+    """Прочитать массив результатов как float64"""
+    return np.asarray(data.get(key, []), dtype=float)
+
+
+# Результаты расчёта: хранятся один раз на simulation_key в общем хранилище result:{key}
+RESULT_ARRAYS = RESULT_CHANNELS + KINEMATIC_CHANNELS + PYRAMID_ARRAYS
+RESULT_FIELDS = (
+    # Сплайн
+    "q_1_spline", "q_2_spline", "t_spline",
+    # Качество регулирования
+    "error_1", "avg_error_1", "median_error_1", "reg_time_1", "avg_reg_time_1", "median_reg_time_1",
+    "error_2", "avg_error_2", "median_error_2", "reg_time_2", "avg_reg_time_2", "median_reg_time_2",
+    # Контрольные точки для продолжения расчёта
+    "checkpoints",
+)
+# Состояние сессии помимо RobotState
+SESSION_FIELDS = (
+    "cyclogram_real_x", "cyclogram_real_y",
+    # Контурное управление
+    "t_contur", "x_contur", "y_contur", "t_contur_control", "q1_contur_control", "q2_contur_control",
+)
+
+
+def _results_data(calc: TrajectoryCalculator) -> dict:
+    """Результаты расчёта калькулятора"""
+    data = {name: getattr(calc, name) for name in RESULT_ARRAYS}
+    data.update({name: getattr(calc, name) for name in RESULT_FIELDS})
+    return data
+
 
+def _apply_results(calc: TrajectoryCalculator, data: dict) -> None:
+    """Заполнить результаты калькулятора; отсутствующие поля — значения по умолчанию"""
+    defaults = TrajectoryCalculator()
+    for name in RESULT_ARRAYS:
+        setattr(calc, name, _load_array(data, name))
+    for name in RESULT_FIELDS:
+        setattr(calc, name, data.get(name, getattr(defaults, name)))
 
-def _deserialize_calculator(json_str: str) -> TrajectoryCalculator:
-    """Десериализовать калькулятор из JSON"""
-    data = json.loads(json_str)
 
-    # Восстанавливаем RobotState
-    state_dict = data.get("state", {})
-    state = RobotState(**state_dict)
+def _session_data(calc: TrajectoryCalculator) -> dict:
+    """Поля сессии помимо RobotState и ссылка на результаты"""
+    data = {name: getattr(calc, name) for name in SESSION_FIELDS}
+    if calc.result_key is not None:
+        data["result_key"] = calc.result_key
+    return data
 
+
+def _state_mapping(state: RobotState) -> Dict[str, str]:
+    """Поля RobotState для хэша состояния: имя -> JSON значения"""
+    return {name: json.dumps(value, default=_json_default) for name, value in asdict(state).items()}
+
+
+# Поля хэша сессии
+SESSION_ENTRIES = SESSION_FIELDS + ("result_key",)
+
+
+def _loaded_fields(calc: TrajectoryCalculator) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """Поля калькулятора в том виде, в каком они прочитаны из Redis: запись
+    сравнивает с ними и переписывает только изменившиеся. Хранятся
+    в атрибуте loaded_fields и переживают передачу в пул процессов."""
+    return _state_mapping(calc.state), {name: getattr(calc, name) for name in SESSION_ENTRIES}
+
+
+def _changed_fields(calc: TrajectoryCalculator, loaded: Optional[tuple],
+                    assigned: bool = False) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """Поля RobotState (JSON) и поля сессии, изменившиеся с загрузки; loaded=None — все.
+    assigned=True — поля сессии не загружались: изменившимся считается поле,
+    которому присвоено новое значение, даже равное значению по умолчанию"""
+    state = _state_mapping(calc.state)
+    if loaded is None:
+        return state, {name: getattr(calc, name) for name in SESSION_ENTRIES}
+    state_before, session_before = loaded
+    session = {}
+    for name in SESSION_ENTRIES:
+        value = getattr(calc, name)
+        if value is not session_before[name] and (assigned or value != session_before[name]):
+            session[name] = value
+    return {name: value for name, value in state.items() if state_before.get(name) != value}, session
+
+
+def _queue_fields(pipe, session_id: str, state: Dict[str, str], session: Dict[str, Any]) -> None:
+    """Запись полей RobotState и полей сессии, продление TTL и новая версия"""
+    if state:
+        pipe.hset(_state_key(session_id), mapping=state)
+    pipe.expire(_state_key(session_id), CALCULATOR_TTL)
+    if session:
+        pipe.hset(_session_key(session_id), mapping={name: _pack({name: value}) for name, value in session.items()})
+    pipe.expire(_session_key(session_id), CALCULATOR_TTL)
+    _queue_version(pipe, session_id)
+
+
+def _has_results(calc: TrajectoryCalculator) -> bool:
+    return len(calc.output_time_array) > 0
+
+
+def _build_calculator(state: RobotState, data: dict) -> TrajectoryCalculator:
+    """Калькулятор из состояния и полей сессии; результаты, записанные
+    в самой записи сессии (старый формат), тоже восстанавливаются"""
     calc = TrajectoryCalculator(state=state)
+    _apply_session(calc, data)
+    if "output_time_array" in data:
+        _apply_results(calc, data)
+    return calc
 
-    # Восстанавливаем результаты расчётов
-    calc.output_time_array = data.get("output_time_array", [])
-    calc.trajectory_q_1 = data.get("trajectory_q_1", [])
-    calc.trajectory_q_2 = data.get("trajectory_q_2", [])
-    calc.real_trajectory_x = data.get("real_trajectory_x", [])
-    calc.real_trajectory_y = data.get("real_trajectory_y", [])
-    calc.cyclogram_real_x = data.get("cyclogram_real_x", [0] * 9)
-    calc.cyclogram_real_y = data.get("cyclogram_real_y", [0] * 9)
-
-    # Массивы звена 1
-    calc.q_error_array_1 = data.get("q_error_array_1", [])
-    calc.SAU_SUM_array_1 = data.get("SAU_SUM_array_1", [])
-    calc.U_array_1 = data.get("U_array_1", [])
-    calc.Ustar_array_1 = data.get("Ustar_array_1", [])
-    calc.I_array_1 = data.get("I_array_1", [])
-    calc.M_ed_array_1 = data.get("M_ed_array_1", [])
-    calc.M1_array = data.get("M1_array", [])
-    calc.M_ed_corrected_array_1 = data.get("M_ed_corrected_array_1", [])
-    calc.acceleration_array_1 = data.get("acceleration_array_1", [])
-    calc.speed_array_1 = data.get("speed_array_1", [])
-
-    # Массивы звена 2
-    calc.q_error_array_2 = data.get("q_error_array_2", [])
-    calc.SAU_SUM_array_2 = data.get("SAU_SUM_array_2", [])
-    calc.U_array_2 = data.get("U_array_2", [])
-    calc.Ustar_array_2 = data.get("Ustar_array_2", [])
-    calc.I_array_2 = data.get("I_array_2", [])
-    calc.M_ed_array_2 = data.get("M_ed_array_2", [])
-    calc.M2_array = data.get("M2_array", [])
-    calc.M_ed_corrected_array_2 = data.get("M_ed_corrected_array_2", [])
-    calc.acceleration_array_2 = data.get("acceleration_array_2", [])
-    calc.speed_array_2 = data.get("speed_array_2", [])
 
-    # Контурное управление
-    calc.t_contur = data.get("t_contur", [])
-    calc.x_contur = data.get("x_contur", [])
-    calc.y_contur = data.get("y_contur", [])
-    calc.t_contur_control = data.get("t_contur_control", [])
-    calc.q1_contur_control = data.get("q1_contur_control", [])
-    calc.q2_contur_control = data.get("q2_contur_control", [])
+def _apply_session(calc: TrajectoryCalculator, data: dict) -> None:
+    defaults = TrajectoryCalculator()
+    for name in SESSION_FIELDS:
+        setattr(calc, name, data.get(name, getattr(defaults, name)))
+    calc.result_key = data.get("result_key")
+    calc.loaded_fields = data.get("loaded_fields")
 
-    # Сплайн
-    calc.q_1_spline = data.get("q_1_spline", [])
-    calc.q_2_spline = data.get("q_2_spline", [])
-    calc.t_spline = data.get("t_spline", [])
 
-    # Качество регулирования
-    calc.error_1 = data.get("error_1", [])
-    calc.avg_error_1 = data.get("avg_error_1", 0)
-    calc.median_error_1 = data.get("median_error_1", 0)
-    calc.reg_time_1 = data.get("reg_time_1", [])
-    calc.avg_reg_time_1 = data.get("avg_reg_time_1", 0)
-    calc.median_reg_time_1 = data.get("median_reg_time_1", 0)
-
-    calc.error_2 = data.get("error_2", [])
-    calc.avg_error_2 = data.get("avg_error_2", 0)
-    calc.median_error_2 = data.get("median_error_2", 0)
-    calc.reg_time_2 = data.get("reg_time_2", [])
-    calc.avg_reg_time_2 = data.get("avg_reg_time_2", 0)
-    calc.median_reg_time_2 = data.get("median_reg_time_2", 0)
+def _result_key(key: str) -> str:
+    """Ключ общего хранилища результатов"""
+    return f"result:{key}"
+
+
+# Поле хэша результатов с RESULT_FIELDS; каждый массив RESULT_ARRAYS — в своём поле
+RESULT_FIELDS_ENTRY = "fields"
+
+
+def _write_results(pipe, key: str, calc: TrajectoryCalculator, ttl: int) -> None:
+    """Записать результаты в хэш key: по полю на канал (формат _pack)"""
+    mapping = {name: _pack({name: np.asarray(getattr(calc, name), dtype=float)}) for name in RESULT_ARRAYS}
+    mapping[RESULT_FIELDS_ENTRY] = _pack({name: getattr(calc, name) for name in RESULT_FIELDS})
+    pipe.delete(key)
+    pipe.hset(key, mapping=mapping)
+    pipe.expire(key, ttl)
+
+
+def _result_entries(names: Sequence[str]) -> List[str]:
+    """Поля хэша результатов для каналов names"""
+    entries = [name for name in names if name in RESULT_ARRAYS]
+    if any(name in RESULT_FIELDS for name in names):
+        entries.append(RESULT_FIELDS_ENTRY)
+    return entries
+
+
+def _decode_results(values: Sequence[Optional[bytes]]) -> dict:
+    data = {}
+    for payload in values:
+        if payload is not None:
+            data.update(_unpack(payload))
+    return data
+
 
+def _read_results(r: redis.Redis, key: str, names: Sequence[str], ttl: int) -> Optional[dict]:
+    """Прочитать каналы names (и RESULT_FIELDS, если запрошено хоть одно)
+    одним запросом и продлить TTL. None — результатов нет."""
+    entries = _result_entries(names)
+    pipe = r.pipeline(transaction=False)
+    pipe.hmget(key, entries)
+    pipe.expire(key, ttl)
+    try:
+        values, exists = pipe.execute()
+    except redis.ResponseError:
+        # Запись старого формата: все результаты одной строкой
+        payload = r.getex(key, ex=ttl)
+        return _unpack(payload) if payload is not None else None
+    return _decode_results(values) if exists else None
+
+
+async def _read_results_async(r: redis_asyncio.Redis, key: str, names: Sequence[str], ttl: int) -> Optional[dict]:
+    """Асинхронный вариант _read_results"""
+    entries = _result_entries(names)
+    pipe = r.pipeline(transaction=False)
+    pipe.hmget(key, entries)
+    pipe.expire(key, ttl)
+    try:
+        values, exists = await pipe.execute()
+    except redis.ResponseError:
+        payload = await r.getex(key, ex=ttl)
+        return _unpack(payload) if payload is not None else None
+    return _decode_results(values) if exists else None
+
+
+class StoredCalculator(TrajectoryCalculator):
+    """Калькулятор сессии, результаты которого остаются в Redis.
+
+    Массивы RESULT_ARRAYS и поля RESULT_FIELDS читаются при первом
+    обращении; load() читает несколько каналов одним запросом.
+    При pickle (передача в пул процессов) загружаются все каналы —
+    чтобы передать только часть, используйте detach().
+    Прочитанные каналы общие для копий из кэша (_clone): канал,
+    загруженный одним запросом, следующие берут из памяти.
+    """
+
+    def __init__(self, state: RobotState, r: redis.Redis, key: str, ttl: int):
+        super().__init__(state)
+        self._redis = r
+        self._results_key = key
+        self._results_ttl = ttl
+        self._pending = set(RESULT_ARRAYS + RESULT_FIELDS)
+        self._shared: Dict[str, Any] = {}
+        for name in self._pending:
+            del self.__dict__[name]
+        # Результаты совпадают с сохранёнными в Redis — переписывать их не нужно
+        self.results_stored = True
+
+    def __getattr__(self, name: str) -> Any:
+        if name not in self.__dict__.get("_pending", ()):
+            raise AttributeError(name)
+        self.load([name])
+        return self.__dict__[name]
+
+    def __reduce_ex__(self, protocol):
+        return _restore_calculator, (vars(self.detach(RESULT_ARRAYS + RESULT_FIELDS)),)
+
+    def load(self, names: Sequence[str]) -> None:
+        """Загрузить ещё не прочитанные каналы names одним запросом"""
+        names = self._take_shared(self._unloaded(names))
+        if names:
+            self._fill(names, _read_results(self._redis, self._results_key, names, self._results_ttl))
+
+    async def load_async(self, names: Sequence[str]) -> None:
+        """Асинхронный вариант load"""
+        names = self._take_shared(self._unloaded(names))
+        if names:
+            self._fill(names, await _read_results_async(get_async_redis(), self._results_key, names, self._results_ttl))
+
+    def _unloaded(self, names: Sequence[str]) -> List[str]:
+        names = [name for name in names if name in self._pending and name not in self.__dict__]
+        if any(name in RESULT_FIELDS for name in names):
+            # RESULT_FIELDS хранятся одним полем хэша — читаются вместе
+            names = list(dict.fromkeys(names + [name for name in RESULT_FIELDS if name in self._pending]))
+        return names
+
+    def _take_shared(self, names: List[str]) -> List[str]:
+        """Взять каналы, уже прочитанные копиями; возвращает оставшиеся"""
+        taken = [name for name in names if name in self._shared]
+        for name in taken:
+            setattr(self, name, self._shared[name])
+        self._pending.difference_update(taken)
+        return [name for name in names if name not in self._shared]
+
+    def _fill(self, names: List[str], data: Optional[dict]) -> None:
+        if data is None:
+            # Результаты вытеснены — калькулятор становится нерассчитанным
+            names = list(self._pending)
+            data = {}
+            self.result_key = None
+            self.results_stored = False
+        defaults = TrajectoryCalculator()
+        for name in names:
+            if name in self.__dict__:
+                continue
+            if name in RESULT_ARRAYS:
+                setattr(self, name, _load_array(data, name))
+            else:
+                setattr(self, name, data.get(name, getattr(defaults, name)))
+            if self.results_stored:
+                self._shared[name] = self.__dict__[name]
+        self._pending.difference_update(names)
+
+    def detach(self, names: Sequence[str] = ()) -> TrajectoryCalculator:
+        """Обычный калькулятор с каналами names; остальные результаты пусты"""
+        self.load(names)
+        calc = TrajectoryCalculator(self.state)
+        for name in SESSION_ENTRIES + ("loaded_fields",):
+            setattr(calc, name, getattr(self, name))
+        for name in RESULT_ARRAYS + RESULT_FIELDS:
+            if name in self.__dict__:
+                setattr(calc, name, self.__dict__[name])
+        return calc
+
+    def _clear_arrays(self):
+        # Поля качества и сплайна пересчёт перезаписывает не всегда — дочитываем их
+        self.load(RESULT_FIELDS)
+        self._pending.clear()
+        self.results_stored = False
+        super()._clear_arrays()
+
+
+def _restore_calculator(attributes: dict) -> TrajectoryCalculator:
+    """Восстановление StoredCalculator после pickle — обычным калькулятором"""
+    calc = TrajectoryCalculator.__new__(TrajectoryCalculator)
+    calc.__dict__.update(attributes)
     return calc
 
 
+def _clone(calc: TrajectoryCalculator) -> TrajectoryCalculator:
+    """Копия калькулятора из кэша для обработчика: массивы результатов
+    общие (расчёт их заменяет, а не изменяет), состояние — своё"""
+    clone = calc.__class__.__new__(calc.__class__)
+    clone.__dict__.update(vars(calc))
+    clone.state = copy.deepcopy(calc.state)
+    if isinstance(calc, StoredCalculator):
+        clone._pending = set(calc._pending)
+    return clone
+
+
+def _session_copy(calc: TrajectoryCalculator, results: bool) -> TrajectoryCalculator:
+    """Калькулятор для обработчика; results=False — без результатов"""
+    if results:
+        return _clone(calc)
+    plain = TrajectoryCalculator(state=copy.deepcopy(calc.state))
+    _apply_session(plain, {**_session_data(calc), "loaded_fields": calc.loaded_fields})
+    return plain
+
+
+def _results_replaced(calc: TrajectoryCalculator) -> bool:
+    """Результаты калькулятора отличаются от сохранённых в Redis"""
+    return not getattr(calc, "results_stored", False)
+
+
+def _apply_found_result(calc: TrajectoryCalculator, key: str, results: Optional[dict]) -> bool:
+    if results is None:
+        return False
+    _apply_results(calc, results)
+    calc.result_key = key
+    return True
+
+
+def load_result(calc: TrajectoryCalculator) -> bool:
+    """Подставить в калькулятор результаты такого же расчёта из общего хранилища.
+    Возвращает True, если результаты найдены."""
+    try:
+        key = calc.simulation_key()
+        results = _read_results(get_binary_redis(), _result_key(key), RESULT_ARRAYS + RESULT_FIELDS, RESULT_TTL)
+    except Exception as e:
+        logger.error(f"Ошибка чтения результатов из Redis: {e}")
+        return False
+    return _apply_found_result(calc, key, results)
+
+
+async def load_result_async(calc: TrajectoryCalculator) -> bool:
+    """Асинхронный вариант load_result"""
+    try:
+        key = calc.simulation_key()
+        results = await _read_results_async(
+            get_async_redis(), _result_key(key), RESULT_ARRAYS + RESULT_FIELDS, RESULT_TTL)
+    except Exception as e:
+        logger.error(f"Ошибка чтения результатов из Redis: {e}")
+        return False
+    return _apply_found_result(calc, key, results)
+
+
+def _queue_session(pipe, session_id: str) -> None:
+    """Чтение сессии: версия, хэш состояния, хэш сессии и запись старого формата"""
+    pipe.get(_version_key(session_id))
+    pipe.hgetall(_state_key(session_id))
+    pipe.hgetall(_session_key(session_id))
+    pipe.get(_calculator_key(session_id))
+
+
+def _decode_fields(fields: dict) -> dict:
+    """Поля хэша сессии"""
+    data = {}
+    for payload in fields.values():
+        data.update(_unpack(payload))
+    return data
+
+
+def _decode_session(session_id: str, results: bool, version: Optional[bytes], state_fields: dict,
+                    session_fields: dict, payload: Optional[bytes]) -> Tuple[Optional[TrajectoryCalculator], bool]:
+    """Калькулятор из ответа _queue_session. Возвращает (калькулятор или None,
+    есть ли хэш состояния). results=True — StoredCalculator с чтением
+    результатов по требованию. Разобранный калькулятор попадает в кэш."""
+    if not session_fields and payload is None:
+        return None, False
+
+    # Запись старого формата; поля, записанные уже в хэш сессии, новее её
+    data = _unpack(payload) if payload is not None else {}
+    data.update(_decode_fields(session_fields))
+    if state_fields:
+        state = _state_calculator(state_fields).state
+    else:
+        # Запись старого формата: состояние внутри записи сессии
+        state = RobotState(**data.get("state", {}))
+
+    if "output_time_array" in data:
+        return _build_calculator(state, data), bool(state_fields)
+    if data.get("result_key") is not None:
+        calc = StoredCalculator(state, get_binary_redis(), _result_key(data["result_key"]), RESULT_TTL)
+    else:
+        calc = StoredCalculator(state, get_binary_redis(), _session_results_key(session_id), CALCULATOR_TTL)
+    _apply_session(calc, data)
+    if state_fields and payload is None:
+        # Запись старого формата (loaded_fields = None) при сохранении переписывается целиком
+        calc.loaded_fields = _loaded_fields(calc)
+    calculator_cache.put(session_id, version, calc)
+    return _session_copy(calc, results), bool(state_fields)
+
+
+def _load(r: redis.Redis, session_id: str, results: bool) -> Tuple[Optional[TrajectoryCalculator], bool]:
+    # MULTI: версия и данные сессии читаются одним снимком, иначе в кэш
+    # могли бы попасть старые данные с номером новой версии
+    pipe = r.pipeline()
+    _queue_session(pipe, session_id)
+    return _decode_session(session_id, results, *pipe.execute())
+
+
+async def _load_async(r: redis_asyncio.Redis, session_id: str,
+                      results: bool) -> Tuple[Optional[TrajectoryCalculator], bool]:
+    pipe = r.pipeline()
+    _queue_session(pipe, session_id)
+    return _decode_session(session_id, results, *await pipe.execute())
+
+
+def _cached(session_id: str, version: Optional[bytes], results: bool) -> Optional[TrajectoryCalculator]:
+    """Копия калькулятора из кэша, если его версия совпадает с версией в Redis"""
+    calc = calculator_cache.get(session_id, version)
+    return None if calc is None else _session_copy(calc, results)
+
+
+def _queue_version(pipe, session_id: str) -> None:
+    """Новая версия сессии — калькуляторы в кэшах всех процессов устаревают.
+    Случайная метка, а не INCR: счётчик после удаления ключа начался бы
+    снова с 1 и совпал бы с версией, закэшированной другим процессом"""
+    pipe.set(_version_key(session_id), uuid.uuid4().hex, ex=CALCULATOR_TTL)
+
+
+def _shared_result_key(calc: TrajectoryCalculator) -> Optional[str]:
+    """Ключ общего хранилища, куда, возможно, нужно записать новые результаты"""
+    if calc.result_key is not None and _results_replaced(calc) and _has_results(calc):
+        return _result_key(calc.result_key)
+    return None
+
+
+def _queue_save(pipe, session_id: str, calc: TrajectoryCalculator, write_shared: bool) -> None:
+    """Запись сессии одной транзакцией (MULTI). write_shared — записать
+    результаты в общее хранилище (их там ещё нет).
+
+    Калькулятор, прочитанный из Redis, переписывает только поля,
+    изменившиеся с загрузки (обычно после расчёта — result_key):
+    параметры, изменённые за время расчёта, сохраняются."""
+    replaced = _results_replaced(calc)
+    if calc.result_key is not None:
+        if write_shared:
+            _write_results(pipe, _result_key(calc.result_key), calc, RESULT_TTL)
+        pipe.delete(_session_results_key(session_id))
+    elif replaced and _has_results(calc):
+        _write_results(pipe, _session_results_key(session_id), calc, CALCULATOR_TTL)
+    elif not replaced:
+        pipe.expire(_session_results_key(session_id), CALCULATOR_TTL)
+    loaded = getattr(calc, "loaded_fields", None)
+    if loaded is None:
+        pipe.delete(_calculator_key(session_id))
+    _queue_fields(pipe, session_id, *_changed_fields(calc, loaded))
+
+
 def save_calculator(session_id: str, calc: TrajectoryCalculator) -> None:
-    """Сохранить калькулятор в Redis с TTL"""
+    """Сохранить калькулятор в Redis с TTL.
+
+    RobotState — хэш calculator:{session_id}:state, поля сессии —
+    хэш calculator:{session_id}:session; у калькулятора, прочитанного
+    из Redis, — только изменившиеся поля. Рассчитанные результаты (result_key задан)
+    хранятся в общем хранилище, результаты без ключа (например, пакетного
+    расчёта) — в calculator:{session_id}:results, по полю хэша на канал.
+    Результаты, прочитанные из Redis и не изменённые, не переписываются.
+    """
     try:
-        r = get_redis()
-        key = _calculator_key(session_id)
-        json_str = _serialize_calculator(calc)
-        r.setex(key, CALCULATOR_TTL, json_str)
+        r = get_binary_redis()
+        shared = _shared_result_key(calc)
+        # Продление TTL заодно проверяет, есть ли результаты в общем хранилище
+        write_shared = shared is not None and not r.expire(shared, RESULT_TTL)
+        pipe = r.pipeline()
+        _queue_save(pipe, session_id, calc, write_shared)
+        pipe.execute()
+        calculator_cache.discard(session_id)
+        calc.loaded_fields = _loaded_fields(calc)
     except Exception as e:
         logger.error(f"Ошибка сохранения калькулятора в Redis: {e}")
         raise
 
 
-def load_calculator(session_id: str) -> Optional[TrajectoryCalculator]:
-    """Загрузить калькулятор из Redis. Возвращает None если не найден."""
+async def save_calculator_async(session_id: str, calc: TrajectoryCalculator) -> None:
+    """Асинхронный вариант save_calculator"""
     try:
-        r = get_redis()
-        key = _calculator_key(session_id)
-        json_str = r.get(key)
-        if json_str is None:
-            return None
-        return _deserialize_calculator(json_str)
+        r = get_async_redis()
+        shared = _shared_result_key(calc)
+        write_shared = shared is not None and not await r.expire(shared, RESULT_TTL)
+        pipe = r.pipeline()
+        _queue_save(pipe, session_id, calc, write_shared)
+        await pipe.execute()
+        calculator_cache.discard(session_id)
+        calc.loaded_fields = _loaded_fields(calc)
+    except Exception as e:
+        logger.error(f"Ошибка сохранения калькулятора в Redis: {e}")
+        raise
+
+
+def load_calculator(session_id: str, results: bool = True) -> Optional[TrajectoryCalculator]:
+    """Загрузить калькулятор из Redis. Возвращает None если не найден.
+    Результаты читаются при первом обращении (StoredCalculator);
+    results=False — обычный калькулятор без результатов.
+
+    Если версия сессии в Redis совпадает с закэшированной в процессе,
+    калькулятор берётся из кэша (одна команда GET вместо разбора записи)."""
+    try:
+        r = get_binary_redis()
+        calc = _cached(session_id, r.get(_version_key(session_id)), results)
+        return calc if calc is not None else _load(r, session_id, results)[0]
     except Exception as e:
         logger.error(f"Ошибка загрузки калькулятора из Redis: {e}")
         return None
 
 
+async def load_calculator_async(session_id: str, results: bool = True) -> Optional[TrajectoryCalculator]:
+    """Асинхронный вариант load_calculator. Результаты, нужные обработчику,
+    загружайте заранее через load_channels_async — обращение к незагруженному
+    каналу читает его синхронно."""
+    try:
+        r = get_async_redis()
+        calc = _cached(session_id, await r.get(_version_key(session_id)), results)
+        return calc if calc is not None else (await _load_async(r, session_id, results))[0]
+    except Exception as e:
+        logger.error(f"Ошибка загрузки калькулятора из Redis: {e}")
+        return None
+
+
+async def load_channels_async(calc: TrajectoryCalculator, names: Sequence[str]) -> None:
+    """Загрузить каналы результатов калькулятора сессии одним запросом"""
+    if isinstance(calc, StoredCalculator):
+        await calc.load_async(names)
+
+
+
+
+def _state_calculator(state_fields: dict) -> TrajectoryCalculator:
+    """Калькулятор только с состоянием из хэша; поля сессии — по умолчанию"""
+    return TrajectoryCalculator(RobotState(**{name.decode(): json.loads(value) for name, value in state_fields.items()}))
+
+
+def update_calculator(session_id: str, mutator: Callable[[TrajectoryCalculator], Any]) -> TrajectoryCalculator:
+    """Изменить параметры сессии.
+
+    Читается только хэш состояния: поля сессии (контур и т.п.) и результаты
+    не читаются. В Redis уходят изменившиеся поля RobotState и поля сессии,
+    которым mutator присвоил значения. Возвращает калькулятор, в котором
+    из полей сессии заполнены только присвоенные.
+    """
+    try:
+        r = get_binary_redis()
+        state_fields = r.hgetall(_state_key(session_id))
+        if not state_fields:
+            # Новая сессия или запись старого формата — сохраняется целиком
+            calc = _load(r, session_id, results=False)[0] or TrajectoryCalculator()
+            mutator(calc)
+            save_calculator(session_id, calc)
+            return calc
+
+        calc = _state_calculator(state_fields)
+        before = _loaded_fields(calc)
+        mutator(calc)
+        pipe = r.pipeline()
+        _queue_fields(pipe, session_id, *_changed_fields(calc, before, assigned=True))
+        pipe.execute()
+        calculator_cache.discard(session_id)
+        return calc
+    except Exception as e:
+        logger.error(f"Ошибка обновления калькулятора в Redis: {e}")
+        raise
+
+
+async def update_calculator_async(session_id: str,
+                                  mutator: Callable[[TrajectoryCalculator], Any]) -> TrajectoryCalculator:
+    """Асинхронный вариант update_calculator"""
+    try:
+        r = get_async_redis()
+        state_fields = await r.hgetall(_state_key(session_id))
+        if not state_fields:
+            calc = (await _load_async(r, session_id, results=False))[0] or TrajectoryCalculator()
+            mutator(calc)
+            await save_calculator_async(session_id, calc)
+            return calc
+
+        calc = _state_calculator(state_fields)
+        before = _loaded_fields(calc)
+        mutator(calc)
+        pipe = r.pipeline()
+        _queue_fields(pipe, session_id, *_changed_fields(calc, before, assigned=True))
+        await pipe.execute()
+        calculator_cache.discard(session_id)
+        return calc
+    except Exception as e:
+        logger.error(f"Ошибка обновления калькулятора в Redis: {e}")
+        raise
+
+
 def delete_calculator(session_id: str) -> bool:
     """Удалить калькулятор из Redis. Возвращает True если удалён."""
+    calculator_cache.discard(session_id)
     try:
-        r = get_redis()
-        key = _calculator_key(session_id)
-        deleted = r.delete(key)
+        r = get_binary_redis()
+        deleted = r.delete(_calculator_key(session_id), _state_key(session_id), _session_key(session_id),
+                           _session_results_key(session_id), _version_key(session_id))
         return deleted > 0
     except Exception as e:
         logger.error(f"Ошибка удаления калькулятора из Redis: {e}")
@@ -1,6 +1,15 @@
+import asyncio
 import datetime as dt
+from typing import List, Optional
 
-from fastapi import HTTPException
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import orjson
+
+from fastapi import HTTPException, Query
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
 from python_simulation_engine.models import (
     AllDataResponse,
@@ -12,12 +21,18 @@ from python_simulation_engine.models import (
     CylindricalLimitsRequest,
     CylindricalParamsRequest,
     CyclogramRequest,
+    DownsamplingAlgorithm,
+    ExportFileFormat,
     FullRobotConfig,
+    JobStatusResponse,
     LineContourRequest,
     MotorParamsRequest,
     PIDRequest,
+    PIDTuneRequest,
+    PIDTuneResponse,
     PlotResponse,
     PlotType,
+    RangeDataResponse,
     RobotStateResponse,
     RobotType,
     ScaraLimitsRequest,
@@ -26,12 +41,84 @@ from python_simulation_engine.models import (
     StatusResponse,
     WorkspaceResponse,
 )
-from python_simulation_engine import redis_client
-from python_simulation_engine.shared.app_factory import create_service_app
-from python_simulation_engine.shared.simulation_core import WorkspaceCalculator, get_calculator, save_calculator
+from python_simulation_engine import job_queue, pid_tuning, redis_client
+from python_simulation_engine.downsampling import downsample_indices
+from python_simulation_engine.export import EXPORT_FORMATS, ExportUnavailable, export_columns
+from python_simulation_engine.pyramid import (
+    build_pyramid,
+    is_pyramid_of,
+    pyramid_attribute,
+    range_envelope,
+    range_window,
+    window_time,
+)
+from python_simulation_engine.shared import compute_pool, plot_cache
+from python_simulation_engine.shared.app_factory import ArrayJSONResponse, create_service_app
+from python_simulation_engine.trajectory_calculator import PLOT_CHANNELS, RESULT_CHANNELS
+from python_simulation_engine.shared.simulation_core import (
+    calculation_summary,
+    detached,
+    get_calculator_async,
+    load_cached_result_async,
+    load_channels_async,
+    load_checkpoints_async,
+    save_calculator_async,
+    update_calculator_async,
+)
 
 
 app = create_service_app("Simulation Service")
+app.add_event_handler("startup", compute_pool.start)
+app.add_event_handler("shutdown", compute_pool.shutdown)
+app.add_event_handler("shutdown", redis_client.close_async_redis)
+
+MAX_DATA_POINTS = 10000
+
+# Ключ в ответе -> атрибут калькулятора
+TRAJECTORY_CHANNELS = {
+    "q1": "trajectory_q_1",
+    "q2": "trajectory_q_2",
+    "real_x": "real_trajectory_x",
+    "real_y": "real_trajectory_y",
+}
+# Ключ в ответе -> строка буфера результатов
+ELECTRICAL_CHANNELS = {
+    "U_1": "U_array_1",
+    "U_2": "U_array_2",
+    "Ustar_1": "Ustar_array_1",
+    "Ustar_2": "Ustar_array_2",
+    "I_1": "I_array_1",
+    "I_2": "I_array_2",
+}
+MECHANICAL_CHANNELS = {
+    "M_ed_1": "M_ed_array_1",
+    "M_ed_2": "M_ed_array_2",
+    "M_load_1": "M1_array",
+    "M_load_2": "M2_array",
+    "M_corrected_1": "M_ed_corrected_array_1",
+    "M_corrected_2": "M_ed_corrected_array_2",
+    "speed_1": "speed_array_1",
+    "speed_2": "speed_array_2",
+    "acceleration_1": "acceleration_array_1",
+    "acceleration_2": "acceleration_array_2",
+}
+# Каналы /data/range: ключ -> атрибут калькулятора
+RANGE_CHANNELS = {**TRAJECTORY_CHANNELS, **ELECTRICAL_CHANNELS, **MECHANICAL_CHANNELS}
+RANGE_POINTS = 1000
+# Каналы /data/export: время всегда первым столбцом, затем выбранные каналы
+EXPORT_CHANNELS = {
+    "time": "output_time_array",
+    **RANGE_CHANNELS,
+    "q_error_1": "q_error_array_1",
+    "q_error_2": "q_error_array_2",
+    "SAU_SUM_1": "SAU_SUM_array_1",
+    "SAU_SUM_2": "SAU_SUM_array_2",
+}
+# Каналы результатов, которые отдаёт /data/all
+DATA_CHANNELS = (
+    "output_time_array", *TRAJECTORY_CHANNELS.values(),
+    *ELECTRICAL_CHANNELS.values(), *MECHANICAL_CHANNELS.values(), *redis_client.RESULT_FIELDS,
+)
 
 
 @app.get("/healthz")
@@ -40,14 +127,16 @@ def healthz():
 
 
 @app.post("/api/robot/configure", response_model=StatusResponse)
-def configure_robot(config: FullRobotConfig, session_id: str = "default"):
-    try:
-        calc = get_calculator(session_id)
+async def configure_robot(config: FullRobotConfig, session_id: str = "default"):
+    def mutator(calc):
         state = calc.state
         state.robot_type = config.robot_type.value
         state.type_of_control = config.type_of_control.value
         state.spline = config.spline
         state.num_splain_dots = config.num_splain_dots
+        state.integration_method = config.integration_method.value
+        state.integration_dt = config.integration_dt
+        state.output_decimation = config.output_decimation
         state.Kp = config.Kp
         state.Ki = config.Ki
         state.Kd = config.Kd
@@ -65,27 +154,27 @@ def configure_robot(config: FullRobotConfig, session_id: str = "default"):
             "q1col_min", "q1col_max", "a2col_min", "a2col_max", "q3col_min", "q3col_max", "zcol_min", "zcol_max", "momentcol_1", "momentcol_2", "momentcol_3", "lengthcol_1", "lengthcol_2", "distancecol", "masscol_2", "masscol_3",
         ]:
             setattr(state, field, getattr(config, field))
-        save_calculator(session_id, calc)
+
+    try:
+        await _update_state(session_id, mutator)
         return {"success": True, "message": "Робот успешно сконфигурирован"}
     except Exception as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
-def _update_state(session_id: str, mutator):
-    calc = get_calculator(session_id)
-    mutator(calc)
-    save_calculator(session_id, calc)
-    return calc
+async def _update_state(session_id: str, mutator):
+    """Изменить параметры сессии; в Redis пишутся только изменившиеся поля"""
+    return await update_calculator_async(session_id, mutator)
 
 
 @app.post("/api/robot/type", response_model=StatusResponse)
-def set_robot_type(robot_type: RobotType, session_id: str = "default"):
-    _update_state(session_id, lambda calc: setattr(calc.state, "robot_type", robot_type.value))
+async def set_robot_type(robot_type: RobotType, session_id: str = "default"):
+    await _update_state(session_id, lambda calc: setattr(calc.state, "robot_type", robot_type.value))
     return {"success": True, "message": f"Тип робота установлен: {robot_type.value}"}
 
 
 @app.post("/api/robot/cyclogram", response_model=StatusResponse)
-def set_cyclogram(data: CyclogramRequest, session_id: str = "default"):
+async def set_cyclogram(data: CyclogramRequest, session_id: str = "default"):
     def mutator(calc):
         calc.state.t = data.t
         calc.state.q1 = data.q1
@@ -93,18 +182,49 @@ def set_cyclogram(data: CyclogramRequest, session_id: str = "default"):
         calc.state.q3 = data.q3 or [0] * len(data.t)
         calc.state.q4 = data.q4 or [0] * len(data.t)
         calc.state.type_of_control = data.type_of_control.value
-    _update_state(session_id, mutator)
+    await _update_state(session_id, mutator)
     return {"success": True, "message": f"Циклограмма установлена ({len(data.t)} точек)"}
 
 
 @app.post("/api/robot/pid", response_model=StatusResponse)
-def set_pid(data: PIDRequest, session_id: str = "default"):
-    _update_state(session_id, lambda calc: [setattr(calc.state, key, getattr(data, key)) for key in ("Kp", "Ki", "Kd")])
+async def set_pid(data: PIDRequest, session_id: str = "default"):
+    await _update_state(session_id, lambda calc: [setattr(calc.state, key, getattr(data, key)) for key in ("Kp", "Ki", "Kd")])
     return {"success": True, "message": "Параметры ПИД установлены"}
 
 
+@app.post("/api/robot/pid/tune", response_model=PIDTuneResponse)
+async def tune_pid(data: PIDTuneRequest, session_id: str = "default"):
+    calc = await get_calculator_async(session_id, results=False)
+    ranges = {
+        name: [(item.min, item.max, item.steps) for item in getattr(data, name)]
+        for name in ("Kp", "Ki", "Kd")
+    }
+    try:
+        base, chunks = pid_tuning.plan_tuning(calc, workers=max(1, compute_pool.POOL_WORKERS), **ranges)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    # Пакеты — задачи общего пула (с его таймаутом); при 0 процессов — в потоках
+    objective = data.objective.value
+    parts = await asyncio.gather(*(_offload(pid_tuning.evaluate_chunk, base, chunk, objective) for chunk in chunks))
+    result = pid_tuning.tuning_result(objective, parts)
+
+    if data.apply:
+        if result["best"]["objective"] is None:
+            raise HTTPException(status_code=422,
+                                detail="Ни один набор коэффициентов не дал сходящегося установившегося регулирования")
+
+        def mutator(calc):
+            for key in ("Kp", "Ki", "Kd"):
+                coefficients = list(getattr(calc.state, key))
+                coefficients[:2] = result["best"][key]
+                setattr(calc.state, key, coefficients)
+        await update_calculator_async(session_id, mutator)
+    return {"success": True, **result}
+
+
 @app.post("/api/robot/motors", response_model=StatusResponse)
-def set_motor_params(data: MotorParamsRequest, session_id: str = "default"):
+async def set_motor_params(data: MotorParamsRequest, session_id: str = "default"):
     def mutator(calc):
         calc.state.J = data.J
         calc.state.T_e = data.T_e
@@ -113,60 +233,66 @@ def set_motor_params(data: MotorParamsRequest, session_id: str = "default"):
         calc.state.Ce = data.Ce
         calc.state.Ra = data.Ra
         calc.state.Cm = data.Cm
-    _update_state(session_id, mutator)
+    await _update_state(session_id, mutator)
     return {"success": True, "message": "Параметры двигателей установлены"}
 
 
-def _generic_update(session_id: str, data, fields: list[str], message: str):
+async def _generic_update(session_id: str, data, fields: list[str], message: str):
     def mutator(calc):
         for field in fields:
             setattr(calc.state, field, getattr(data, field))
-    _update_state(session_id, mutator)
+    await _update_state(session_id, mutator)
     return {"success": True, "message": message}
 
 
 @app.post("/api/robot/cartesian/limits", response_model=StatusResponse)
-def set_cartesian_limits(data: CartesianLimitsRequest, session_id: str = "default"):
-    return _generic_update(session_id, data, ["x_min", "x_max", "y_min", "y_max", "z_min", "z_max", "q_min", "q_max"], "Ограничения декартового робота установлены")
+async def set_cartesian_limits(data: CartesianLimitsRequest, session_id: str = "default"):
+    return await _generic_update(session_id, data, ["x_min", "x_max", "y_min", "y_max", "z_min", "z_max", "q_min", "q_max"], "Ограничения декартового робота установлены")
 
 
 @app.post("/api/robot/cartesian/params", response_model=StatusResponse)
-def set_cartesian_params(data: CartesianParamsRequest, session_id: str = "default"):
-    return _generic_update(session_id, data, ["massd_1", "massd_2", "massd_3", "momentd_1"], "Параметры декартового робота установлены")
+async def set_cartesian_params(data: CartesianParamsRequest, session_id: str = "default"):
+    return await _generic_update(session_id, data, ["massd_1", "massd_2", "massd_3", "momentd_1"], "Параметры декартового робота установлены")
 
 
 @app.post("/api/robot/scara/limits", response_model=StatusResponse)
-def set_scara_limits(data: ScaraLimitsRequest, session_id: str = "default"):
-    return _generic_update(session_id, data, ["q1s_min", "q1s_max", "q2s_min", "q2s_max", "q3s_min", "q3s_max", "zs_min", "zs_max"], "Ограничения SCARA робота установлены")
+async def set_scara_limits(data: ScaraLimitsRequest, session_id: str = "default"):
+    return await _generic_update(session_id, data, ["q1s_min", "q1s_max", "q2s_min", "q2s_max", "q3s_min", "q3s_max", "zs_min", "zs_max"], "Ограничения SCARA робота установлены")
 
 
 @app.post("/api/robot/scara/params", response_model=StatusResponse)
-def set_scara_params(data: ScaraParamsRequest, session_id: str = "default"):
-    return _generic_update(session_id, data, ["moment_1", "moment_2", "moment_3", "length_1", "length_2", "distance", "masss_2", "masss_3"], "Параметры SCARA робота установлены")
+async def set_scara_params(data: ScaraParamsRequest, session_id: str = "default"):
+    return await _generic_update(session_id, data, ["moment_1", "moment_2", "moment_3", "length_1", "length_2", "distance", "masss_2", "masss_3"], "Параметры SCARA робота установлены")
 
 
 @app.post("/api/robot/cylindrical/limits", response_model=StatusResponse)
-def set_cylindrical_limits(data: CylindricalLimitsRequest, session_id: str = "default"):
-    return _generic_update(session_id, data, ["q1c_min", "q1c_max", "a2c_min", "a2c_max", "q3c_min", "q3c_max", "zc_min", "zc_max"], "Ограничения цилиндрического робота установлены")
+async def set_cylindrical_limits(data: CylindricalLimitsRequest, session_id: str = "default"):
+    return await _generic_update(session_id, data, ["q1c_min", "q1c_max", "a2c_min", "a2c_max", "q3c_min", "q3c_max", "zc_min", "zc_max"], "Ограничения цилиндрического робота установлены")
 
 
 @app.post("/api/robot/cylindrical/params", response_model=StatusResponse)
-def set_cylindrical_params(data: CylindricalParamsRequest, session_id: str = "default"):
-    return _generic_update(session_id, data, ["momentc_1", "momentc_2", "momentc_3", "lengthc_1", "lengthc_2", "distancec", "massc_2", "massc_3"], "Параметры цилиндрического робота установлены")
+async def set_cylindrical_params(data: CylindricalParamsRequest, session_id: str = "default"):
+    return await _generic_update(session_id, data, ["momentc_1", "momentc_2", "momentc_3", "lengthc_1", "lengthc_2", "distancec", "massc_2", "massc_3"], "Параметры цилиндрического робота установлены")
 
 
 @app.post("/api/robot/coler/limits", response_model=StatusResponse)
-def set_coler_limits(data: ColerLimitsRequest, session_id: str = "default"):
-    return _generic_update(session_id, data, ["q1col_min", "q1col_max", "a2col_min", "a2col_max", "q3col_min", "q3col_max", "zcol_min", "zcol_max"], "Ограничения робота Колер установлены")
+async def set_coler_limits(data: ColerLimitsRequest, session_id: str = "default"):
+    return await _generic_update(session_id, data, ["q1col_min", "q1col_max", "a2col_min", "a2col_max", "q3col_min", "q3col_max", "zcol_min", "zcol_max"], "Ограничения робота Колер установлены")
 
 
 @app.post("/api/robot/coler/params", response_model=StatusResponse)
-def set_coler_params(data: ColerParamsRequest, session_id: str = "default"):
-    return _generic_update(session_id, data, ["momentcol_1", "momentcol_2", "momentcol_3", "lengthcol_1", "lengthcol_2", "distancecol", "masscol_2", "masscol_3"], "Параметры робота Колер установлены")
+async def set_coler_params(data: ColerParamsRequest, session_id: str = "default"):
+    return await _generic_update(session_id, data, ["momentcol_1", "momentcol_2", "momentcol_3", "lengthcol_1", "lengthcol_2", "distancecol", "masscol_2", "masscol_3"], "Параметры робота Колер установлены")
+
+
+def _set_contour_resolution(calc, data):
+    calc.state.contour_points = data.points
+    calc.state.contour_t_start = data.t_start
+    calc.state.contour_t_stop = data.t_stop
 
 
 @app.post("/api/robot/contour/line", response_model=StatusResponse)
-def set_line_contour(data: LineContourRequest, session_id: str = "default"):
+async def set_line_contour(data: LineContourRequest, session_id: str = "default"):
     def mutator(calc):
         calc.state.type_of_control = "Контурное"
         calc.state.line_x1 = data.x1
@@ -174,38 +300,40 @@ def set_line_contour(data: LineContourRequest, session_id: str = "default"):
         calc.state.line_y1 = data.y1
         calc.state.line_y2 = data.y2
         calc.state.line_speed = data.speed
-        calc.create_contour_line(data.x1, data.x2, data.y1, data.y2)
+        _set_contour_resolution(calc, data)
+        calc.create_contour_line(data.x1, data.x2, data.y1, data.y2, data.points, data.t_start, data.t_stop)
         calc.reverse_coordinate_transform()
-    _update_state(session_id, mutator)
+    await _update_state(session_id, mutator)
     return {"success": True, "message": "Линейный контур установлен"}
 
 
 @app.post("/api/robot/contour/circle", response_model=StatusResponse)
-def set_circle_contour(data: CircleContourRequest, session_id: str = "default"):
+async def set_circle_contour(data: CircleContourRequest, session_id: str = "default"):
     def mutator(calc):
         calc.state.type_of_control = "Контурное"
         calc.state.circle_x = data.x
         calc.state.circle_y = data.y
         calc.state.circle_radius = data.radius
         calc.state.circle_speed = data.speed
-        calc.create_contour_circle(data.x, data.y, data.radius)
+        _set_contour_resolution(calc, data)
+        calc.create_contour_circle(data.x, data.y, data.radius, data.points, data.t_start, data.t_stop)
         calc.reverse_coordinate_transform()
-    _update_state(session_id, mutator)
+    await _update_state(session_id, mutator)
     return {"success": True, "message": "Круговой контур установлен"}
 
 
 @app.post("/api/robot/spline", response_model=StatusResponse)
-def set_spline(data: SplineRequest, session_id: str = "default"):
+async def set_spline(data: SplineRequest, session_id: str = "default"):
     def mutator(calc):
         calc.state.spline = data.enabled
         calc.state.num_splain_dots = data.num_dots
-    _update_state(session_id, mutator)
+    await _update_state(session_id, mutator)
     return {"success": True, "message": f"Сплайн {'включен' if data.enabled else 'выключен'}"}
 
 
 @app.get("/api/robot/state", response_model=RobotStateResponse)
-def get_robot_state(session_id: str = "default"):
-    calc = get_calculator(session_id)
+async def get_robot_state(session_id: str = "default"):
+    calc = await get_calculator_async(session_id, results=False)
     s = calc.state
     return {
         "robot_type": s.robot_type,
@@ -218,101 +346,206 @@ def get_robot_state(session_id: str = "default"):
     }
 
 
+async def _offload(fn, *args):
+    """Выполнить тяжёлую задачу в пуле процессов (см. shared.compute_pool)"""
+    try:
+        return await compute_pool.run(fn, *args)
+    except compute_pool.ComputeTimeout as exc:
+        raise HTTPException(status_code=504, detail=str(exc)) from exc
+    except BrokenProcessPool as exc:
+        raise HTTPException(status_code=503, detail="Процесс расчёта аварийно завершился") from exc
+
+
+async def _computed(calc):
+    """Рассчитанный калькулятор: результаты такой же конфигурации берутся
+    из общего хранилища, иначе расчёт в пуле процессов — с контрольной
+    точки предыдущего расчёта, если начало циклограммы не изменилось"""
+    if await load_cached_result_async(calc):
+        return calc
+    names = RESULT_CHANNELS if await load_checkpoints_async(calc) else ()
+    return await _offload(compute_pool.calculate, detached(calc, names))
+
+
+async def _calculated(session_id: str):
+    """Калькулятор сессии с рассчитанной траекторией"""
+    calc = await get_calculator_async(session_id)
+    await load_channels_async(calc, ("output_time_array",))
+    if len(calc.output_time_array) == 0:
+        calc = await _computed(calc)
+        await save_calculator_async(session_id, calc)
+    return calc
+
+
 @app.post("/api/robot/calculate")
-def calculate_trajectory(session_id: str = "default"):
-    calc = get_calculator(session_id)
-    calc.calculate_trajectory()
-    calc.coordinate_transform()
-    summary = calc.get_results_summary()
-    save_calculator(session_id, calc)
+async def calculate_trajectory(session_id: str = "default", background: bool = False):
+    if background:
+        # Расчёт выполнит воркер очереди (python -m python_simulation_engine.job_queue)
+        job_id = await run_in_threadpool(job_queue.enqueue_calculation, session_id)
+        return {"success": True, "job_id": job_id, "status": job_queue.STATUS_QUEUED}
+    calc = await get_calculator_async(session_id)
+    calc = await _computed(calc)
+    await save_calculator_async(session_id, calc)
+    return calculation_summary(calc)
+
+
+@app.get("/api/robot/jobs/{job_id}", response_model=JobStatusResponse)
+def get_job_status(job_id: str):
+    job = job_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задание не найдено")
+    return {"success": True, **job}
+
+
+def _ndjson(payload) -> bytes:
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+
+
+# Каналы отрезков /calculate/stream (строки буфера результатов)
+STREAM_CHANNELS = (
+    "output_time_array", "trajectory_q_1", "trajectory_q_2",
+    *ELECTRICAL_CHANNELS.values(), *MECHANICAL_CHANNELS.values(),
+)
+
+
+def _stream_start(calc, points: int) -> dict:
     return {
-        "success": True,
-        "robot_type": summary["robot_type"],
-        "type_of_control": summary["type_of_control"],
-        "spline": summary["spline"],
-        "trajectory_length": summary["trajectory_length"],
-        "quality_link_1": summary["quality"]["link_1"],
-        "quality_link_2": summary["quality"]["link_2"],
+        "type": "start",
+        "robot_type": calc.state.robot_type,
+        "type_of_control": calc.state.type_of_control,
+        "points": points,
+    }
+
+
+def _stream_chunk(calc, segment, channels):
+    """Строка отрезка по прореженным каналам STREAM_CHANNELS
+    (как /data/all с algorithm=stride)"""
+    q1 = channels["trajectory_q_1"]
+    q2 = channels["trajectory_q_2"]
+    real_x, real_y = calc.forward_kinematics(q1, q2)
+    return {
+        "type": "chunk",
+        "segment": segment,
+        "time": channels["output_time_array"].tolist(),
+        "trajectory": {"q1": q1.tolist(), "q2": q2.tolist(), "real_x": real_x.tolist(), "real_y": real_y.tolist()},
+        "electrical": {key: channels[name].tolist() for key, name in ELECTRICAL_CHANNELS.items()},
+        "mechanical": {key: channels[name].tolist() for key, name in MECHANICAL_CHANNELS.items()},
     }
 
 
+@app.post("/api/robot/calculate/stream")
+async def calculate_trajectory_stream(session_id: str = "default"):
+    """Расчёт с выдачей результатов по участкам циклограммы (NDJSON).
+
+    Строки: {"type": "start"}, затем {"type": "chunk"} на каждый участок,
+    в конце {"type": "done"} с тем же содержимым, что и /api/robot/calculate,
+    или {"type": "error"}. Готовые результаты такой же конфигурации выдаются
+    одним отрезком; иначе расчёт идёт в пуле процессов (с контрольной точки,
+    как в /api/robot/calculate), а отрезки передаются через очередь.
+    """
+    calc = await get_calculator_async(session_id)
+
+    async def lines():
+        nonlocal calc
+        try:
+            if await load_cached_result_async(calc):
+                total = len(calc.output_time_array)
+                window = slice(0, total, max(1, total // MAX_DATA_POINTS))
+                yield _ndjson(_stream_start(calc, len(range(total)[window])))
+                if total:
+                    yield _ndjson(_stream_chunk(calc, 0, {name: getattr(calc, name)[window] for name in STREAM_CHANNELS}))
+            else:
+                names = RESULT_CHANNELS if await load_checkpoints_async(calc) else ()
+                out = compute_pool.channel()
+                task = asyncio.ensure_future(_offload(
+                    compute_pool.calculate_stream, detached(calc, names), out, STREAM_CHANNELS, MAX_DATA_POINTS))
+                try:
+                    async for item in compute_pool.relay(out, task):
+                        if item[0] == "start":
+                            yield _ndjson(_stream_start(calc, item[1]))
+                        else:
+                            yield _ndjson(_stream_chunk(calc, *item[1:]))
+                    calc = await task
+                finally:
+                    # Клиент отключился: результат расчёта не нужен
+                    task.cancel()
+            await save_calculator_async(session_id, calc)
+        except Exception as exc:
+            yield _ndjson({"type": "error", "detail": getattr(exc, "detail", str(exc))})
+            return
+        yield _ndjson({"type": "done", **calculation_summary(calc)})
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @app.get("/api/robot/plot/{plot_type}", response_model=PlotResponse)
-def get_plot(plot_type: PlotType, session_id: str = "default"):
-    calc = get_calculator(session_id)
-    if not calc.output_time_array:
-        calc.calculate_trajectory()
-        calc.coordinate_transform()
-        save_calculator(session_id, calc)
-    image_base64 = calc.generate_plot(plot_type.value)
+async def get_plot(plot_type: PlotType, session_id: str = "default"):
+    calc = await _calculated(session_id)
+    key = plot_cache.plot_key(calc, plot_type.value)
+    image_base64 = await run_in_threadpool(plot_cache.get, key) if key else None
+    if image_base64 is None:
+        await load_channels_async(calc, PLOT_CHANNELS[plot_type.value])
+        plot_calc = detached(calc, PLOT_CHANNELS[plot_type.value])
+        image_base64 = await _offload(compute_pool.render_plot, plot_calc, plot_type.value)
+        if image_base64 and key:
+            await run_in_threadpool(plot_cache.put, key, image_base64)
     if not image_base64:
         raise HTTPException(status_code=400, detail="Не удалось создать график")
     return {"success": True, "plot_type": plot_type.value, "image_base64": image_base64}
 
 
 @app.get("/api/robot/workspace", response_model=WorkspaceResponse)
-def get_workspace(session_id: str = "default"):
-    calc = get_calculator(session_id)
-    workspace_calc = WorkspaceCalculator(calc.state)
-    return {"success": True, "robot_type": calc.state.robot_type, "image_base64": workspace_calc.generate_workspace_plot()}
+async def get_workspace(session_id: str = "default"):
+    calc = await get_calculator_async(session_id, results=False)
+    image_base64 = await _offload(compute_pool.render_workspace, calc.state)
+    return {"success": True, "robot_type": calc.state.robot_type, "image_base64": image_base64}
 
 
 @app.get("/api/robot/spline-cyclegram")
-def get_spline_cyclegram(session_id: str = "default"):
-    calc = get_calculator(session_id)
-    t_list = list(getattr(calc, "t_spline", []))
-    q1_list = list(getattr(calc, "q_1_spline", []))
-    q2_list = list(getattr(calc, "q_2_spline", []))
-    return {"success": True, "data": {"t": t_list, "q1": q1_list, "q2": q2_list}, "length": max(len(t_list), len(q1_list), len(q2_list)), "spline_enabled": calc.state.spline}
+async def get_spline_cyclegram(session_id: str = "default"):
+    calc = await get_calculator_async(session_id)
+    await load_channels_async(calc, ("t_spline", "q_1_spline", "q_2_spline"))
+    t_list = np.asarray(getattr(calc, "t_spline", []), dtype=float)
+    q1_list = np.asarray(getattr(calc, "q_1_spline", []), dtype=float)
+    q2_list = np.asarray(getattr(calc, "q_2_spline", []), dtype=float)
+    return ArrayJSONResponse({"success": True, "data": {"t": t_list, "q1": q1_list, "q2": q2_list}, "length": max(len(t_list), len(q1_list), len(q2_list)), "spline_enabled": calc.state.spline})
+
+
+def _downsampled(calc, channels, algorithm: str, max_points: int):
+    """Время и каналы группы {ключ: атрибут}, прореженные общими номерами отсчётов"""
+    time = np.asarray(calc.output_time_array, dtype=float)
+    arrays = {key: np.asarray(getattr(calc, name), dtype=float) for key, name in channels.items()}
+    indices = downsample_indices(algorithm, time, list(arrays.values()), max_points)
+    return {"time": time[indices], **{key: values[indices] for key, values in arrays.items()}}
 
 
 @app.get("/api/robot/data/all", response_model=AllDataResponse)
-def get_all_data(session_id: str = "default"):
-    calc = get_calculator(session_id)
-    if not calc.output_time_array:
-        calc.calculate_trajectory()
-        calc.coordinate_transform()
-        save_calculator(session_id, calc)
+async def get_all_data(session_id: str = "default",
+                       max_points: int = Query(MAX_DATA_POINTS, ge=2, le=MAX_DATA_POINTS),
+                       algorithm: DownsamplingAlgorithm = DownsamplingAlgorithm.MINMAX):
+    # Расчёт, если его ещё нет, — в пуле процессов, как для /plot и /data/range
+    calc = await _calculated(session_id)
+    await load_channels_async(calc, DATA_CHANNELS)
+    # Прореживание и запись JSON — в пуле потоков: NumPy отпускает GIL
+    return await run_in_threadpool(_all_data_response, calc, algorithm.value, max_points)
+
 
+def _all_data_response(calc, algorithm: str, max_points: int) -> ArrayJSONResponse:
     s = calc.state
-    max_points = 10000
-    step = max(1, len(calc.output_time_array) // max_points)
-    time = calc.output_time_array[::step]
-    return {
+    # Каждая группа прореживается по своим каналам: пики тока не теряются
+    # из-за того, что номера отсчётов выбраны по траектории.
+    # Массивы пишутся в JSON напрямую; AllDataResponse — только схема OpenAPI
+    return ArrayJSONResponse({
         "success": True,
         "trajectory": {
-            "time": time,
-            "q1": calc.trajectory_q_1[::step],
-            "q2": calc.trajectory_q_2[::step],
-            "real_x": calc.real_trajectory_x[::step] if calc.real_trajectory_x else [],
-            "real_y": calc.real_trajectory_y[::step] if calc.real_trajectory_y else [],
+            **_downsampled(calc, TRAJECTORY_CHANNELS, algorithm, max_points),
             "cyclogram_x": calc.cyclogram_real_x,
             "cyclogram_y": calc.cyclogram_real_y,
             "cyclogram_t": s.t,
             "cyclogram_q1": s.q1,
             "cyclogram_q2": s.q2,
         },
-        "electrical": {
-            "time": time,
-            "U_1": calc.U_array_1[::step],
-            "U_2": calc.U_array_2[::step],
-            "Ustar_1": calc.Ustar_array_1[::step],
-            "Ustar_2": calc.Ustar_array_2[::step],
-            "I_1": calc.I_array_1[::step],
-            "I_2": calc.I_array_2[::step],
-        },
-        "mechanical": {
-            "time": time,
-            "M_ed_1": calc.M_ed_array_1[::step],
-            "M_ed_2": calc.M_ed_array_2[::step],
-            "M_load_1": calc.M1_array[::step],
-            "M_load_2": calc.M2_array[::step],
-            "M_corrected_1": calc.M_ed_corrected_array_1[::step],
-            "M_corrected_2": calc.M_ed_corrected_array_2[::step],
-            "speed_1": calc.speed_array_1[::step],
-            "speed_2": calc.speed_array_2[::step],
-            "acceleration_1": calc.acceleration_array_1[::step],
-            "acceleration_2": calc.acceleration_array_2[::step],
-        },
+        "electrical": _downsampled(calc, ELECTRICAL_CHANNELS, algorithm, max_points),
+        "mechanical": _downsampled(calc, MECHANICAL_CHANNELS, algorithm, max_points),
         "quality_link_1": {
             "errors": calc.error_1,
             "avg_error": calc.avg_error_1,
@@ -329,7 +562,77 @@ def get_all_data(session_id: str = "default"):
             "avg_reg_time": calc.avg_reg_time_2,
             "median_reg_time": calc.median_reg_time_2,
         },
-    }
+    })
+
+
+def _envelope(calc, name: str, window, n: int):
+    """Огибающая канала в окне: на уровне 0 — исходные отсчёты, иначе — пирамида
+    (для результатов без пирамиды, например старых, она строится заново)"""
+    if window.level == 0:
+        return range_envelope(getattr(calc, name), None, n, window)
+    pyramid = getattr(calc, pyramid_attribute(name))
+    if not is_pyramid_of(pyramid, n):
+        pyramid = build_pyramid(getattr(calc, name))
+    return range_envelope(None, pyramid, n, window)
+
+
+@app.get("/api/robot/data/range", response_model=RangeDataResponse)
+async def get_range_data(t0: float, t1: float, points: int = Query(RANGE_POINTS, ge=2, le=MAX_DATA_POINTS),
+                         channels: Optional[List[str]] = Query(None), session_id: str = "default"):
+    """Отрезок [t0, t1] не больше чем в points точках: минимум и максимум
+    каждого блока из уровня пирамиды — O(points), а не O(отсчётов)"""
+    keys = channels or list(RANGE_CHANNELS)
+    unknown = [key for key in keys if key not in RANGE_CHANNELS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестные каналы: {', '.join(unknown)}")
+    if t1 < t0:
+        raise HTTPException(status_code=400, detail="t1 должно быть не меньше t0")
+
+    calc = await _calculated(session_id)
+    names = [RANGE_CHANNELS[key] for key in keys]
+    await load_channels_async(calc, ("output_time_array", *map(pyramid_attribute, names)))
+    time = calc.output_time_array
+    n = len(time)
+    window = range_window(time, t0, t1, points)
+    # Исходные каналы читаются, только если без них не обойтись
+    raw = [name for name in names
+           if window.level == 0 or not is_pyramid_of(getattr(calc, pyramid_attribute(name)), n)]
+    await load_channels_async(calc, raw)
+    return ArrayJSONResponse({
+        "success": True,
+        "t0": t0,
+        "t1": t1,
+        "level": window.level,
+        "block": window.block,
+        "time": window_time(time, window),
+        "channels": {key: _envelope(calc, name, window, n) for key, name in zip(keys, names)},
+    })
+
+
+@app.get("/api/robot/data/export")
+async def export_data(format: ExportFileFormat = ExportFileFormat.NPZ,
+                      channels: Optional[List[str]] = Query(None), session_id: str = "default"):
+    """Каналы в полном разрешении файлом npz, Arrow IPC stream или Parquet;
+    массивы результатов пишутся как есть и отдаются по частям"""
+    keys = channels or [key for key in EXPORT_CHANNELS if key != "time"]
+    unknown = [key for key in keys if key not in EXPORT_CHANNELS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестные каналы: {', '.join(unknown)}")
+    keys = ["time", *(key for key in dict.fromkeys(keys) if key != "time")]
+
+    calc = await _calculated(session_id)
+    names = [EXPORT_CHANNELS[key] for key in keys]
+    await load_channels_async(calc, names)
+    columns = {key: getattr(calc, name) for key, name in zip(keys, names)}
+    try:
+        chunks = export_columns(format.value, columns)
+    except ExportUnavailable as exc:
+        raise HTTPException(status_code=501, detail=str(exc)) from exc
+    export = EXPORT_FORMATS[format.value]
+    return StreamingResponse(
+        chunks, media_type=export.media_type,
+        headers={"Content-Disposition": f"attachment; filename=trajectory.{export.extension}"},
+    )
 
 
 @app.delete("/api/robot/session/{session_id}")
@@ -0,0 +1,176 @@
+"""
+Пул процессов для тяжёлых расчётов сервиса симуляции.
+
+Расчёт траектории и отрисовка графиков matplotlib — чистый Python под GIL;
+в пуле потоков Starlette один такой запрос тормозит все остальные.
+Здесь они выполняются в отдельных процессах, а обработчики лишь ждут
+результат, не блокируя цикл событий.
+
+Настройки (переменные окружения):
+- SIMULATION_POOL_WORKERS — число процессов (по умолчанию число ядер);
+  0 — выполнять в пуле потоков текущего процесса (тесты, отладка);
+- SIMULATION_POOL_TIMEOUT — предельное время задачи, с;
+- SIMULATION_POOL_MAX_TASKS — перезапускать процесс после стольких задач
+  (0 — не перезапускать).
+
+Промежуточные результаты задача передаёт через очередь (channel, relay):
+прокси очереди менеджера multiprocessing, а без пула — queue.Queue.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, Callable, Optional, Sequence
+
+from starlette.concurrency import run_in_threadpool
+
+from python_simulation_engine.trajectory_calculator import WorkspaceCalculator
+
+logger = logging.getLogger(__name__)
+
+POOL_WORKERS = int(os.getenv("SIMULATION_POOL_WORKERS") or os.cpu_count() or 1)
+POOL_TIMEOUT = float(os.getenv("SIMULATION_POOL_TIMEOUT", "120"))
+POOL_MAX_TASKS = int(os.getenv("SIMULATION_POOL_MAX_TASKS", "0"))
+RELAY_POLL_INTERVAL = 0.5  # Как часто relay проверяет, не завершилась ли задача, с
+
+_pool: Optional[ProcessPoolExecutor] = None
+_manager = None
+
+
+class ComputeTimeout(TimeoutError):
+    """Задача не уложилась в SIMULATION_POOL_TIMEOUT"""
+
+
+def _warm_up() -> int:
+    """Пустая задача: процесс пула стартует и импортирует этот модуль
+    (numpy, scipy, matplotlib) до первого настоящего запроса"""
+    return os.getpid()
+
+
+def get_pool() -> Optional[ProcessPoolExecutor]:
+    """Пул процессов (создаётся при первом обращении); None — пул отключён"""
+    global _pool
+    if POOL_WORKERS <= 0:
+        return None
+    if _pool is None:
+        # spawn: не копировать в дочерние процессы потоки и соединения uvicorn/Redis
+        _pool = ProcessPoolExecutor(
+            max_workers=POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            max_tasks_per_child=POOL_MAX_TASKS or None,
+        )
+    return _pool
+
+
+def start() -> None:
+    """Запустить все процессы пула заранее, чтобы первый запрос не ждал их старта"""
+    pool = get_pool()
+    if pool is not None:
+        for _ in range(POOL_WORKERS):
+            pool.submit(_warm_up)
+
+
+def shutdown() -> None:
+    """Остановить пул и менеджер очередей; невыполненные задачи отменяются"""
+    global _pool, _manager
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+    if _manager is not None:
+        _manager.shutdown()
+        _manager = None
+
+
+def channel():
+    """Очередь для передачи промежуточных результатов из задачи пула"""
+    global _manager
+    if get_pool() is None:
+        return queue.Queue()
+    if _manager is None:
+        _manager = multiprocessing.get_context("spawn").Manager()
+    return _manager.Queue()
+
+
+async def relay(out, task: "asyncio.Future") -> AsyncIterator[Any]:
+    """Элементы очереди out по мере поступления — до None или до завершения
+    задачи task (процесс пула мог упасть, не дописав очередь)"""
+    while True:
+        try:
+            item = await run_in_threadpool(out.get, True, RELAY_POLL_INTERVAL)
+        except queue.Empty:
+            if task.done():
+                return
+            continue
+        if item is None:
+            return
+        yield item
+
+
+async def run(fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+    """Выполнить fn(*args) в пуле процессов и дождаться результата.
+
+    fn и аргументы должны сериализоваться pickle. По истечении времени
+    бросается ComputeTimeout; уже начатая задача досчитывается в своём
+    процессе, но её результат отбрасывается.
+    """
+    timeout = POOL_TIMEOUT if timeout is None else timeout
+    pool = get_pool()
+    if pool is None:
+        call = run_in_threadpool(fn, *args)
+    else:
+        try:
+            call = asyncio.wrap_future(pool.submit(fn, *args))
+        except BrokenProcessPool:
+            # Процесс пула упал раньше (OOM и т.п.) — пересоздаём пул
+            logger.error("Пул процессов сломан, пересоздание")
+            shutdown()
+            call = asyncio.wrap_future(get_pool().submit(fn, *args))
+    try:
+        return await asyncio.wait_for(call, timeout)
+    except asyncio.TimeoutError as exc:
+        raise ComputeTimeout(f"Расчёт не уложился в {timeout:g} с") from exc
+    except BrokenProcessPool:
+        logger.error("Процесс пула упал во время задачи")
+        shutdown()
+        raise
+
+
+# === Задачи пула (функции верхнего уровня — для pickle) ===
+
+def calculate(calc):
+    """Рассчитать траекторию и декартовы координаты; возвращает калькулятор"""
+    calc.calculate_trajectory()
+    calc.coordinate_transform()
+    return calc
+
+
+def calculate_stream(calc, out, channels: Sequence[str], max_points: int):
+    """calculate с выдачей отрезков в очередь out по мере расчёта:
+    ("start", число точек), затем ("chunk", номер, {канал: отрезок}) —
+    каждый step-й отсчёт, не более max_points на весь расчёт; в конце None"""
+    step = None
+    try:
+        for segment, (result, start, stop) in enumerate(calc.iter_calculate_trajectory()):
+            if step is None:
+                total = len(result["output_time_array"])
+                step = max(1, total // max_points)
+                out.put(("start", len(range(0, total, step))))
+            if stop > start:
+                window = slice(start + (-start % step), stop, step)
+                out.put(("chunk", segment, {name: result[name][window] for name in channels}))
+        calc.coordinate_transform()
+    finally:
+        out.put(None)
+    return calc
+
+
+def render_plot(calc, plot_type: str) -> str:
+    return calc.generate_plot(plot_type)
+
+
+def render_workspace(state) -> str:
+    return WorkspaceCalculator(state).generate_workspace_plot()
@@ -0,0 +1,100 @@
+"""
+Кэш отрисованных графиков (base64 PNG).
+
+Ключ — (result_key, хэш данных сессии на графике, тип графика, параметры
+отрисовки): пока не изменились ни результаты расчёта, ни циклограмма, контур
+и прочие наложения (TrajectoryCalculator.plot_inputs_key), повторный запрос
+графика не перерисовывает его.
+Пересчёт с другими параметрами даёт другой result_key, и старые записи
+вытесняются сами.
+
+Уровни:
+- память процесса — LRU, ограниченный суммарным размером изображений;
+- Redis (необязательно) — общий для всех процессов и реплик, с TTL.
+
+Настройки (переменные окружения):
+- SIMULATION_PLOT_CACHE_BYTES — предел кэша в памяти, байт (0 — отключён);
+- SIMULATION_PLOT_CACHE_REDIS — 1, чтобы включить уровень Redis;
+- SIMULATION_PLOT_CACHE_TTL — TTL записей в Redis, с.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from python_simulation_engine import redis_client
+from python_simulation_engine.trajectory_calculator import PLOT_DPI, PLOT_FIGSIZE
+
+logger = logging.getLogger(__name__)
+
+PLOT_CACHE_BYTES = int(os.getenv("SIMULATION_PLOT_CACHE_BYTES", str(64 * 1024 * 1024)))
+PLOT_CACHE_REDIS = os.getenv("SIMULATION_PLOT_CACHE_REDIS", "0") == "1"
+PLOT_CACHE_TTL = int(os.getenv("SIMULATION_PLOT_CACHE_TTL", str(60 * 60)))
+
+_images: "OrderedDict[str, str]" = OrderedDict()
+_size = 0
+_lock = threading.Lock()
+
+
+def plot_key(calc, plot_type: str) -> Optional[str]:
+    """Ключ графика; None — результаты без result_key, кэшировать нельзя"""
+    if calc.result_key is None:
+        return None
+    width, height = PLOT_FIGSIZE
+    return f"plot:{calc.result_key}:{calc.plot_inputs_key()}:{plot_type}:{width}x{height}@{PLOT_DPI}"
+
+
+def _remember(key: str, image: str) -> None:
+    """Положить изображение в память, вытеснив давно не использованные"""
+    global _size
+    if len(image) > PLOT_CACHE_BYTES:
+        return
+    with _lock:
+        previous = _images.pop(key, None)
+        if previous is not None:
+            _size -= len(previous)
+        _images[key] = image
+        _size += len(image)
+        while _size > PLOT_CACHE_BYTES:
+            _, evicted = _images.popitem(last=False)
+            _size -= len(evicted)
+
+
+def get(key: str) -> Optional[str]:
+    """Изображение из кэша или None"""
+    with _lock:
+        image = _images.get(key)
+        if image is not None:
+            _images.move_to_end(key)
+            return image
+    if not PLOT_CACHE_REDIS:
+        return None
+    try:
+        image = redis_client.get_redis().get(key)
+    except Exception as e:
+        logger.error(f"Ошибка чтения графика из Redis: {e}")
+        return None
+    if image is not None:
+        _remember(key, image)
+    return image
+
+
+def put(key: str, image: str) -> None:
+    """Сохранить изображение в кэш"""
+    _remember(key, image)
+    if not PLOT_CACHE_REDIS:
+        return
+    try:
+        redis_client.get_redis().setex(key, PLOT_CACHE_TTL, image)
+    except Exception as e:
+        logger.error(f"Ошибка сохранения графика в Redis: {e}")
+
+
+def clear() -> None:
+    """Очистить кэш в памяти"""
+    global _size
+    with _lock:
+        _images.clear()
+        _size = 0
@@ -1,17 +1,121 @@
-from python_simulation_engine.trajectory_calculator import TrajectoryCalculator, WorkspaceCalculator
+from python_simulation_engine.trajectory_calculator import RESULT_CHANNELS, TrajectoryCalculator, WorkspaceCalculator
 from python_simulation_engine import redis_client
 
 
-def get_calculator(session_id: str = "default") -> TrajectoryCalculator:
-    calc = redis_client.load_calculator(session_id)
+def get_calculator(session_id: str = "default", results: bool = True) -> TrajectoryCalculator:
+    calc = redis_client.load_calculator(session_id, results)
     if calc is None:
         calc = TrajectoryCalculator()
         redis_client.save_calculator(session_id, calc)
     return calc
 
 
+async def get_calculator_async(session_id: str = "default", results: bool = True) -> TrajectoryCalculator:
+    calc = await redis_client.load_calculator_async(session_id, results)
+    if calc is None:
+        calc = TrajectoryCalculator()
+        await redis_client.save_calculator_async(session_id, calc)
+    return calc
+
+
 def save_calculator(session_id: str, calc: TrajectoryCalculator) -> None:
     redis_client.save_calculator(session_id, calc)
 
 
-__all__ = ["TrajectoryCalculator", "WorkspaceCalculator", "get_calculator", "save_calculator"]
+async def save_calculator_async(session_id: str, calc: TrajectoryCalculator) -> None:
+    await redis_client.save_calculator_async(session_id, calc)
+
+
+def load_channels(calc: TrajectoryCalculator, names) -> None:
+    """Загрузить из Redis одним запросом каналы результатов, которые понадобятся"""
+    if isinstance(calc, redis_client.StoredCalculator):
+        calc.load(names)
+
+
+async def load_channels_async(calc: TrajectoryCalculator, names) -> None:
+    await redis_client.load_channels_async(calc, names)
+
+
+def load_checkpoints(calc: TrajectoryCalculator) -> bool:
+    """Если расчёт можно продолжить с контрольной точки предыдущего
+    (см. TrajectoryCalculator.resume_segment), загрузить его результаты.
+    Возвращает True, если продолжение возможно."""
+    load_channels(calc, ("checkpoints", "output_time_array"))
+    if not calc.resume_segment():
+        return False
+    load_channels(calc, RESULT_CHANNELS)
+    return True
+
+
+async def load_checkpoints_async(calc: TrajectoryCalculator) -> bool:
+    await load_channels_async(calc, ("checkpoints", "output_time_array"))
+    if not calc.resume_segment():
+        return False
+    await load_channels_async(calc, RESULT_CHANNELS)
+    return True
+
+
+def detached(calc: TrajectoryCalculator, names=()) -> TrajectoryCalculator:
+    """Калькулятор для передачи в процесс пула только с каналами names
+    (для калькулятора сессии остальные результаты из Redis не читаются)"""
+    if isinstance(calc, redis_client.StoredCalculator):
+        return calc.detach(names)
+    return calc
+
+
+def update_calculator(session_id: str, mutator) -> TrajectoryCalculator:
+    """Изменить параметры сессии без чтения и записи массивов результатов"""
+    return redis_client.update_calculator(session_id, mutator)
+
+
+async def update_calculator_async(session_id: str, mutator) -> TrajectoryCalculator:
+    return await redis_client.update_calculator_async(session_id, mutator)
+
+
+def load_cached_result(calc: TrajectoryCalculator) -> bool:
+    """Взять результаты такой же конфигурации из общего хранилища вместо расчёта.
+    Возвращает True, если расчёт не нужен."""
+    if not redis_client.load_result(calc):
+        return False
+    calc.coordinate_transform()
+    return True
+
+
+async def load_cached_result_async(calc: TrajectoryCalculator) -> bool:
+    if not await redis_client.load_result_async(calc):
+        return False
+    calc.coordinate_transform()
+    return True
+
+
+def calculation_summary(calc: TrajectoryCalculator) -> dict:
+    summary = calc.get_results_summary()
+    return {
+        "success": True,
+        "robot_type": summary["robot_type"],
+        "type_of_control": summary["type_of_control"],
+        "spline": summary["spline"],
+        "trajectory_length": summary["trajectory_length"],
+        "quality_link_1": summary["quality"]["link_1"],
+        "quality_link_2": summary["quality"]["link_2"],
+    }
+
+
+__all__ = [
+    "TrajectoryCalculator",
+    "WorkspaceCalculator",
+    "calculation_summary",
+    "detached",
+    "get_calculator",
+    "get_calculator_async",
+    "load_cached_result",
+    "load_cached_result_async",
+    "load_channels",
+    "load_channels_async",
+    "load_checkpoints",
+    "load_checkpoints_async",
+    "save_calculator",
+    "save_calculator_async",
+    "update_calculator",
+    "update_calculator_async",
+]
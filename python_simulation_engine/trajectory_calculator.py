@@ -12,8 +12,186 @@ import matplotlib.pyplot as plt
 from matplotlib.patches import Rectangle, Wedge
 import io
 import base64
-from typing import List, Tuple, Dict, Any, Optional
-from dataclasses import dataclass, field
+import hashlib
+import json
+from typing import List, Tuple, Dict, Any, Iterator, Optional
+from dataclasses import asdict, dataclass, field
+
+from python_simulation_engine.adaptive_integrator import integrate_adaptive
+from python_simulation_engine.dynamics import collect_parameters, robot_dynamics
+from python_simulation_engine.kinematics import coler_forward, forward_kinematics, inverse_kinematics
+from python_simulation_engine.pyramid import build_pyramid, pyramid_attribute
+
+
+# Каналы результатов robot_function — строки общего буфера результатов
+RESULT_CHANNELS = (
+    'output_time_array',
+    'q_error_array_1',
+    'SAU_SUM_array_1',
+    'U_array_1',
+    'Ustar_array_1',
+    'I_array_1',
+    'M_ed_array_1',
+    'M1_array',
+    'M_ed_corrected_array_1',
+    'acceleration_array_1',
+    'speed_array_1',
+    'trajectory_q_1',
+    'q_error_array_2',
+    'SAU_SUM_array_2',
+    'U_array_2',
+    'Ustar_array_2',
+    'I_array_2',
+    'M_ed_array_2',
+    'M2_array',
+    'M_ed_corrected_array_2',
+    'acceleration_array_2',
+    'speed_array_2',
+    'trajectory_q_2',
+)
+
+# Каналы с пирамидой минимумов и максимумов (см. pyramid): все, кроме времени
+KINEMATIC_CHANNELS = ('real_trajectory_x', 'real_trajectory_y')
+PYRAMID_CHANNELS = RESULT_CHANNELS[1:] + KINEMATIC_CHANNELS
+PYRAMID_ARRAYS = tuple(pyramid_attribute(name) for name in PYRAMID_CHANNELS)
+
+
+# Версия расчётной модели: входит в simulation_key, менять при изменении результатов расчёта
+SIMULATION_VERSION = 1
+
+# Параметры отрисовки графиков generate_plot
+PLOT_FIGSIZE = (11, 11)
+PLOT_DPI = 100
+# Массивы результатов, которые рисует каждый график
+PLOT_CHANNELS = {
+    'decart_plane': ('real_trajectory_x', 'real_trajectory_y'),
+    'obobshennie_coordinates': ('output_time_array', 'trajectory_q_1', 'trajectory_q_2'),
+    'decart_coordinates': ('output_time_array', 'real_trajectory_x', 'real_trajectory_y'),
+    'voltage': ('output_time_array', 'U_array_1', 'U_array_2'),
+    'voltage_star': ('output_time_array', 'Ustar_array_1', 'Ustar_array_2'),
+    'current': ('output_time_array', 'I_array_1', 'I_array_2'),
+    'motor_moment': ('output_time_array', 'M_ed_array_1', 'M_ed_array_2'),
+    'load_moment': ('output_time_array', 'M1_array', 'M2_array'),
+    'moment_star': ('output_time_array', 'M_ed_corrected_array_1', 'M_ed_corrected_array_2'),
+    'speed': ('output_time_array', 'speed_array_1', 'speed_array_2'),
+    'acceleration': ('output_time_array', 'acceleration_array_1', 'acceleration_array_2'),
+}
+
+# Данные сессии, которые графики рисуют поверх результатов расчёта
+PLOT_OVERLAYS = ('cyclogram_real_x', 'cyclogram_real_y', 'x_contur', 'y_contur',
+                 't_contur_control', 'q1_contur_control', 'q2_contur_control')
+
+# Поля RobotState, не влияющие на результат расчёта
+IGNORED_STATE_FIELDS = {'q3', 'q4'}
+# Циклограмма и сплайн — только для позиционного управления
+POSITIONAL_STATE_FIELDS = {'t', 'q1', 'q2', 'spline', 'num_splain_dots'}
+# Параметры контура: в ключ входят построенные по ним задающие воздействия
+CONTOUR_STATE_FIELDS = {
+    'line_x1', 'line_x2', 'line_y1', 'line_y2', 'line_speed',
+    'circle_x', 'circle_y', 'circle_radius', 'circle_speed',
+    'contour_points', 'contour_t_start', 'contour_t_stop',
+}
+
+# Разрешение контура по умолчанию: число точек и отрезок времени
+CONTOUR_POINTS = 1000
+CONTOUR_T_START = 10
+CONTOUR_T_STOP = 110
+
+
+# Переменные интегратора в контрольной точке (после номера шага и номера сохранённого шага)
+CHECKPOINT_VARIABLES = (
+    'q_output_1', 'q_output_2', 'U_1', 'U_2', 'I_a_1', 'I_a_2', 'a_w_1', 'a_w_2',
+    'W_1', 'W_2', 'q_error_prev_1', 'q_error_prev_2', 'Integral_channel_1', 'Integral_channel_2',
+)
+
+
+def _checkpoint(n: int, k: int, *variables: float) -> list:
+    """Контрольная точка: номер шага, номер сохранённого шага и CHECKPOINT_VARIABLES"""
+    return [n, k, *(float(value) for value in variables)]
+
+
+# Предел числа отсчётов, проверяемых за один шаг _first_in_band
+BAND_SEARCH_CHUNK = 1 << 20
+
+
+def _first_in_band(trajectory: np.ndarray, starts: np.ndarray, centers: np.ndarray,
+                   thresholds: np.ndarray) -> np.ndarray:
+    """Для каждой точки — индекс первого отсчёта trajectory начиная со starts[i],
+    для которого |x - centers[i]| <= thresholds[i] (при centers[i] == 0 — x == 0);
+    -1, если такого нет.
+
+    Окна проверяются сразу для всех ещё не найденных точек, и ширина окна
+    удваивается: обычно отсчёт находится в первом же окне.
+    """
+    sample_count = len(trajectory)
+    settled = np.full(len(starts), -1)
+    positions = np.asarray(starts).copy()
+    pending = np.flatnonzero(positions < sample_count)
+    width = 1
+    while pending.size:
+        indices = positions[pending, None] + np.arange(width)
+        values = trajectory[np.minimum(indices, sample_count - 1)]
+        center = centers[pending, None]
+        stable = np.where(center != 0, np.abs(values - center) <= thresholds[pending, None], values == 0)
+        stable &= indices < sample_count
+        found = stable.any(axis=1)
+        settled[pending[found]] = indices[found, stable[found].argmax(axis=1)]
+        positions[pending] += width
+        pending = pending[~found]
+        pending = pending[positions[pending] < sample_count]
+        width = max(1, min(2 * width, BAND_SEARCH_CHUNK // max(1, pending.size)))
+    return settled
+
+
+def _coler_workspace_points(s: "RobotState", a_2: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Сетка точек рабочей области робота Колер: 50 положений по вертикали x 100 углов"""
+    a1_linspace = np.linspace(s.a2col_min, s.a2col_max, 50)
+    q1_linspace = np.linspace(s.q1col_min, s.q1col_max, 100)
+    heights, angles = np.meshgrid(a1_linspace, q1_linspace, indexing='ij')
+    return coler_forward(heights.ravel(), angles.ravel(), 0, a_2)
+
+
+def _canonical(value: Any) -> Any:
+    """Значение для хэширования: числа — float (1 и 1.0 дают один ключ)"""
+    if isinstance(value, dict):
+        return {key: _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, (bool, str)) or value is None:
+        return value
+    return float(value)
+
+
+def _segment_steps(time_start: float, time_stop: float, accuracy: float) -> np.ndarray:
+    """Моменты времени шагов интегрирования на участке циклограммы.
+
+    Накопление суммы идёт последовательно (как time_now += accuracy),
+    поэтому число шагов и значения времени совпадают с пошаговым циклом.
+    """
+    if not time_stop >= time_start:
+        return np.empty(0)
+    count = int((time_stop - time_start) / accuracy) + 3
+    steps = np.full(count, accuracy)
+    steps[0] = time_start
+    steps = np.cumsum(steps)
+    return steps[steps <= time_stop]
+
+
+def _cyclogram_segments(t: List[float], accuracy: float) -> List[np.ndarray]:
+    """Моменты времени шагов по участкам циклограммы (участок i заканчивается в t[i])"""
+    segments = []
+    time_start = 0
+    for time_stop in t:
+        segments.append(_segment_steps(time_start, time_stop, accuracy))
+        time_start = time_stop
+    return segments
+
+
+def _decimate(segments: List[np.ndarray], decimation: int) -> np.ndarray:
+    """Моменты времени сохраняемых шагов: каждый decimation-й, начиная с первого"""
+    if not segments:
+        return np.empty(0)
+    return np.concatenate(segments)[::decimation]
 
 
 @dataclass
@@ -24,6 +202,13 @@ class RobotState:
     spline: bool = False
     type_of_control: str = "Позиционное"
     
+    # Метод интегрирования: "euler" — шаг integration_dt, иначе метод solve_ivp (Radau, BDF) —
+    # эталонный расчёт, медленнее euler; для них integration_dt задаёт только сетку вывода
+    integration_method: str = "euler"
+    integration_dt: float = 1e-3
+    # Сохраняется каждый output_decimation-й шаг
+    output_decimation: int = 1
+    
     # Коэффициенты ПИД-регулятора
     Kp: List[float] = field(default_factory=lambda: [0, 0, 0, 0])
     Ki: List[float] = field(default_factory=lambda: [0, 0, 0, 0])
@@ -127,6 +312,9 @@ class RobotState:
     circle_y: float = 0
     circle_radius: float = 0
     circle_speed: float = 0
+    contour_points: int = CONTOUR_POINTS
+    contour_t_start: float = CONTOUR_T_START
+    contour_t_stop: float = CONTOUR_T_STOP
     
     # Сплайн
     num_splain_dots: int = 100
@@ -138,38 +326,16 @@ class TrajectoryCalculator:
     def __init__(self, state: Optional[RobotState] = None):
         self.state = state or RobotState()
         
-        # Результаты расчётов
-        self.output_time_array = []
-        self.trajectory_q_1 = []
-        self.trajectory_q_2 = []
-        self.real_trajectory_x = []
-        self.real_trajectory_y = []
+        # Результаты расчётов (массивы float64, см. RESULT_CHANNELS)
+        for name in RESULT_CHANNELS:
+            setattr(self, name, np.empty(0))
+        self.real_trajectory_x = np.empty(0)
+        self.real_trajectory_y = np.empty(0)
+        for name in PYRAMID_ARRAYS:
+            setattr(self, name, np.empty(0))
         self.cyclogram_real_x = [0] * 9
         self.cyclogram_real_y = [0] * 9
         
-        # Массивы для графиков
-        self.q_error_array_1 = []
-        self.SAU_SUM_array_1 = []
-        self.U_array_1 = []
-        self.Ustar_array_1 = []
-        self.I_array_1 = []
-        self.M_ed_array_1 = []
-        self.M1_array = []
-        self.M_ed_corrected_array_1 = []
-        self.acceleration_array_1 = []
-        self.speed_array_1 = []
-        
-        self.q_error_array_2 = []
-        self.SAU_SUM_array_2 = []
-        self.U_array_2 = []
-        self.Ustar_array_2 = []
-        self.I_array_2 = []
-        self.M_ed_array_2 = []
-        self.M2_array = []
-        self.M_ed_corrected_array_2 = []
-        self.acceleration_array_2 = []
-        self.speed_array_2 = []
-        
         # Контурное управление
         self.t_contur = []
         self.x_contur = []
@@ -197,6 +363,14 @@ class TrajectoryCalculator:
         self.reg_time_2 = []
         self.avg_reg_time_2 = 0
         self.median_reg_time_2 = 0
+        
+        # Контрольные точки пошагового расчёта (см. resume_segment):
+        # key — хэш параметров динамики, targets — [q1, q2, t] участков,
+        # states — [n, k, *CHECKPOINT_VARIABLES] в начале каждого участка и в конце
+        self.checkpoints: Dict[str, Any] = {}
+        
+        # simulation_key состояния, по которому рассчитаны результаты (None — не рассчитаны)
+        self.result_key: Optional[str] = None
     
     def update_state(self, **kwargs):
         """Обновить состояние робота"""
@@ -206,33 +380,72 @@ class TrajectoryCalculator:
     
     def _clear_arrays(self):
         """Очистить все массивы результатов"""
-        self.output_time_array.clear()
-        self.trajectory_q_1.clear()
-        self.trajectory_q_2.clear()
-        self.real_trajectory_x.clear()
-        self.real_trajectory_y.clear()
-        
-        self.q_error_array_1.clear()
-        self.SAU_SUM_array_1.clear()
-        self.U_array_1.clear()
-        self.Ustar_array_1.clear()
-        self.I_array_1.clear()
-        self.M_ed_array_1.clear()
-        self.M1_array.clear()
-        self.M_ed_corrected_array_1.clear()
-        self.acceleration_array_1.clear()
-        self.speed_array_1.clear()
-        
-        self.q_error_array_2.clear()
-        self.SAU_SUM_array_2.clear()
-        self.U_array_2.clear()
-        self.Ustar_array_2.clear()
-        self.I_array_2.clear()
-        self.M_ed_array_2.clear()
-        self.M2_array.clear()
-        self.M_ed_corrected_array_2.clear()
-        self.acceleration_array_2.clear()
-        self.speed_array_2.clear()
+        for name in RESULT_CHANNELS:
+            setattr(self, name, np.empty(0))
+        self.real_trajectory_x = np.empty(0)
+        self.real_trajectory_y = np.empty(0)
+        for name in PYRAMID_ARRAYS:
+            setattr(self, name, np.empty(0))
+        self.checkpoints = {}
+        self.result_key = None
+    
+    def _state_digest(self, ignored: set, **extra: Any) -> str:
+        """Хэш полей состояния, кроме ignored, и дополнительных значений"""
+        data = {key: value for key, value in asdict(self.state).items() if key not in ignored}
+        data['version'] = SIMULATION_VERSION
+        data.update(extra)
+        payload = json.dumps(_canonical(data), sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def simulation_key(self) -> str:
+        """Хэш параметров, от которых зависит результат расчёта.
+        Одинаковые конфигурации разных сессий дают один ключ."""
+        s = self.state
+        ignored = set(IGNORED_STATE_FIELDS)
+        if s.type_of_control == "Контурное":
+            ignored |= POSITIONAL_STATE_FIELDS | CONTOUR_STATE_FIELDS
+            return self._state_digest(
+                ignored, contour=[self.t_contur_control, self.q1_contur_control, self.q2_contur_control])
+        ignored |= CONTOUR_STATE_FIELDS
+        if not s.spline:
+            ignored.add('num_splain_dots')
+        return self._state_digest(ignored)
+    
+    def plot_inputs_key(self) -> str:
+        """Хэш всего, что графики берут из сессии помимо результатов: состояние
+        целиком и наложения PLOT_OVERLAYS. simulation_key покрывает их не во
+        всех режимах (например, контур x_contur, y_contur поверх траектории)."""
+        return self._state_digest(set(), **{name: getattr(self, name) for name in PLOT_OVERLAYS})
+    
+    def dynamics_key(self) -> str:
+        """Хэш параметров динамики — всего, кроме задающих воздействий.
+        Контрольные точки годятся только для расчёта с тем же ключом."""
+        return self._state_digest(IGNORED_STATE_FIELDS | POSITIONAL_STATE_FIELDS | CONTOUR_STATE_FIELDS
+                                  | {'type_of_control'})
+    
+    def resume_segment(self, targets: Optional[Tuple[List[float], List[float], List[float]]] = None) -> int:
+        """Номер участка, с которого можно продолжить расчёт от контрольной
+        точки предыдущего расчёта (0 — считать с начала).
+        
+        Участки до него совпадают с предыдущим расчётом: те же параметры
+        динамики и те же точки циклограммы. Нужны и результаты предыдущего
+        расчёта — из них берётся начало массивов.
+        """
+        checkpoints = self.checkpoints
+        if not checkpoints or self.state.integration_method != "euler":
+            return 0
+        targets = targets if targets is not None else self.control_targets()
+        if targets is None or checkpoints['key'] != self.dynamics_key():
+            return 0
+        segment = 0
+        for previous, current in zip(checkpoints['targets'], zip(*targets)):
+            if previous != [float(value) for value in current]:
+                break
+            segment += 1
+        segment = min(segment, len(checkpoints['states']) - 1)
+        if segment and len(self.output_time_array) < checkpoints['states'][segment][1]:
+            return 0
+        return segment
     
     def get_true_I(self) -> Tuple[float, float]:
         """Получить моменты инерции в зависимости от типа робота"""
@@ -283,88 +496,37 @@ class TrajectoryCalculator:
             return s.lengthcol_1, s.lengthcol_2
         return 0, 0
     
-    def create_contour_line(self, x1: float, x2: float, y1: float, y2: float):
-        """Создать линейный контур"""
-        t_linspace = np.linspace(10, 110, 1000)
-        x_contur = []
-        y_contur = []
-        dx = (x2 - x1) / 1000
-        dy = (y2 - y1) / 1000
-        for i in range(1000):
-            x_contur.append(x1 + dx * i)
-            y_contur.append(y1 + dy * i)
-        self.t_contur = list(t_linspace)
-        self.x_contur = x_contur
-        self.y_contur = y_contur
+    def create_contour_line(self, x1: float, x2: float, y1: float, y2: float,
+                            points: int = CONTOUR_POINTS, t_start: float = CONTOUR_T_START,
+                            t_stop: float = CONTOUR_T_STOP):
+        """Создать линейный контур: points точек от (x1, y1) к (x2, y2)
+        (конечная точка не входит) на отрезке времени [t_start, t_stop]"""
+        steps = np.arange(points)
+        self.t_contur = np.linspace(t_start, t_stop, points).tolist()
+        self.x_contur = (x1 + (x2 - x1) / points * steps).tolist()
+        self.y_contur = (y1 + (y2 - y1) / points * steps).tolist()
     
-    def create_contour_circle(self, x: float, y: float, radius: float):
-        """Создать круговой контур"""
-        t_linspace = np.linspace(10, 110, 1000)
-        fi_linspace = np.linspace(0, 2 * np.pi, 1000)
-        x_contur = []
-        y_contur = []
-        for i in range(len(fi_linspace)):
-            x_contur.append(x + radius * np.cos(fi_linspace[i]))
-            y_contur.append(y + radius * np.sin(fi_linspace[i]))
-        self.t_contur = list(t_linspace)
-        self.x_contur = x_contur
-        self.y_contur = y_contur
+    def create_contour_circle(self, x: float, y: float, radius: float,
+                              points: int = CONTOUR_POINTS, t_start: float = CONTOUR_T_START,
+                              t_stop: float = CONTOUR_T_STOP):
+        """Создать круговой контур из points точек на отрезке времени [t_start, t_stop]"""
+        fi_linspace = np.linspace(0, 2 * np.pi, points)
+        self.t_contur = np.linspace(t_start, t_stop, points).tolist()
+        self.x_contur = (x + radius * np.cos(fi_linspace)).tolist()
+        self.y_contur = (y + radius * np.sin(fi_linspace)).tolist()
     
     def reverse_coordinate_transform(self):
         """Обратное преобразование координат для контурного управления"""
-        self.t_contur_control = []
-        self.q1_contur_control = []
-        self.q2_contur_control = []
         a_1, a_2 = self.get_true_a1_a2()
-        s = self.state
-        
-        if s.robot_type == "Декартовый":
-            self.t_contur_control = self.t_contur.copy()
-            self.q1_contur_control = self.x_contur.copy()
-            self.q2_contur_control = self.y_contur.copy()
-        
-        elif s.robot_type == "Цилиндрический":
-            self.t_contur_control = self.t_contur.copy()
-            for i in range(len(self.t_contur)):
-                if self.y_contur[i] == 0:
-                    a = 0.25 * np.pi if self.x_contur[i] == 0 else np.pi / 2
-                else:
-                    a = np.arctan2(self.x_contur[i], self.y_contur[i])
-                q1 = -1 * a
-                q1 = 0 if np.isnan(q1) else q1
-                q2 = np.sqrt(self.x_contur[i]**2 + self.y_contur[i]**2) - a_1
-                self.q1_contur_control.append(q1)
-                self.q2_contur_control.append(q2)
-        
-        elif s.robot_type == "Скара":
-            self.t_contur_control = self.t_contur.copy()
-            for i in range(len(self.t_contur)):
-                if self.x_contur[i] == 0:
-                    a = 0.25 * np.pi if self.y_contur[i] == 0 else np.pi / 2
-                else:
-                    a = np.arctan2(self.y_contur[i], self.x_contur[i])
-                a = 0 if np.isnan(a) else a
-                r = np.sqrt(self.x_contur[i]**2 + self.y_contur[i]**2)
-                g1 = np.arccos(((a_1**2) - (a_2**2) + (r**2)) / (2 * a_1 * r))
-                g1 = 0 if np.isnan(g1) else g1
-                g2 = np.arcsin((a_1 / a_2) * np.sin(g1))
-                g2 = 0 if np.isnan(g2) else g2
-                ARM = -1
-                q1 = -np.pi / 2 + a - g1 * np.sign(ARM)
-                q2 = (g1 + g2) * np.sign(ARM)
-                self.q1_contur_control.append(q1)
-                self.q2_contur_control.append(q2)
-        
-        elif s.robot_type == "Колер":
-            self.t_contur_control = self.t_contur.copy()
-            for i in range(len(self.t_contur)):
-                square = 1 - (self.x_contur[i] / a_2)**2
-                square = max(0, square)
-                q1 = self.y_contur[i] - a_2 * np.sqrt(square)
-                q2 = -np.arcsin(self.x_contur[i] / a_2)
-                q2 = 0 if np.isnan(q2) else q2
-                self.q1_contur_control.append(q1)
-                self.q2_contur_control.append(q2)
+        joints = inverse_kinematics(self.state.robot_type, self.x_contur, self.y_contur, a_1, a_2)
+        if joints is None:
+            self.t_contur_control = []
+            self.q1_contur_control = []
+            self.q2_contur_control = []
+            return
+        self.t_contur_control = list(self.t_contur)
+        self.q1_contur_control = joints[0].tolist()
+        self.q2_contur_control = joints[1].tolist()
     
     def spline_creation(self, q1: List[float], q2: List[float], t: List[float]):
         """Создание сплайн-траектории"""
@@ -379,54 +541,52 @@ class TrajectoryCalculator:
     
     def excess_fluctuation_filter(self, Med_1: float, Med_2: float, M1: float, M2: float) -> Tuple[float, float]:
         """Фильтр избыточных колебаний"""
-        s = self.state
-        if s.robot_type == "Скара":
-            if np.sign(Med_1) != np.sign(M1):
-                M1 = 0.5 * Med_1
-            if np.sign(Med_2) != np.sign(M2):
-                M2 = 0.5 * Med_2
-            if Med_1 != 0:
-                M1 = Med_1 * ((2 * M1 / Med_1) / (1 + (2 * M1 / Med_1)))
-            if Med_2 != 0:
-                M2 = Med_2 * ((2 * M2 / Med_2) / (1 + (2 * M2 / Med_2)))
-        
-        # Фильтрация для звена 1
-        if np.sign(Med_1) == np.sign(M1):
-            if M1 >= 0:
-                if M1 > 0.5 * Med_1 and Med_1 != 0:
-                    M1 = Med_1 * ((2 * M1 / Med_1) / (1 + (2 * M1 / Med_1)))
-            else:
-                if M1 < 0.5 * Med_1 and Med_1 != 0:
-                    M1 = Med_1 * ((2 * M1 / Med_1) / (1 + (2 * M1 / Med_1)))
-        
-        # Фильтрация для звена 2
-        if np.sign(Med_2) == np.sign(M2):
-            if M2 >= 0:
-                if M2 > 0.5 * Med_2 and Med_2 != 0:
-                    M2 = Med_2 * ((2 * M2 / Med_2) / (1 + (2 * M2 / Med_2)))
-            else:
-                if M2 < 0.5 * Med_2 and Med_2 != 0:
-                    M2 = Med_2 * ((2 * M2 / Med_2) / (1 + (2 * M2 / Med_2)))
-        
-        return M1, M2
+        return robot_dynamics(self.state).filter(Med_1, Med_2, M1, M2)
     
-    def robot_function(self, q1: List[float], q2: List[float], t: List[float]) -> Dict[str, List[float]]:
+    def robot_function(self, q1: List[float], q2: List[float], t: List[float]) -> Dict[str, np.ndarray]:
         """Основная функция расчёта динамики робота"""
+        result = {name: np.empty(0) for name in RESULT_CHANNELS}
+        for result, _, _ in self.iter_robot_function(q1, q2, t):
+            pass
+        return result
+    
+    def iter_robot_function(self, q1: List[float], q2: List[float], t: List[float],
+                            resume: Optional[Tuple[int, List[list], Dict[str, np.ndarray]]] = None,
+                            ) -> Iterator[Tuple[Dict[str, np.ndarray], int, int]]:
+        """Расчёт динамики по участкам циклограммы.
+        
+        После каждого участка выдаёт (буфер результатов, начало, конец):
+        отрезок [начало, конец) буфера уже рассчитан. Адаптивные методы
+        интегрируют всю циклограмму сразу и выдают один отрезок.
+        
+        В начале каждого участка и в конце сохраняется контрольная точка
+        (self.checkpoints). resume — (номер участка, контрольные точки
+        и результаты предыдущего расчёта), см. resume_segment: расчёт
+        продолжается с контрольной точки участка, начало буфера копируется
+        из предыдущих результатов и выдаётся первым отрезком.
+        """
         s = self.state
-        accuracy = 1e-3
+        accuracy = s.integration_dt
+        decimation = s.output_decimation
         K_U = 1
         T_U = 0.07
         
-        Kp = s.Kp
-        Ki = s.Ki
-        Kd = s.Kd
-        J = s.J
-        Umax = s.Umax
-        T_I = s.T_e
-        Fi = s.Fi
-        Ce = s.Ce
-        Ra = s.Ra
-        Cm = s.Cm
+        # Постоянные шага вынесены из цикла: параметры звеньев — в локальные
+        # переменные, моменты нагрузки — в стратегию типа робота
+        Kp_1, Kp_2 = s.Kp[0], s.Kp[1]
+        Ki_1, Ki_2 = s.Ki[0], s.Ki[1]
+        Kd_1, Kd_2 = s.Kd[0], s.Kd[1]
+        J_1, J_2 = s.J[0], s.J[1]
+        Umax_1, Umax_2 = s.Umax[0], s.Umax[1]
+        T_I_1, T_I_2 = s.T_e[0], s.T_e[1]
+        Fi_1, Fi_2 = s.Fi[0], s.Fi[1]
+        Ce_1, Ce_2 = s.Ce[0], s.Ce[1]
+        Ra_1, Ra_2 = s.Ra[0], s.Ra[1]
+        Cm_1, Cm_2 = s.Cm[0], s.Cm[1]
+        inv_T_U = 1 / T_U
+        inv_T_I_1 = 1 / T_I_1 if T_I_1 != 0 else 0
+        inv_T_I_2 = 1 / T_I_2 if T_I_2 != 0 else 0
+        moments = robot_dynamics(s).moments
         
         I_1, I_2 = self.get_true_I()
         q_min_1, q_max_1 = self.get_true_q_min_max(1)
@@ -441,121 +601,128 @@ class TrajectoryCalculator:
         q_error_prev_1, q_error_prev_2 = 0, 0
         Integral_channel_1, Integral_channel_2 = 0, 0
         
-        # Выходные массивы
-        output_time_array = []
-        q_error_array_1, SAU_SUM_array_1, U_array_1, Ustar_array_1 = [], [], [], []
-        I_array_1, M_ed_array_1, M1_array, M_ed_corrected_array_1 = [], [], [], []
-        acceleration_array_1, speed_array_1, output_q_array_1 = [], [], []
-        
-        q_error_array_2, SAU_SUM_array_2, U_array_2, Ustar_array_2 = [], [], [], []
-        I_array_2, M_ed_array_2, M2_array, M_ed_corrected_array_2 = [], [], [], []
-        acceleration_array_2, speed_array_2, output_q_array_2 = [], [], []
-        
-        flag_1 = True
-        
-        for i in range(len(t)):
-            if flag_1:
-                time_start = 0
-                time_stop = t[0]
-                flag_1 = False
-            else:
-                time_start = t[i - 1]
-                time_stop = t[i]
-            
-            steps = []
-            time_now = time_start
-            while time_now <= time_stop:
-                steps.append(time_now)
-                time_now += accuracy
-            
+        # Моменты времени всех шагов известны заранее — выделяем буфер
+        # результатов один раз: строка float64 на каждый сохраняемый канал
+        segments = _cyclogram_segments(t, accuracy)
+        
+        if s.integration_method != "euler":
+            # Адаптивный шаг: те же моменты времени, что и у пошагового цикла
+            p = collect_parameters([s], [(q_min_1, q_max_1), (q_min_2, q_max_2)])
+            adaptive = integrate_adaptive(s.integration_method, s.robot_type, p, q1, q2, segments, decimation)
+            self.checkpoints = {}
+            yield {name: adaptive[name] for name in RESULT_CHANNELS}, 0, len(adaptive['output_time_array'])
+            return
+        
+        output_time = _decimate(segments, decimation)
+        buffer = np.empty((len(RESULT_CHANNELS), len(output_time)))
+        result = dict(zip(RESULT_CHANNELS, buffer))
+        
+        n = 0  # Номер шага
+        k = 0  # Номер сохранённого шага
+        states = []
+        first_segment = 0
+        if resume:
+            # Начало расчёта совпадает с предыдущим: копируем его результаты
+            # и продолжаем с сохранённого состояния интегратора
+            first_segment, previous_states, previous = resume
+            states = previous_states[:first_segment]
+            n, k, *variables = previous_states[first_segment]
+            (q_output_1, q_output_2, U_1, U_2, I_a_1, I_a_2, a_w_1, a_w_2, W_1, W_2,
+             q_error_prev_1, q_error_prev_2, Integral_channel_1, Integral_channel_2) = variables
+            for name, row in result.items():
+                row[:k] = previous[name][:k]
+        result['output_time_array'][:] = output_time
+        self.checkpoints = {
+            'key': self.dynamics_key(),
+            'targets': [[float(value) for value in target] for target in zip(q1, q2, t)][:len(segments)],
+            'states': states,
+        }
+        if k:
+            yield result, 0, k
+        
+        q_error_array_1 = result['q_error_array_1']
+        SAU_SUM_array_1 = result['SAU_SUM_array_1']
+        U_array_1 = result['U_array_1']
+        Ustar_array_1 = result['Ustar_array_1']
+        I_array_1 = result['I_array_1']
+        M_ed_array_1 = result['M_ed_array_1']
+        M1_array = result['M1_array']
+        M_ed_corrected_array_1 = result['M_ed_corrected_array_1']
+        acceleration_array_1 = result['acceleration_array_1']
+        speed_array_1 = result['speed_array_1']
+        output_q_array_1 = result['trajectory_q_1']
+        
+        q_error_array_2 = result['q_error_array_2']
+        SAU_SUM_array_2 = result['SAU_SUM_array_2']
+        U_array_2 = result['U_array_2']
+        Ustar_array_2 = result['Ustar_array_2']
+        I_array_2 = result['I_array_2']
+        M_ed_array_2 = result['M_ed_array_2']
+        M2_array = result['M2_array']
+        M_ed_corrected_array_2 = result['M_ed_corrected_array_2']
+        acceleration_array_2 = result['acceleration_array_2']
+        speed_array_2 = result['speed_array_2']
+        output_q_array_2 = result['trajectory_q_2']
+        
+        for i, steps in enumerate(segments[first_segment:], first_segment):
+            states.append(_checkpoint(
+                n, k, q_output_1, q_output_2, U_1, U_2, I_a_1, I_a_2, a_w_1, a_w_2, W_1, W_2,
+                q_error_prev_1, q_error_prev_2, Integral_channel_1, Integral_channel_2))
             q_input_1 = q1[i]
             q_input_2 = q2[i]
+            segment_start = k
             
-            for time in steps:
+            for _ in range(len(steps)):
                 q_error_1 = q_input_1 - q_output_1
                 q_error_2 = q_input_2 - q_output_2
                 
                 # ПИД для звена 1
-                Proportional_channel_1 = Kp[0] * q_error_1
-                Integral_channel_1 += Ki[0] * q_error_1 * accuracy
-                Differential_channel_1 = Kd[0] * ((q_error_1 - q_error_prev_1) / accuracy)
+                Proportional_channel_1 = Kp_1 * q_error_1
+                Integral_channel_1 += Ki_1 * q_error_1 * accuracy
+                Differential_channel_1 = Kd_1 * ((q_error_1 - q_error_prev_1) / accuracy)
                 Differential_channel_1 = max(-10, min(10, Differential_channel_1))
                 SAU_SUM_1 = Proportional_channel_1 + Integral_channel_1 + Differential_channel_1
                 q_error_prev_1 = q_error_1
                 
                 # ПИД для звена 2
-                Proportional_channel_2 = Kp[1] * q_error_2
-                Integral_channel_2 += Ki[1] * q_error_2 * accuracy
-                Differential_channel_2 = Kd[1] * ((q_error_2 - q_error_prev_2) / accuracy)
+                Proportional_channel_2 = Kp_2 * q_error_2
+                Integral_channel_2 += Ki_2 * q_error_2 * accuracy
+                Differential_channel_2 = Kd_2 * ((q_error_2 - q_error_prev_2) / accuracy)
                 Differential_channel_2 = max(-10, min(10, Differential_channel_2))
                 SAU_SUM_2 = Proportional_channel_2 + Integral_channel_2 + Differential_channel_2
                 q_error_prev_2 = q_error_2
                 
                 # Расчёт напряжения
-                U_need_1 = min(SAU_SUM_1 * K_U, Umax[0])
-                U_1 += (U_need_1 * (1 / T_U) - U_1 * (1 / T_U)) * accuracy
-                U_changed_1 = U_1 - W_1 * Ce[0] * Fi[0]
+                U_need_1 = min(SAU_SUM_1 * K_U, Umax_1)
+                U_1 += (U_need_1 * inv_T_U - U_1 * inv_T_U) * accuracy
+                U_changed_1 = U_1 - W_1 * Ce_1 * Fi_1
                 
-                U_need_2 = min(SAU_SUM_2 * K_U, Umax[1])
-                U_2 += (U_need_2 * (1 / T_U) - U_2 * (1 / T_U)) * accuracy
-                U_changed_2 = U_2 - W_2 * Ce[1] * Fi[1]
+                U_need_2 = min(SAU_SUM_2 * K_U, Umax_2)
+                U_2 += (U_need_2 * inv_T_U - U_2 * inv_T_U) * accuracy
+                U_changed_2 = U_2 - W_2 * Ce_2 * Fi_2
                 
                 # Расчёт тока
-                nI_Ra_1 = U_changed_1 / Ra[0] if Ra[0] != 0 else 0
-                I_a_1 += (nI_Ra_1 * (1 / T_I[0]) - I_a_1 * (1 / T_I[0])) * accuracy if T_I[0] != 0 else 0
-                I_a__Cm_1 = I_a_1 * Cm[0]
+                nI_Ra_1 = U_changed_1 / Ra_1 if Ra_1 != 0 else 0
+                I_a_1 += (nI_Ra_1 * inv_T_I_1 - I_a_1 * inv_T_I_1) * accuracy if T_I_1 != 0 else 0
+                I_a__Cm_1 = I_a_1 * Cm_1
                 
-                nI_Ra_2 = U_changed_2 / Ra[1] if Ra[1] != 0 else 0
-                I_a_2 += (nI_Ra_2 * (1 / T_I[1]) - I_a_2 * (1 / T_I[1])) * accuracy if T_I[1] != 0 else 0
-                I_a__Cm_2 = I_a_2 * Cm[1]
+                nI_Ra_2 = U_changed_2 / Ra_2 if Ra_2 != 0 else 0
+                I_a_2 += (nI_Ra_2 * inv_T_I_2 - I_a_2 * inv_T_I_2) * accuracy if T_I_2 != 0 else 0
+                I_a__Cm_2 = I_a_2 * Cm_2
                 
                 # Расчёт момента двигателя
-                M_ed_1 = I_a__Cm_1 * Fi[0]
-                M_ed_2 = I_a__Cm_2 * Fi[1]
+                M_ed_1 = I_a__Cm_1 * Fi_1
+                M_ed_2 = I_a__Cm_2 * Fi_2
                 
-                # Расчёт моментов звеньев
-                if s.robot_type == "Декартовый":
-                    d1 = (s.massd_1 + s.massd_2) / 2
-                    d3 = s.massd_2 / 2
-                    M1 = 2 * d1 * a_w_1
-                    M2 = 2 * d3 * a_w_2
-                elif s.robot_type == "Скара":
-                    d1 = (s.moment_1 + s.masss_2 * s.length_1**2 + 
-                          2 * s.masss_2 * s.length_2**2 * s.length_1 * np.cos(q_output_1) + 
-                          s.masss_2 * s.length_2**2 + s.moment_2 / 2) / 2
-                    d2 = (2 * s.masss_2 * s.length_2**2 * s.length_1 + 
-                          s.masss_2 * s.length_2**2 + s.moment_2 / 2) / 2
-                    d3 = (s.masss_2 * s.length_2**2 + s.moment_2 / 2) / 2
-                    M1 = (2 * d1 * a_w_1 + 2 * d2 * a_w_2 - 
-                          2 * s.masss_2 * s.length_2 * s.length_1 * np.sin(q_output_2) * W_1 * W_2 - 
-                          s.masss_2 * s.length_2 * s.length_1 * np.sin(q_output_2) * W_2**2)
-                    M2 = (2 * d1 * a_w_1 + 2 * d3 * a_w_2 + 
-                          s.masss_2 * s.length_2 * s.length_1 * np.sin(q_output_2) * W_1**2)
-                elif s.robot_type == "Цилиндрический":
-                    d1 = 0.5 * (s.momentc_1 + (s.momentc_2 / 2 + 
-                               s.massc_2 * (s.lengthc_1 - 0.5 * s.lengthc_2 + q_output_2)**2))
-                    d3 = s.massc_2 / 2
-                    M1 = (2 * d1 * a_w_1 + 
-                          2 * s.massc_2 * (s.lengthc_1 - 0.5 * s.lengthc_2 + q_output_2) * W_1 * W_2)
-                    M2 = (2 * d3 * a_w_1 - 
-                          s.massc_2 * (s.lengthc_1 - 0.5 * s.lengthc_2 + q_output_2) * W_1**2)
-                elif s.robot_type == "Колер":
-                    d1 = (1 + s.masscol_2) / 2
-                    d2 = s.masscol_2 * s.lengthcol_2 * np.sin(q_output_2) / 2
-                    d3 = (s.momentcol_2 + s.masscol_2 * s.lengthcol_2**2) / 2
-                    M1 = 2 * d1 * a_w_1 + 2 * d1 * a_w_1 + s.masscol_2 * s.lengthcol_2 * np.cos(q_output_2) * W_2**2
-                    M2 = 2 * d2 * a_w_1 + 2 * d3 * a_w_1
-                else:
-                    M1, M2 = 0, 0
-                
-                M1, M2 = self.excess_fluctuation_filter(M_ed_1, M_ed_2, M1, M2)
+                # Расчёт моментов звеньев и фильтр избыточных колебаний
+                M1, M2 = moments(q_output_1, q_output_2, W_1, W_2, a_w_1, a_w_2, M_ed_1, M_ed_2)
                 
                 M_ed_corrected_1 = M_ed_1 - M1
                 M_ed_corrected_2 = M_ed_2 - M2
                 
                 # Расчёт ускорения
-                a_w_1 = M_ed_corrected_1 / J[0] if J[0] != 0 else 0
-                a_w_2 = M_ed_corrected_2 / J[1] if J[1] != 0 else 0
+                a_w_1 = M_ed_corrected_1 / J_1 if J_1 != 0 else 0
+                a_w_2 = M_ed_corrected_2 / J_2 if J_2 != 0 else 0
                 
                 # Расчёт скорости
                 W_1 += a_w_1 * accuracy
@@ -579,151 +746,135 @@ class TrajectoryCalculator:
                     q_output_2 = q_max_2
                     a_w_2, W_2 = 0, 0
                 
+                # Прореживание: сохраняется каждый decimation-й шаг
+                n += 1
+                if (n - 1) % decimation:
+                    continue
+                
                 # Сохранение результатов
-                output_time_array.append(time)
-                q_error_array_1.append(q_error_1)
-                SAU_SUM_array_1.append(SAU_SUM_1)
-                U_array_1.append(U_1)
-                Ustar_array_1.append(U_changed_1)
-                I_array_1.append(I_a_1)
-                M_ed_array_1.append(M_ed_1)
-                M1_array.append(M1)
-                M_ed_corrected_array_1.append(M_ed_corrected_1)
-                acceleration_array_1.append(a_w_1)
-                speed_array_1.append(W_1)
-                output_q_array_1.append(q_output_1)
+                q_error_array_1[k] = q_error_1
+                SAU_SUM_array_1[k] = SAU_SUM_1
+                U_array_1[k] = U_1
+                Ustar_array_1[k] = U_changed_1
+                I_array_1[k] = I_a_1
+                M_ed_array_1[k] = M_ed_1
+                M1_array[k] = M1
+                M_ed_corrected_array_1[k] = M_ed_corrected_1
+                acceleration_array_1[k] = a_w_1
+                speed_array_1[k] = W_1
+                output_q_array_1[k] = q_output_1
                 
-                q_error_array_2.append(q_error_2)
-                SAU_SUM_array_2.append(SAU_SUM_2)
-                U_array_2.append(U_2)
-                Ustar_array_2.append(U_changed_2)
-                I_array_2.append(I_a_2)
-                M_ed_array_2.append(M_ed_2)
-                M2_array.append(M2)
-                M_ed_corrected_array_2.append(M_ed_corrected_2)
-                acceleration_array_2.append(a_w_2)
-                speed_array_2.append(W_2)
-                output_q_array_2.append(q_output_2)
+                q_error_array_2[k] = q_error_2
+                SAU_SUM_array_2[k] = SAU_SUM_2
+                U_array_2[k] = U_2
+                Ustar_array_2[k] = U_changed_2
+                I_array_2[k] = I_a_2
+                M_ed_array_2[k] = M_ed_2
+                M2_array[k] = M2
+                M_ed_corrected_array_2[k] = M_ed_corrected_2
+                acceleration_array_2[k] = a_w_2
+                speed_array_2[k] = W_2
+                output_q_array_2[k] = q_output_2
+                k += 1
+            
+            yield result, segment_start, k
         
-        return {
-            'output_time_array': output_time_array,
-            'q_error_array_1': q_error_array_1,
-            'SAU_SUM_array_1': SAU_SUM_array_1,
-            'U_array_1': U_array_1,
-            'Ustar_array_1': Ustar_array_1,
-            'I_array_1': I_array_1,
-            'M_ed_array_1': M_ed_array_1,
-            'M1_array': M1_array,
-            'M_ed_corrected_array_1': M_ed_corrected_array_1,
-            'acceleration_array_1': acceleration_array_1,
-            'speed_array_1': speed_array_1,
-            'trajectory_q_1': output_q_array_1,
-            'q_error_array_2': q_error_array_2,
-            'SAU_SUM_array_2': SAU_SUM_array_2,
-            'U_array_2': U_array_2,
-            'Ustar_array_2': Ustar_array_2,
-            'I_array_2': I_array_2,
-            'M_ed_array_2': M_ed_array_2,
-            'M2_array': M2_array,
-            'M_ed_corrected_array_2': M_ed_corrected_array_2,
-            'acceleration_array_2': acceleration_array_2,
-            'speed_array_2': speed_array_2,
-            'trajectory_q_2': output_q_array_2,
-        }
+        # Конечное состояние: от него продолжается удлинённая циклограмма
+        states.append(_checkpoint(
+            n, k, q_output_1, q_output_2, U_1, U_2, I_a_1, I_a_2, a_w_1, a_w_2, W_1, W_2,
+            q_error_prev_1, q_error_prev_2, Integral_channel_1, Integral_channel_2))
     
     def quality_of_regulation(self, q: List[float], t: List[float], 
-                              trajectory_q: List[float], output_time_array: List[float]) -> Tuple[List[float], List[float]]:
-        """Оценка качества регулирования"""
-        if not q or not t or not trajectory_q or not output_time_array:
+                              trajectory_q: np.ndarray, output_time_array: np.ndarray) -> Tuple[List[float], List[float]]:
+        """Оценка качества регулирования.
+        
+        Для каждой точки (q[i], t[i]): установившаяся ошибка — отклонение
+        от q[i] ближайшего к t[i] отсчёта траектории (из равноудалённых —
+        первого); время регулирования — от t[i] до первого отсчёта не раньше
+        t[i], попавшего в 5% полосу вокруг значения ближайшего отсчёта.
+        Время вывода упорядочено по возрастанию — отсчёты ищутся двоичным
+        поиском (np.searchsorted), полоса проверяется сразу для всех точек.
+        """
+        if len(q) == 0 or len(t) == 0 or len(trajectory_q) == 0 or len(output_time_array) == 0:
             return [], []
 
         sample_count = min(len(output_time_array), len(trajectory_q))
-        if sample_count == 0:
-            return [], []
-
-        output_times = output_time_array[:sample_count]
-        trajectory = trajectory_q[:sample_count]
+        output_times = np.asarray(output_time_array[:sample_count], dtype=float)
+        trajectory = np.asarray(trajectory_q[:sample_count], dtype=float)
         points_count = min(len(q), len(t))
+        target_times = np.asarray(t[:points_count], dtype=float)
 
-        real_time_array = []
-        for target_time in t[:points_count]:
-            nearest_index = min(
-                range(sample_count),
-                key=lambda index: abs(output_times[index] - target_time),
-            )
-            real_time_array.append(nearest_index)
+        # Ближайший отсчёт: последний раньше t[i] или первый не раньше t[i]
+        starts = np.searchsorted(output_times, target_times)
+        after = np.minimum(starts, sample_count - 1)
+        before = np.maximum(starts - 1, 0)
+        nearest = np.where(np.abs(output_times[before] - target_times) <= np.abs(output_times[after] - target_times),
+                           before, after)
+        # Среди одинаковых моментов времени — первый (как np.argmin)
+        real_time_array = np.searchsorted(output_times, output_times[nearest])
 
-        error_stable_array = [
-            abs(q[index] - trajectory[real_index])
-            for index, real_index in enumerate(real_time_array)
-        ]
+        target_values = trajectory[real_time_array]
+        error_stable_array = np.abs(np.asarray(q[:points_count], dtype=float) - target_values).tolist()
 
-        regulation_time_array = []
-        for point_number, real_index in enumerate(real_time_array):
-            target_time = t[point_number]
-            target_value = trajectory[real_index]
-            threshold = 0.05 * abs(target_value)
-
-            for sample_index, current_time in enumerate(output_times):
-                if current_time < target_time:
-                    continue
-
-                current_value = trajectory[sample_index]
-                stable = (
-                    abs(current_value - target_value) <= threshold
-                    if target_value != 0
-                    else current_value == 0
-                )
-                if stable:
-                    regulation_time_array.append(current_time - target_time)
-                    break
+        settled = _first_in_band(trajectory, starts, target_values, 0.05 * np.abs(target_values))
+        found = settled >= 0
+        regulation_time_array = (output_times[settled[found]] - target_times[found]).tolist()
 
         return error_stable_array, regulation_time_array
     
-    def calculate_trajectory(self) -> Dict[str, Any]:
-        """Основной метод расчёта траектории"""
-        self._clear_arrays()
+    def control_targets(self) -> Optional[Tuple[List[float], List[float], List[float]]]:
+        """Задающие воздействия (q1, q2, t) для текущего типа управления"""
         s = self.state
-        
         if s.type_of_control == "Позиционное":
             if not s.spline:
-                result = self.robot_function(s.q1, s.q2, s.t)
-            else:
-                q_1_spline, q_2_spline, t_spline = self.spline_creation(s.q1, s.q2, s.t)
-                result = self.robot_function(q_1_spline, q_2_spline, t_spline)
+                return s.q1, s.q2, s.t
+            return self.spline_creation(s.q1, s.q2, s.t)
         elif s.type_of_control == "Контурное":
-            result = self.robot_function(self.q1_contur_control, self.q2_contur_control, self.t_contur_control)
-        else:
-            result = {}
-        
-        # Сохраняем результаты
-        self.output_time_array = result.get('output_time_array', [])
-        self.trajectory_q_1 = result.get('trajectory_q_1', [])
-        self.trajectory_q_2 = result.get('trajectory_q_2', [])
-        
-        self.q_error_array_1 = result.get('q_error_array_1', [])
-        self.SAU_SUM_array_1 = result.get('SAU_SUM_array_1', [])
-        self.U_array_1 = result.get('U_array_1', [])
-        self.Ustar_array_1 = result.get('Ustar_array_1', [])
-        self.I_array_1 = result.get('I_array_1', [])
-        self.M_ed_array_1 = result.get('M_ed_array_1', [])
-        self.M1_array = result.get('M1_array', [])
-        self.M_ed_corrected_array_1 = result.get('M_ed_corrected_array_1', [])
-        self.acceleration_array_1 = result.get('acceleration_array_1', [])
-        self.speed_array_1 = result.get('speed_array_1', [])
-        
-        self.q_error_array_2 = result.get('q_error_array_2', [])
-        self.SAU_SUM_array_2 = result.get('SAU_SUM_array_2', [])
-        self.U_array_2 = result.get('U_array_2', [])
-        self.Ustar_array_2 = result.get('Ustar_array_2', [])
-        self.I_array_2 = result.get('I_array_2', [])
-        self.M_ed_array_2 = result.get('M_ed_array_2', [])
-        self.M2_array = result.get('M2_array', [])
-        self.M_ed_corrected_array_2 = result.get('M_ed_corrected_array_2', [])
-        self.acceleration_array_2 = result.get('acceleration_array_2', [])
-        self.speed_array_2 = result.get('speed_array_2', [])
-        
-        # Оценка качества регулирования
+            return self.q1_contur_control, self.q2_contur_control, self.t_contur_control
+        return None
+    
+    def calculate_trajectory(self) -> Dict[str, Any]:
+        """Основной метод расчёта траектории"""
+        result = {}
+        for result, _, _ in self.iter_calculate_trajectory():
+            pass
+        return result
+    
+    def iter_calculate_trajectory(self) -> Iterator[Tuple[Dict[str, np.ndarray], int, int]]:
+        """Расчёт траектории с выдачей готовых отрезков (см. iter_robot_function).
+        Атрибуты результатов и качество регулирования заполняются в конце."""
+        targets = self.control_targets()
+        resume = None
+        segment = self.resume_segment(targets) if targets is not None else 0
+        if segment:
+            # Участки до segment не изменились — продолжаем с контрольной точки
+            resume = (segment, self.checkpoints['states'],
+                      {name: getattr(self, name) for name in RESULT_CHANNELS})
+        
+        self._clear_arrays()
+        key = self.simulation_key()
+        
+        result = {}
+        if targets is not None:
+            for result, start, stop in self.iter_robot_function(*targets, resume=resume):
+                yield result, start, stop
+        
+        # Сохраняем результаты (строки буфера robot_function)
+        for name in RESULT_CHANNELS:
+            setattr(self, name, result.get(name, np.empty(0)))
+        self.build_pyramids(RESULT_CHANNELS[1:])
+        
+        self.evaluate_quality()
+        self.result_key = key
+    
+    def build_pyramids(self, channels: Tuple[str, ...]):
+        """Построить пирамиды минимумов и максимумов каналов (см. pyramid)"""
+        for name in channels:
+            setattr(self, pyramid_attribute(name), build_pyramid(getattr(self, name)))
+    
+    def evaluate_quality(self):
+        """Оценка качества регулирования по сохранённой траектории"""
+        s = self.state
         if s.type_of_control == "Позиционное":
             error_1, reg_time_1 = self.quality_of_regulation(s.q1, s.t, self.trajectory_q_1, self.output_time_array)
             error_2, reg_time_2 = self.quality_of_regulation(s.q2, s.t, self.trajectory_q_2, self.output_time_array)
@@ -748,65 +899,41 @@ class TrajectoryCalculator:
         self.reg_time_2 = reg_time_2
         self.avg_reg_time_2 = float(np.mean(reg_time_2)) if reg_time_2 else 0
         self.median_reg_time_2 = float(np.median(reg_time_2)) if reg_time_2 else 0
-        
-        return result
     
-    def coordinate_transform(self) -> Dict[str, List[float]]:
+    def forward_kinematics(self, trajectory_q_1: np.ndarray, trajectory_q_2: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Декартовы координаты (x, y) для массивов обобщённых координат"""
+        a_1, a_2 = self.get_true_a1_a2()
+        return forward_kinematics(self.state.robot_type, trajectory_q_1, trajectory_q_2, a_1, a_2)
+    
+    def coordinate_transform(self) -> Dict[str, Any]:
         """Преобразование обобщённых координат в декартовы"""
         s = self.state
-        a_1, a_2 = self.get_true_a1_a2()
         
-        real_x = []
-        real_y = []
+        real_x, real_y = self.forward_kinematics(self.trajectory_q_1, self.trajectory_q_2)
         cyclogram_x = list(self.cyclogram_real_x)
         cyclogram_y = list(self.cyclogram_real_y)
         
         if s.type_of_control == "Позиционное":
-            trajectory_q_1 = self.trajectory_q_1
-            trajectory_q_2 = self.trajectory_q_2
             cyclogramm_q_1 = s.q1
             cyclogramm_q_2 = s.q2
         else:
-            trajectory_q_1 = self.trajectory_q_1
-            trajectory_q_2 = self.trajectory_q_2
             cyclogramm_q_1 = []
             cyclogramm_q_2 = []
         
         if s.robot_type == "Декартовый":
-            real_x = list(trajectory_q_1)
-            real_y = list(trajectory_q_2)
             cyclogram_x = list(cyclogramm_q_1) if cyclogramm_q_1 else cyclogram_x
             cyclogram_y = list(cyclogramm_q_2) if cyclogramm_q_2 else cyclogram_y
-        
-        elif s.robot_type == "Цилиндрический":
-            for i in range(len(trajectory_q_1)):
-                real_x.append(-(a_1 + trajectory_q_2[i]) * np.sin(trajectory_q_1[i]))
-                real_y.append((a_1 + trajectory_q_2[i]) * np.cos(trajectory_q_1[i]))
-            for i in range(len(cyclogramm_q_1)):
-                if i < len(cyclogram_x):
-                    cyclogram_x[i] = -(a_1 + cyclogramm_q_2[i]) * np.sin(cyclogramm_q_1[i])
-                    cyclogram_y[i] = (a_1 + cyclogramm_q_2[i]) * np.cos(cyclogramm_q_1[i])
-        
-        elif s.robot_type == "Скара":
-            for i in range(len(trajectory_q_1)):
-                real_x.append(-a_1 * np.sin(trajectory_q_1[i]) - a_2 * np.sin(trajectory_q_1[i] + trajectory_q_2[i]))
-                real_y.append(a_1 * np.cos(trajectory_q_1[i]) + a_2 * np.cos(trajectory_q_1[i] + trajectory_q_2[i]))
-            for i in range(len(cyclogramm_q_1)):
-                if i < len(cyclogram_x):
-                    cyclogram_x[i] = -a_1 * np.sin(cyclogramm_q_1[i]) - a_2 * np.sin(cyclogramm_q_1[i] + cyclogramm_q_2[i])
-                    cyclogram_y[i] = a_1 * np.cos(cyclogramm_q_1[i]) + a_2 * np.cos(cyclogramm_q_1[i] + cyclogramm_q_2[i])
-        
-        elif s.robot_type == "Колер":
-            for i in range(len(trajectory_q_1)):
-                real_x.append(-a_2 * np.sin(trajectory_q_2[i]))
-                real_y.append(trajectory_q_1[i] + a_2 * np.cos(trajectory_q_2[i]))
-            for i in range(len(cyclogramm_q_1)):
-                if i < len(cyclogram_x):
-                    cyclogram_x[i] = -a_2 * np.sin(cyclogramm_q_2[i])
-                    cyclogram_y[i] = cyclogramm_q_1[i] + a_2 * np.cos(cyclogramm_q_2[i])
+        else:
+            # Точки циклограммы пересчитываются, остальные значения сохраняются
+            count = min(len(cyclogramm_q_1), len(cyclogram_x))
+            if count:
+                x, y = self.forward_kinematics(cyclogramm_q_1[:count], cyclogramm_q_2[:count])
+                cyclogram_x[:count] = x.tolist()
+                cyclogram_y[:count] = y.tolist()
         
         self.real_trajectory_x = real_x
         self.real_trajectory_y = real_y
+        self.build_pyramids(KINEMATIC_CHANNELS)
         self.cyclogram_real_x = cyclogram_x
         self.cyclogram_real_y = cyclogram_y
         
@@ -819,7 +946,7 @@ class TrajectoryCalculator:
     
     def generate_plot(self, plot_type: str) -> str:
         """Генерация графика и возврат как base64 PNG"""
-        fig = plt.figure(figsize=(11, 11))
+        fig = plt.figure(figsize=PLOT_FIGSIZE)
         ax = fig.add_subplot()
         s = self.state
         
@@ -851,7 +978,7 @@ class TrajectoryCalculator:
         
         # Конвертация в base64
         buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
+        plt.savefig(buf, format='png', dpi=PLOT_DPI, bbox_inches='tight')
         buf.seek(0)
         img_base64 = base64.b64encode(buf.read()).decode('utf-8')
         plt.close(fig)
@@ -898,13 +1025,7 @@ class TrajectoryCalculator:
             ax.add_artist(left)
         
         elif s.robot_type == "Колер":
-            q1_linspace = np.linspace(s.q1col_min, s.q1col_max, 100)
-            a1_linspace = np.linspace(s.a2col_min, s.a2col_max, 50)
-            x_linspace, y_linspace = [], []
-            for i in range(len(a1_linspace)):
-                for j in range(len(q1_linspace)):
-                    y_linspace.append(a1_linspace[i] + a_2 * np.cos(q1_linspace[j]))
-                    x_linspace.append(-1 * a_2 * np.sin(q1_linspace[j]))
+            x_linspace, y_linspace = _coler_workspace_points(s, a_2)
             plt.scatter(x_linspace, y_linspace, c="palegreen", s=80, alpha=0.5, label='Рабочая область')
     
     def _draw_decart_plane(self, ax):
@@ -1225,16 +1346,7 @@ class WorkspaceCalculator:
     def _draw_coler_workspace(self, ax):
         """Рисование рабочей области для робота Колер"""
         s = self.state
-        a2 = s.lengthcol_2
-        
-        q1_linspace = np.linspace(s.q1col_min, s.q1col_max, 100)
-        a1_linspace = np.linspace(s.a2col_min, s.a2col_max, 50)
-        x_linspace, y_linspace = [], []
-        
-        for i in range(len(a1_linspace)):
-            for j in range(len(q1_linspace)):
-                y_linspace.append(a1_linspace[i] + a2 * np.cos(q1_linspace[j]))
-                x_linspace.append(-1 * a2 * np.sin(q1_linspace[j]))
+        x_linspace, y_linspace = _coler_workspace_points(s, s.lengthcol_2)
         
         plt.scatter(x_linspace, y_linspace, c="palegreen", s=80, alpha=0.5)
         plt.grid(True)
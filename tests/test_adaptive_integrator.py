@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from python_simulation_engine.trajectory_calculator import TrajectoryCalculator
+
+from test_trajectory_calculator import make_state
+
+
+@pytest.mark.parametrize("method", ["Radau", "BDF"])
+def test_adaptive_matches_euler_on_same_grid(method):
+    # Первое звено упирается в границу x_max = 1, второе — в x_min = 0
+    params = dict(t=[0.5, 1.0, 1.5], q1=[1.5, 0.5, 0.5], q2=[0.3, -0.2, 0.2])
+    euler = TrajectoryCalculator(make_state(**params)).calculate_trajectory()
+    calc = TrajectoryCalculator(make_state(integration_method=method, **params))
+
+    adaptive = calc.calculate_trajectory()
+
+    np.testing.assert_array_equal(adaptive["output_time_array"], euler["output_time_array"])
+    for name in ("trajectory_q_1", "trajectory_q_2"):
+        assert np.all((adaptive[name] >= 0) & (adaptive[name] <= 1))
+        np.testing.assert_allclose(adaptive[name], euler[name], atol=0.02)
+    assert len(calc.error_1) == 3
+
+
+@pytest.mark.parametrize("method", ["Euler2", "RK45"])
+def test_unknown_integration_method_is_rejected(method):
+    # RK45 не предлагается: на жёсткой системе он медленнее метода Эйлера
+    calc = TrajectoryCalculator(make_state(integration_method=method))
+
+    with pytest.raises(ValueError):
+        calc.calculate_trajectory()
+
+
+def test_adaptive_output_decimation_matches_full_grid():
+    params = dict(integration_method="Radau", t=[0.2, 0.4])
+    full = TrajectoryCalculator(make_state(**params)).calculate_trajectory()
+
+    decimated = TrajectoryCalculator(make_state(output_decimation=9, **params)).calculate_trajectory()
+
+    np.testing.assert_array_equal(decimated["output_time_array"], full["output_time_array"][::9])
+    np.testing.assert_allclose(decimated["trajectory_q_1"], full["trajectory_q_1"][::9], atol=1e-5)
@@ -0,0 +1,88 @@
+import zlib
+
+import numpy as np
+import pytest
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from python_simulation_engine.shared import app_factory
+from python_simulation_engine.shared.app_factory import ArrayJSONResponse, create_service_app, negotiate_encoding
+
+PAYLOAD = {"values": [i * 1e-3 for i in range(5000)]}
+
+
+def make_client():
+    app = create_service_app("Test")
+
+    @app.get("/api/large")
+    def large():
+        return PAYLOAD
+
+    @app.get("/api/small")
+    def small():
+        return {"success": True}
+
+    @app.get("/api/stream")
+    def stream():
+        return StreamingResponse((f"{i}\n" for i in range(3)), media_type="application/x-ndjson")
+
+    @app.get("/api/binary")
+    def binary():
+        return StreamingResponse(iter([b"\0" * 4096]), media_type="application/octet-stream")
+
+    return TestClient(app)
+
+
+def test_negotiate_encoding_respects_quality():
+    assert negotiate_encoding("") is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip;q=0") is None
+    assert negotiate_encoding("deflate, gzip;q=0.5") == "gzip"
+    assert negotiate_encoding("*") in ("br", "gzip")
+
+
+def test_large_json_is_gzipped_and_small_is_not(monkeypatch):
+    monkeypatch.setattr(app_factory, "brotli", None)
+    client = make_client()
+
+    response = client.get("/api/large", headers={"Accept-Encoding": "br, gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(response.content) / 2
+    assert response.json() == PAYLOAD
+    assert response.headers["cache-control"].startswith("no-store")
+
+    assert "content-encoding" not in client.get("/api/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/api/large", headers={"Accept-Encoding": "identity"}).headers
+    assert "content-encoding" not in client.get("/api/binary", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_stream_is_flushed_per_chunk():
+    encoder = app_factory._GzipEncoder()
+    first = encoder.compress(b"0\n") + encoder.flush()
+    # Каждая часть декодируется сама, не дожидаясь конца потока
+    assert zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(first) == b"0\n"
+
+    response = make_client().get("/api/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == "0\n1\n2\n"
+
+
+def test_brotli_is_preferred_when_installed():
+    brotli = pytest.importorskip("brotli")
+    response = make_client().get("/api/large", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.json() == PAYLOAD
+
+
+def test_array_response_writes_numpy_directly():
+    app = create_service_app("Test")
+
+    @app.get("/api/array")
+    def array():
+        return ArrayJSONResponse({"values": np.arange(3.0), "strided": np.arange(6.0)[::2],
+                                  "scalar": np.float64(0.5), "nan": float("nan")})
+
+    payload = TestClient(app).get("/api/array").json()
+    assert payload == {"values": [0.0, 1.0, 2.0], "strided": [0.0, 2.0, 4.0], "scalar": 0.5, "nan": None}
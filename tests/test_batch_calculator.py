@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from python_simulation_engine.batch_calculator import BatchTrajectoryCalculator
+from python_simulation_engine.trajectory_calculator import RESULT_CHANNELS, TrajectoryCalculator
+
+from test_trajectory_calculator import make_state
+
+
+@pytest.mark.parametrize("robot_type", ["Декартовый", "Скара"])
+def test_batch_matches_scalar_engine(robot_type):
+    states = [
+        make_state(robot_type=robot_type, Kp=[kp, kp, 0, 0], length_1=0.5, length_2=0.5, masss_2=1,
+                   q1s_min=-1.57, q1s_max=1.57, q2s_min=-2, q2s_max=2)
+        for kp in (1, 5, 20)
+    ]
+
+    batch = BatchTrajectoryCalculator(states).calculate_trajectory()
+
+    for state, batch_calc in zip(states, batch):
+        calc = TrajectoryCalculator(state)
+        calc.calculate_trajectory()
+        for name in RESULT_CHANNELS:
+            np.testing.assert_allclose(getattr(batch_calc, name), getattr(calc, name), atol=1e-12)
+        assert batch_calc.avg_error_1 == pytest.approx(calc.avg_error_1)
+
+
+def test_batch_applies_output_decimation():
+    states = [make_state(Kp=[kp, kp, 0, 0], output_decimation=5) for kp in (1, 5)]
+
+    batch = BatchTrajectoryCalculator(states).calculate_trajectory()
+
+    for state, batch_calc in zip(states, batch):
+        calc = TrajectoryCalculator(state)
+        calc.calculate_trajectory()
+        np.testing.assert_array_equal(batch_calc.output_time_array, calc.output_time_array)
+        np.testing.assert_allclose(batch_calc.trajectory_q_1, calc.trajectory_q_1, atol=1e-12)
+
+
+def test_batch_records_only_requested_channels():
+    batch = BatchTrajectoryCalculator([make_state(), make_state(Kp=[2, 2, 0, 0])])
+
+    result = batch.robot_function([0.1], [0.2], [0.05], channels=("U_array_1",))
+
+    assert set(result) == {"output_time_array", "U_array_1", "U_array_2"}
+    assert result["U_array_1"].shape == (2, len(result["output_time_array"]))
+
+
+def test_batch_rejects_mixed_robot_types():
+    with pytest.raises(ValueError):
+        BatchTrajectoryCalculator([make_state(), make_state(robot_type="Скара")])
+    with pytest.raises(ValueError):
+        BatchTrajectoryCalculator([make_state(), make_state(output_decimation=2)])
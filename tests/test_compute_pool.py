@@ -0,0 +1,30 @@
+import asyncio
+import time
+
+import pytest
+
+from python_simulation_engine.shared import compute_pool
+from python_simulation_engine.trajectory_calculator import TrajectoryCalculator
+
+from test_trajectory_calculator import make_state
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(compute_pool, "POOL_WORKERS", 2)
+    compute_pool.shutdown()
+    compute_pool.start()
+    yield
+    compute_pool.shutdown()
+
+
+def test_calculation_runs_in_worker_process(pool):
+    calc = asyncio.run(compute_pool.run(compute_pool.calculate, TrajectoryCalculator(make_state())))
+
+    assert len(calc.output_time_array) > 0
+    assert len(calc.real_trajectory_x) == len(calc.output_time_array)
+
+
+def test_task_timeout(pool):
+    with pytest.raises(compute_pool.ComputeTimeout):
+        asyncio.run(compute_pool.run(time.sleep, 5, timeout=0.2))
@@ -0,0 +1,55 @@
+import numpy as np
+
+from python_simulation_engine.downsampling import downsample_indices, lttb_indices, minmax_indices
+
+
+def _lttb_reference(x, y, threshold):
+    """Классический LTTB для одного канала (Steinarsson, 2013)"""
+    n = len(x)
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        start, stop = int(i * every) + 1, int((i + 1) * every) + 1
+        next_start, next_stop = stop, min(int((i + 2) * every) + 1, n)
+        avg_x = sum(x[next_start:next_stop]) / (next_stop - next_start)
+        avg_y = sum(y[next_start:next_stop]) / (next_stop - next_start)
+        areas = [abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a])) for j in range(start, stop)]
+        a = start + int(np.argmax(areas))
+        selected.append(a)
+    return selected + [n - 1]
+
+
+def test_lttb_matches_reference_for_single_channel():
+    rng = np.random.default_rng(1)
+    x = np.linspace(0, 5, 1001)
+    y = np.sin(3 * x) + rng.normal(0, 0.1, len(x))
+
+    indices = lttb_indices(x, [y], 50)
+
+    assert indices.tolist() == _lttb_reference(x.tolist(), y.tolist(), 50)
+
+
+def test_downsampling_keeps_spike_of_any_channel():
+    t = np.linspace(0, 10, 20001)
+    smooth = np.sin(t)
+    spiky = np.cos(t) * 1e-3
+    spiky[12345] = 1.0  # Пик малого канала не теряется рядом с крупным
+    for algorithm in ("minmax", "lttb"):
+        indices = downsample_indices(algorithm, t, [smooth * 100, spiky], 200)
+        assert len(indices) <= 200
+        assert 12345 in indices
+        assert np.all(np.diff(indices) > 0)
+    assert 12345 not in downsample_indices("stride", t, [smooth, spiky], 200)
+
+
+def test_minmax_keeps_extremes_of_each_bucket_and_short_series():
+    values = np.array([0, 5, 1, 1, -3, 2, 2, 2, 7], dtype=float)
+    assert minmax_indices(np.arange(9), [values], 6).tolist() == [0, 1, 4, 5, 6, 8]
+    assert minmax_indices(np.arange(9), [values], 9).tolist() == list(range(9))
+
+
+def test_lttb_with_two_points_keeps_only_the_ends():
+    time = np.arange(100.0)
+    indices = downsample_indices("lttb", time, [np.sin(time)], 2)
+    np.testing.assert_array_equal(indices, [0, 99])
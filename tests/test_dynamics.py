@@ -0,0 +1,50 @@
+import math
+
+import numpy as np
+
+from python_simulation_engine.dynamics import (
+    ROBOT_DYNAMICS,
+    RobotDynamics,
+    excess_fluctuation_filter,
+    load_moments,
+    robot_dynamics,
+)
+from python_simulation_engine.trajectory_calculator import TrajectoryCalculator
+from test_trajectory_calculator import make_state
+
+LINKS = dict(length_1=0.5, length_2=0.3, moment_1=0.1, moment_2=0.2, masss_2=1.5,
+             momentc_1=0.1, momentc_2=0.2, massc_2=1.5, lengthc_1=0.5, lengthc_2=0.3,
+             momentcol_2=0.2, masscol_2=1.5, lengthcol_2=0.3, massd_1=2, massd_2=1)
+
+
+def test_strategies_match_vector_formulas():
+    rng = np.random.default_rng(0)
+    samples = rng.uniform(-2, 2, size=(200, 8))
+    samples[:10, 6:] = 0  # Нулевой момент двигателя — ветви без деления
+    for robot_type in [*ROBOT_DYNAMICS, "Неизвестный"]:
+        state = make_state(robot_type=robot_type, **LINKS)
+        dynamics = robot_dynamics(state)
+        for q_1, q_2, W_1, W_2, a_1, a_2, M_ed_1, M_ed_2 in samples:
+            args = [float(value) for value in (q_1, q_2, W_1, W_2, a_1, a_2)]
+            M = np.array(load_moments(robot_type, state, *map(np.float64, args)))
+            expected = excess_fluctuation_filter(robot_type, np.array([M_ed_1, M_ed_2]), M)
+            M1, M2 = dynamics.moments(*args, float(M_ed_1), float(M_ed_2))
+            assert (M1, M2) == tuple(expected)
+
+
+def test_unknown_robot_type_has_no_load():
+    dynamics = robot_dynamics(make_state(robot_type="Неизвестный"))
+    assert type(dynamics) is RobotDynamics
+    assert dynamics.moments(0.1, 0.2, 1.0, 2.0, 3.0, 4.0, 1.0, 1.0) == (0, 0)
+
+
+def test_diverged_step_gives_inf_instead_of_exception():
+    dynamics = robot_dynamics(make_state(robot_type="Колер", **LINKS))
+    M1, M2 = dynamics.moments(0.0, math.inf, 0.0, 1e200, 1.0, 1.0, 1.0, 1.0)
+    assert math.isnan(M1) or math.isinf(M1)
+
+
+def test_filter_method_delegates_to_strategy():
+    calc = TrajectoryCalculator(make_state(robot_type="Скара", **LINKS))
+    expected = excess_fluctuation_filter("Скара", np.array([1.0, -1.0]), np.array([-2.0, 0.3]))
+    assert calc.excess_fluctuation_filter(1.0, -1.0, -2.0, 0.3) == tuple(expected)
@@ -0,0 +1,44 @@
+import io
+
+import numpy as np
+import pytest
+
+from python_simulation_engine import export
+from python_simulation_engine.export import EXPORT_BATCH_ROWS, ExportUnavailable, export_columns
+
+
+def make_columns(n=EXPORT_BATCH_ROWS * 2 + 5):
+    time = np.arange(n) * 1e-3
+    return {"time": time, "I_1": np.sin(time), "U_1": np.cos(time)}
+
+
+def test_npz_round_trip_is_streamed_per_channel():
+    columns = make_columns()
+    chunks = list(export_columns("npz", columns))
+
+    assert len(chunks) == len(columns) + 1
+    with np.load(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.files == list(columns)
+        for name, values in columns.items():
+            np.testing.assert_array_equal(archive[name], values)
+
+
+def test_arrow_and_parquet_round_trip():
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    columns = make_columns()
+
+    table = pa.ipc.open_stream(b"".join(export_columns("arrow", columns))).read_all()
+    assert table.column_names == list(columns)
+    parquet = pq.ParquetFile(io.BytesIO(b"".join(export_columns("parquet", columns))))
+    assert parquet.metadata.num_row_groups == 3
+    for result in (table, parquet.read()):
+        for name, values in columns.items():
+            np.testing.assert_array_equal(result.column(name).to_numpy(), values)
+
+
+def test_pyarrow_formats_fail_before_streaming_without_pyarrow(monkeypatch):
+    monkeypatch.setattr(export, "pa", None)
+    with pytest.raises(ExportUnavailable):
+        export_columns("parquet", make_columns(10))
+    assert list(export_columns("npz", make_columns(10)))
@@ -0,0 +1,83 @@
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from python_simulation_engine import calculator_cache, job_queue, redis_client
+from python_simulation_engine.trajectory_calculator import TrajectoryCalculator
+
+from test_trajectory_calculator import make_state
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    monkeypatch.setattr(redis_client, "_redis_client", client)
+    monkeypatch.setattr(redis_client, "_binary_redis_client", fakeredis.FakeRedis(server=server))
+    calculator_cache.clear()
+    return client
+
+
+def test_worker_runs_queued_calculation(fake_redis):
+    redis_client.save_calculator("s1", TrajectoryCalculator(make_state()))
+
+    job_id = job_queue.enqueue_calculation("s1")
+    assert job_queue.get_job(job_id)["status"] == job_queue.STATUS_QUEUED
+
+    assert job_queue.run_worker(consumer="test", block_ms=10, max_jobs=1) == 1
+
+    job = job_queue.get_job(job_id)
+    assert job["status"] == job_queue.STATUS_DONE
+    calc = redis_client.load_calculator("s1")
+    assert job["result"]["trajectory_length"] == len(calc.output_time_array) > 0
+    assert fake_redis.xpending(job_queue.JOB_STREAM, job_queue.JOB_GROUP)["pending"] == 0
+
+
+def test_failed_job_records_error(fake_redis, monkeypatch):
+    def broken(session_id):
+        raise RuntimeError("boom")
+    monkeypatch.setitem(job_queue.JOB_HANDLERS, "calculate", broken)
+
+    job_id = job_queue.enqueue_calculation("s2")
+    job_queue.run_worker(consumer="test", block_ms=10, max_jobs=1)
+
+    job = job_queue.get_job(job_id)
+    assert job["status"] == job_queue.STATUS_FAILED
+    assert job["error"] == "boom"
+
+
+def test_running_job_is_not_claimed_by_other_workers(fake_redis, monkeypatch):
+    import time
+
+    monkeypatch.setattr(job_queue, "JOB_HEARTBEAT_S", 0.01)
+    claimed = []
+
+    def slow(session_id):
+        time.sleep(0.2)
+        claimed.extend(fake_redis.xautoclaim(job_queue.JOB_STREAM, job_queue.JOB_GROUP, "other", 100)[1])
+        return {}
+    monkeypatch.setitem(job_queue.JOB_HANDLERS, "calculate", slow)
+
+    job_id = job_queue.enqueue_calculation("s1")
+    job_queue.run_worker(consumer="test", block_ms=10, max_jobs=1)
+
+    assert claimed == []
+    assert job_queue.get_job(job_id)["status"] == job_queue.STATUS_DONE
+
+
+def test_job_delivered_too_many_times_is_failed(fake_redis, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_CLAIM_IDLE_MS", 0)
+    monkeypatch.setitem(job_queue.JOB_HANDLERS, "calculate", lambda session_id: pytest.fail("задание выполнено"))
+
+    job_queue.ensure_group(fake_redis)
+    job_id = job_queue.enqueue_calculation("s1")
+    # Воркеры брали задание и падали, не подтвердив его
+    fake_redis.xreadgroup(job_queue.JOB_GROUP, "crashed", {job_queue.JOB_STREAM: ">"})
+    for _ in range(job_queue.JOB_MAX_DELIVERIES - 1):
+        fake_redis.xautoclaim(job_queue.JOB_STREAM, job_queue.JOB_GROUP, "crashed", 0)
+
+    assert job_queue.run_worker(consumer="test", block_ms=10, max_jobs=1) == 1
+
+    job = job_queue.get_job(job_id)
+    assert job["status"] == job_queue.STATUS_FAILED
+    assert fake_redis.xpending(job_queue.JOB_STREAM, job_queue.JOB_GROUP)["pending"] == 0
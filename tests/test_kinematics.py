@@ -0,0 +1,77 @@
+import numpy as np
+
+from python_simulation_engine.kinematics import FORWARD_KINEMATICS, forward_kinematics, inverse_kinematics
+from python_simulation_engine.trajectory_calculator import TrajectoryCalculator, _coler_workspace_points
+from test_trajectory_calculator import make_state
+
+
+def test_forward_kinematics_on_arrays_matches_scalar_calls():
+    q1 = np.linspace(-1, 1, 7)
+    q2 = np.linspace(0.2, 0.8, 7)
+    for robot_type, forward in FORWARD_KINEMATICS.items():
+        x, y = forward_kinematics(robot_type, q1, q2, 0.5, 0.3)
+        for i in range(len(q1)):
+            x_i, y_i = forward(np.float64(q1[i]), np.float64(q2[i]), 0.5, 0.3)
+            assert x[i] == x_i and y[i] == y_i
+
+    assert len(forward_kinematics("Неизвестный", q1, q2, 0.5, 0.3)[0]) == 0
+
+
+def test_coordinate_transform_converts_cyclogram_points():
+    calc = TrajectoryCalculator(make_state(robot_type="Скара", length_1=0.5, length_2=0.3, q1=[0.1, 0.2, 0.3]))
+    calc.calculate_trajectory()
+    calc.coordinate_transform()
+
+    x, y = forward_kinematics("Скара", [0.1, 0.2, 0.3], calc.state.q2, 0.5, 0.3)
+    assert calc.cyclogram_real_x[:3] == x.tolist()
+    assert calc.cyclogram_real_y[:3] == y.tolist()
+    assert calc.cyclogram_real_x[3:] == [0] * 6
+
+
+def test_coler_workspace_grid_keeps_point_order():
+    state = make_state(robot_type="Колер")
+    x, y = _coler_workspace_points(state, 0.4)
+
+    heights = np.linspace(state.a2col_min, state.a2col_max, 50)
+    angles = np.linspace(state.q1col_min, state.q1col_max, 100)
+    assert len(x) == 5000
+    assert x[101] == -0.4 * np.sin(angles[1])
+    assert y[101] == heights[1] + 0.4 * np.cos(angles[1])
+
+
+def test_inverse_kinematics_inverts_forward_inside_workspace():
+    q1 = np.array([-0.5, 0.1, 0.7])
+    q2 = np.array([-1.0, -0.4, -0.2])
+    x, y = forward_kinematics("Скара", q1, q2, 0.5, 0.3)
+    q1_back, q2_back = inverse_kinematics("Скара", x, y, 0.5, 0.3)
+    np.testing.assert_allclose(forward_kinematics("Скара", q1_back, q2_back, 0.5, 0.3), (x, y), atol=1e-12)
+
+    heights, angles = np.array([0.1, 0.2]), np.array([0.3, -0.6])
+    x, y = forward_kinematics("Колер", heights, angles, 0, 0.4)
+    np.testing.assert_allclose(inverse_kinematics("Колер", x, y, 0, 0.4), (heights, angles))
+
+
+def test_inverse_kinematics_keeps_special_points():
+    x = np.array([0.0, 0.0, 0.3])
+    y = np.array([0.0, 0.4, 0.0])
+
+    q1, q2 = inverse_kinematics("Цилиндрический", x, y, 0.5, 0)
+    assert q1.tolist() == [-0.25 * np.pi, -np.arctan2(0.0, 0.4), -np.pi / 2]
+    np.testing.assert_allclose(q2, [-0.5, -0.1, -0.2])
+
+    # В начале координат arccos даёт NaN — угол считается нулевым
+    q1, q2 = inverse_kinematics("Скара", x[:1], y[:1], 0.5, 0.3)
+    assert q1.tolist() == [-np.pi / 2 + 0.25 * np.pi] and q2.tolist() == [0.0]
+    assert inverse_kinematics("Неизвестный", x, y, 0.5, 0.3) is None
+
+
+def test_contour_resolution_is_configurable():
+    calc = TrajectoryCalculator(make_state(robot_type="Колер", lengthcol_2=0.4))
+    calc.create_contour_circle(0.1, 0.2, 0.1, points=50, t_start=0, t_stop=5)
+    calc.reverse_coordinate_transform()
+
+    assert len(calc.x_contur) == len(calc.q1_contur_control) == 50
+    assert calc.t_contur_control[0] == 0 and calc.t_contur_control[-1] == 5
+    x, y = forward_kinematics("Колер", calc.q1_contur_control, calc.q2_contur_control, 0, 0.4)
+    np.testing.assert_allclose(x, calc.x_contur, atol=1e-12)
+    np.testing.assert_allclose(y, calc.y_contur, atol=1e-12)
@@ -0,0 +1,66 @@
+import pytest
+
+from python_simulation_engine import pid_tuning
+from python_simulation_engine.trajectory_calculator import TrajectoryCalculator
+
+from test_trajectory_calculator import make_state
+
+
+def tune(calc, objective="avg_error", workers=1, **ranges):
+    """Подбор так же, как в сервисе, но пакеты считаются в этом процессе"""
+    base, chunks = pid_tuning.plan_tuning(calc, workers=workers, **ranges)
+    return pid_tuning.tuning_result(objective, [pid_tuning.evaluate_chunk(base, chunk, objective) for chunk in chunks])
+
+
+def test_tuning_returns_grid_minimum():
+    calc = TrajectoryCalculator(make_state(t=[0.2], q1=[0.3], q2=[0.2]))
+
+    result = tune(calc, Kp=[(1, 20, 3), (5, 5, 1)], Ki=[(0, 0, 1)] * 2, Kd=[(0, 0, 1)] * 2)
+
+    assert result["evaluated"] == 3
+    assert [point["Kp"][0] for point in result["grid"]] == [1.0, 10.5, 20.0]
+    assert result["best"]["objective"] == min(point["objective"] for point in result["grid"])
+    assert calc.state.Kp == [5, 5, 0, 0]
+
+
+def test_grid_is_split_into_at_most_workers_chunks():
+    calc = TrajectoryCalculator(make_state())
+
+    base, chunks = pid_tuning.plan_tuning(calc, Kp=[(1, 20, 40), (5, 5, 1)], Ki=[(0, 0, 1)] * 2,
+                                          Kd=[(0, 0, 1)] * 2, workers=3)
+
+    assert len(chunks) == 3 and sum(len(chunk) for chunk in chunks) == 40
+    assert len(base.output_time_array) == 0
+
+
+def test_gain_grid_rejects_oversized_search():
+    with pytest.raises(ValueError):
+        pid_tuning.gain_grid([(0, 1, 100)] * 2, [(0, 1, 100)] * 2, [(0, 0, 1)] * 2)
+
+
+def test_unsettled_candidate_loses_avg_reg_time(monkeypatch):
+    import numpy as np
+
+    class FakeBatch:
+        # Малый Kp не входит в полосу: reg_time пуст, avg_reg_time = 0
+        def __init__(self, states, base):
+            self.states = states
+
+        def calculate_trajectory(self, channels):
+            calculators = []
+            for state in self.states:
+                calc = TrajectoryCalculator(state)
+                calc.output_time_array = np.linspace(0, 1, 11)
+                settled = [0.05] if state.Kp[0] > 1 else []
+                calc.reg_time_1, calc.reg_time_2 = settled, [0.05]
+                calc.avg_reg_time_1, calc.avg_reg_time_2 = (0.05 if settled else 0), 0.05
+                calculators.append(calc)
+            return calculators
+
+    monkeypatch.setattr(pid_tuning, "BatchTrajectoryCalculator", FakeBatch)
+    calc = TrajectoryCalculator(make_state(t=[0.5], q1=[0.3], q2=[0.2]))
+
+    result = tune(calc, objective="avg_reg_time", Kp=[(1, 20, 2), (5, 5, 1)], Ki=[(0, 0, 1)] * 2, Kd=[(0, 0, 1)] * 2)
+
+    assert [point["objective"] for point in result["grid"]] == [None, 0.1]
+    assert result["best"]["Kp"] == [20.0, 5.0]
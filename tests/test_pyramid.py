@@ -0,0 +1,63 @@
+import numpy as np
+
+from python_simulation_engine.pyramid import (
+    PYRAMID_FANOUT,
+    build_pyramid,
+    is_pyramid_of,
+    level_sizes,
+    pyramid_level,
+    range_envelope,
+    range_window,
+    window_time,
+)
+from python_simulation_engine.trajectory_calculator import PYRAMID_CHANNELS, TrajectoryCalculator
+from test_trajectory_calculator import make_state
+
+
+def test_pyramid_levels_hold_block_extremes():
+    values = np.random.default_rng(0).normal(size=1001)
+    pyramid = build_pyramid(values)
+
+    assert is_pyramid_of(pyramid, len(values)) and level_sizes(len(values))[-1] == 1
+    for level, size in enumerate(level_sizes(len(values)), 1):
+        block = PYRAMID_FANOUT**level
+        low, high = pyramid_level(pyramid, len(values), level)
+        assert len(low) == size
+        for j in (0, size // 2, size - 1):
+            np.testing.assert_array_equal([low[j], high[j]], [values[j * block:(j + 1) * block].min(),
+                                                              values[j * block:(j + 1) * block].max()])
+
+
+def test_range_query_reads_the_finest_level_that_fits():
+    time = np.arange(100000) * 1e-3
+    values = np.sin(time * 7)
+    values[54321] = 3.0
+    pyramid = build_pyramid(values)
+
+    window = range_window(time, 50.0, 60.0, 500)
+    envelope = range_envelope(None, pyramid, len(time), window)
+    assert window.level > 0 and len(envelope["max"]) <= 500
+    assert max(envelope["max"]) == 3.0
+    blocks = window_time(time, window)
+    assert blocks[0] == 50.0 and len(blocks) == len(envelope["min"])
+    # На уровень подробнее отрезок в points не укладывается
+    assert (60000 - 1) // (window.block // PYRAMID_FANOUT) + 1 - 50000 // (window.block // PYRAMID_FANOUT) > 500
+
+    zoomed = range_window(time, 54.3, 54.4, 500)
+    raw = range_envelope(values, None, len(time), zoomed)
+    assert zoomed.level == 0 and max(raw["max"]) == 3.0
+    np.testing.assert_array_equal(window_time(time, zoomed), time[54300:54401])
+
+    assert range_window(time, 200.0, 300.0, 500).first == range_window(time, 200.0, 300.0, 500).last
+
+
+def test_calculation_builds_pyramids_of_all_channels():
+    calc = TrajectoryCalculator(make_state())
+    calc.calculate_trajectory()
+    calc.coordinate_transform()
+
+    n = len(calc.output_time_array)
+    for name in PYRAMID_CHANNELS:
+        pyramid = getattr(calc, f"{name}_pyramid")
+        assert is_pyramid_of(pyramid, n)
+        np.testing.assert_array_equal(pyramid, build_pyramid(getattr(calc, name)))
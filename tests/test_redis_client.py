@@ -0,0 +1,287 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from python_simulation_engine import calculator_cache, redis_client
+from python_simulation_engine.trajectory_calculator import RobotState, TrajectoryCalculator
+from test_trajectory_calculator import make_state
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server)
+    monkeypatch.setattr(redis_client, "_binary_redis_client", client)
+    monkeypatch.setattr(redis_client, "_async_redis_client", fakeredis.FakeAsyncRedis(server=server))
+    calculator_cache.clear()
+    return client
+
+
+def make_calculated():
+    calc = TrajectoryCalculator(make_state())
+    calc.calculate_trajectory()
+    calc.coordinate_transform()
+    return calc
+
+
+def test_session_keeps_only_reference_to_calculated_results():
+    calc = make_calculated()
+
+    data = redis_client._unpack(redis_client._pack(redis_client._session_data(calc)))
+
+    assert data["result_key"] == calc.result_key
+    assert "trajectory_q_1" not in data
+    assert "state" not in data
+
+
+def test_state_is_stored_field_by_field():
+    state = make_state()
+    mapping = redis_client._state_mapping(state)
+
+    restored = RobotState(**{name: json.loads(value) for name, value in mapping.items()})
+
+    assert mapping["Kp"] == "[5, 5, 0, 0]"
+    assert restored == state
+
+
+def test_legacy_entry_with_inline_results_is_restored():
+    calc = make_calculated()
+    legacy = json.dumps({"state": {"robot_type": "Скара"}, **redis_client._results_data(calc)},
+                        default=redis_client._json_default)
+
+    data = redis_client._unpack(legacy)
+    restored = redis_client._build_calculator(RobotState(**data["state"]), data)
+
+    assert restored.state.robot_type == "Скара"
+    np.testing.assert_array_equal(restored.trajectory_q_1, calc.trajectory_q_1)
+    np.testing.assert_array_equal(restored.real_trajectory_x, calc.real_trajectory_x)
+    assert restored.avg_error_1 == calc.avg_error_1
+    assert restored.result_key is None
+
+
+def test_binary_format_is_compact_and_reads_legacy_json():
+    calc = make_calculated()
+    results = redis_client._results_data(calc)
+    legacy = json.dumps(results, default=redis_client._json_default)
+
+    payload = redis_client._pack(results)
+    restored = redis_client._unpack(payload)
+
+    assert payload.startswith(redis_client.FORMAT_MAGIC)
+    assert len(payload) * 3 < len(legacy)
+    assert restored["trajectory_q_1"].dtype == np.float64
+    np.testing.assert_array_equal(restored["M1_array"], calc.M1_array)
+    assert restored["error_1"] == calc.error_1
+    np.testing.assert_array_equal(redis_client._unpack(legacy)["speed_array_2"], calc.speed_array_2)
+
+
+def test_identical_configurations_share_one_result_entry(fake_redis):
+    redis_client.save_calculator("s1", make_calculated())
+    other = TrajectoryCalculator(make_state())
+
+    assert redis_client.load_result(other)
+    redis_client.save_calculator("s2", other)
+
+    assert len(fake_redis.keys("result:*")) == 1
+    np.testing.assert_array_equal(redis_client.load_calculator("s2").trajectory_q_1, other.trajectory_q_1)
+
+
+def test_update_writes_changed_state_fields_only(fake_redis):
+    calc = make_calculated()
+    redis_client.save_calculator("s1", calc)
+    fake_redis.hset("calculator:s1:state", "Ki", "[9, 9, 0, 0]")  # Не должно быть перезаписано
+
+    def mutator(calc):
+        calc.state.Kp = [7, 7, 0, 0]
+    updated = redis_client.update_calculator("s1", mutator)
+
+    assert len(updated.output_time_array) == 0
+    assert fake_redis.hget("calculator:s1:state", "Ki") == b"[9, 9, 0, 0]"
+    restored = redis_client.load_calculator("s1")
+    assert restored.state.Kp == [7, 7, 0, 0]
+    assert restored.result_key == calc.result_key
+    np.testing.assert_array_equal(restored.trajectory_q_1, calc.trajectory_q_1)
+
+
+def test_update_reads_only_state_hash(fake_redis, monkeypatch):
+    calc = make_calculated()
+    calc.x_contur = [1.0, 2.0]
+    redis_client.save_calculator("s1", calc)
+    calculator_cache.clear()
+
+    unpack, decoded = redis_client._unpack, []
+    monkeypatch.setattr(redis_client, "_unpack", lambda payload: decoded.append(payload) or unpack(payload))
+    redis_client.update_calculator("s1", lambda c: setattr(c.state, "Kp", [7, 7, 0, 0]))
+    redis_client.update_calculator("s1", lambda c: setattr(c, "y_contur", []))
+
+    assert decoded == []
+    restored = redis_client.load_calculator("s1")
+    assert restored.state.Kp == [7, 7, 0, 0]
+    assert restored.x_contur == [1.0, 2.0] and restored.y_contur == []
+    assert restored.result_key == calc.result_key
+
+
+def test_saving_results_keeps_changes_made_during_calculation(fake_redis):
+    import pickle
+
+    redis_client.save_calculator("s1", TrajectoryCalculator(make_state()))
+    # Калькулятор уходит в процесс пула, а пользователь тем временем меняет параметры
+    calc = pickle.loads(pickle.dumps(redis_client.load_calculator("s1")))
+    redis_client.update_calculator("s1", lambda c: setattr(c.state, "Kp", [7, 7, 0, 0]))
+    redis_client.update_calculator(
+        "s1", lambda c: c.create_contour_line(0.1, 0.5, 0.2, 0.6, points=10, t_start=0, t_stop=1))
+
+    calc.calculate_trajectory()
+    redis_client.save_calculator("s1", calc)
+
+    restored = redis_client.load_calculator("s1")
+    assert restored.state.Kp == [7, 7, 0, 0]
+    assert len(restored.x_contur) == 10
+    assert restored.result_key == calc.result_key
+
+
+def test_legacy_session_record_is_rewritten_field_by_field(fake_redis):
+    calc = make_calculated()
+    fake_redis.hset("calculator:s1:state", mapping=redis_client._state_mapping(calc.state))
+    fake_redis.set("calculator:s1", redis_client._pack({**redis_client._session_data(calc), "x_contur": [1.0]}))
+
+    restored = redis_client.load_calculator("s1")
+    assert restored.x_contur == [1.0]
+    redis_client.save_calculator("s1", restored)
+
+    assert not fake_redis.exists("calculator:s1")
+    assert redis_client.load_calculator("s1").x_contur == [1.0]
+
+
+def test_session_results_are_loaded_per_channel_on_access(fake_redis):
+    calc = make_calculated()
+    redis_client.save_calculator("s1", calc)
+
+    restored = redis_client.load_calculator("s1")
+    assert isinstance(restored, redis_client.StoredCalculator)
+    np.testing.assert_array_equal(restored.I_array_1, calc.I_array_1)
+    assert "I_array_2" not in vars(restored)
+
+    restored.load(["I_array_2", "avg_error_1"])
+    assert restored.avg_error_1 == calc.avg_error_1
+    assert restored.q_1_spline == calc.q_1_spline
+
+    plot_calc = restored.detach(["output_time_array"])
+    assert type(plot_calc) is redis_client.TrajectoryCalculator
+    assert len(plot_calc.output_time_array) == len(calc.output_time_array)
+    assert len(plot_calc.speed_array_1) == 0
+
+    # Пирамида хранится рядом с каналом и читается без него
+    pyramid = restored.detach(["I_array_2_pyramid"])
+    np.testing.assert_array_equal(pyramid.I_array_2_pyramid, calc.I_array_2_pyramid)
+    assert len(pyramid.I_array_2_pyramid) > 0 and len(pyramid.real_trajectory_x) == 0
+
+
+def test_pickled_session_calculator_carries_all_results(fake_redis):
+    import pickle
+
+    calc = make_calculated()
+    redis_client.save_calculator("s1", calc)
+
+    copy = pickle.loads(pickle.dumps(redis_client.load_calculator("s1")))
+
+    assert type(copy) is redis_client.TrajectoryCalculator
+    np.testing.assert_array_equal(copy.M2_array, calc.M2_array)
+    assert copy.result_key == calc.result_key
+
+
+def test_async_operations_share_storage_with_sync_ones(fake_redis):
+    calc = make_calculated()
+
+    async def scenario():
+        await redis_client.save_calculator_async("s1", calc)
+        await redis_client.update_calculator_async("s1", lambda c: setattr(c.state, "Kd", [1, 1, 0, 0]))
+        restored = await redis_client.load_calculator_async("s1")
+        await redis_client.load_channels_async(restored, ["U_array_1", "error_2"])
+        return restored
+
+    restored = asyncio.run(scenario())
+
+    assert {"U_array_1", "error_2"} <= set(vars(restored))
+    np.testing.assert_array_equal(restored.U_array_1, calc.U_array_1)
+    assert restored.error_2 == calc.error_2
+    assert redis_client.load_calculator("s1").state.Kd == [1, 1, 0, 0]
+
+
+def test_repeated_loads_are_served_from_process_cache(fake_redis, monkeypatch):
+    calc = make_calculated()
+    redis_client.save_calculator("s1", calc)
+    first = redis_client.load_calculator("s1")
+    first.load(["I_array_1"])
+
+    decoded = []
+    monkeypatch.setattr(redis_client, "_unpack", lambda payload: decoded.append(payload))
+    second = redis_client.load_calculator("s1")
+    second.state.Kp = [1, 1, 0, 0]
+
+    assert second is not first
+    assert second.I_array_1 is first.I_array_1
+    assert decoded == []
+    assert redis_client.load_calculator("s1", results=False).state.Kp == [5, 5, 0, 0]
+
+
+def test_process_cache_is_invalidated_by_writes_of_other_processes(fake_redis):
+    redis_client.save_calculator("s1", TrajectoryCalculator(make_state()))
+    assert redis_client.load_calculator("s1").state.Kp == [5, 5, 0, 0]
+
+    # Другой процесс изменил сессию: его кэш нам не виден, версия в Redis — видна
+    fake_redis.hset("calculator:s1:state", "Kp", "[2, 2, 0, 0]")
+    fake_redis.set("calculator:s1:version", "other")
+
+    assert redis_client.load_calculator("s1").state.Kp == [2, 2, 0, 0]
+
+
+def test_process_cache_is_not_reused_after_session_is_recreated(fake_redis, monkeypatch):
+    process_a, process_b = calculator_cache.OrderedDict(), calculator_cache.OrderedDict()
+    monkeypatch.setattr(calculator_cache, "_entries", process_a)
+    redis_client.save_calculator("s1", TrajectoryCalculator(make_state()))
+    assert redis_client.load_calculator("s1").state.Kp == [5, 5, 0, 0]
+    assert "s1" in process_a
+
+    # Другой процесс удаляет сессию и создаёт её заново
+    monkeypatch.setattr(calculator_cache, "_entries", process_b)
+    assert redis_client.delete_calculator("s1")
+    redis_client.save_calculator("s1", TrajectoryCalculator(make_state(Kp=[2, 2, 0, 0])))
+
+    # Кэш первого процесса хранит прежнюю сессию, но версия уже другая
+    monkeypatch.setattr(calculator_cache, "_entries", process_a)
+    assert redis_client.load_calculator("s1").state.Kp == [2, 2, 0, 0]
+
+
+def test_process_cache_is_bounded_by_array_bytes(monkeypatch):
+    monkeypatch.setattr(calculator_cache, "CALCULATOR_CACHE_BYTES", 3 * 8 * 1000)
+    calculator_cache.clear()
+    for index in range(4):
+        calc = TrajectoryCalculator()
+        calc.output_time_array = np.zeros(1000)
+        calculator_cache.put(f"s{index}", b"1", calc)
+
+    assert calculator_cache.get("s0", b"1") is None
+    assert calculator_cache.get("s3", b"1") is not None
+    assert calculator_cache.get("s3", b"2") is None
+    calculator_cache.clear()
+
+
+def test_recalculation_of_stored_session_resumes_from_checkpoint(fake_redis):
+    from python_simulation_engine.shared.simulation_core import load_checkpoints
+
+    calc = make_calculated()
+    redis_client.save_calculator("s1", calc)
+    redis_client.update_calculator("s1", lambda c: setattr(c.state, "q2", [0.3, 0.2, 0.4]))
+
+    restored = redis_client.load_calculator("s1")
+    assert load_checkpoints(restored)
+    restored.calculate_trajectory()
+
+    full = TrajectoryCalculator(make_state(q2=[0.3, 0.2, 0.4]))
+    full.calculate_trajectory()
+    np.testing.assert_array_equal(restored.trajectory_q_2, full.trajectory_q_2)
+    assert restored.result_key == full.result_key
@@ -1,8 +1,13 @@
 import importlib
 from types import SimpleNamespace
 
+import numpy as np
+import pytest
+
 from fastapi.testclient import TestClient
 
+from python_simulation_engine.models import AllDataResponse
+
 simulation_app_module = importlib.import_module("python_simulation_engine.services.simulation_service.app")
 
 
@@ -53,6 +58,7 @@ class FakeCalc:
         self.avg_reg_time_2 = 0
         self.median_reg_time_1 = 0
         self.median_reg_time_2 = 0
+        self.result_key = None
 
     def calculate_trajectory(self):
         self.output_time_array = [0.0, 1.0]
@@ -63,6 +69,9 @@ class FakeCalc:
     def generate_plot(self, plot_type):
         return f"plot:{plot_type}"
 
+    def plot_inputs_key(self):
+        return "inputs"
+
     def get_results_summary(self):
         return {
             "robot_type": self.state.robot_type,
@@ -76,13 +85,39 @@ class FakeCalc:
         }
 
 
-def make_client(calc):
-    simulation_app_module.get_calculator = lambda session_id="default": calc
-    simulation_app_module.save_calculator = lambda session_id, calc_obj: None
-    return TestClient(simulation_app_module.app)
+@pytest.fixture
+def make_client(monkeypatch):
+    """Клиент сервиса, где хранилище сессий подменено калькулятором calc;
+    подмены снимаются после теста"""
+    def make(calc):
+        async def get_calculator_async(session_id="default", results=True):
+            return calc
+
+        async def save_calculator_async(session_id, calc_obj):
+            return None
+
+        async def load_cached_result_async(calc_obj):
+            return False
+
+        async def load_checkpoints_async(calc_obj):
+            return False
+
+        async def update_calculator_async(session_id, mutator):
+            mutator(calc)
+            return calc
 
+        # FakeCalc не передаётся в процессы пула — считаем в потоках
+        monkeypatch.setattr(simulation_app_module.compute_pool, "POOL_WORKERS", 0)
+        monkeypatch.setattr(simulation_app_module, "get_calculator_async", get_calculator_async)
+        monkeypatch.setattr(simulation_app_module, "save_calculator_async", save_calculator_async)
+        monkeypatch.setattr(simulation_app_module, "load_cached_result_async", load_cached_result_async)
+        monkeypatch.setattr(simulation_app_module, "load_checkpoints_async", load_checkpoints_async)
+        monkeypatch.setattr(simulation_app_module, "update_calculator_async", update_calculator_async)
+        return TestClient(simulation_app_module.app)
+    return make
 
-def test_set_robot_type_updates_calculator_state():
+
+def test_set_robot_type_updates_calculator_state(make_client):
     calc = FakeCalc()
     client = make_client(calc)
 
@@ -92,7 +127,16 @@ def test_set_robot_type_updates_calculator_state():
     assert calc.state.robot_type == "Декартовый"
 
 
-def test_calculate_returns_summary():
+def test_contour_points_are_bounded(make_client):
+    client = make_client(FakeCalc())
+    contour = {"x1": 0, "x2": 1, "y1": 0, "y2": 1}
+
+    response = client.post("/api/robot/contour/line", json={**contour, "points": 10**9})
+
+    assert response.status_code == 422
+
+
+def test_calculate_returns_summary(make_client):
     calc = FakeCalc()
     calc.state.robot_type = "Декартовый"
     client = make_client(calc)
@@ -106,7 +150,7 @@ def test_calculate_returns_summary():
     assert payload["trajectory_length"] == 2
 
 
-def test_robot_state_reflects_existing_configuration():
+def test_robot_state_reflects_existing_configuration(make_client):
     calc = FakeCalc()
     calc.state.Kp = [1, 0]
     calc.state.J = [0.1, 0.2]
@@ -122,7 +166,7 @@ def test_robot_state_reflects_existing_configuration():
     assert payload["motors_configured"] is True
 
 
-def test_plot_endpoint_returns_generated_image():
+def test_plot_endpoint_returns_generated_image(make_client):
     calc = FakeCalc()
     calc.output_time_array = [0.0]
     client = make_client(calc)
@@ -133,3 +177,268 @@ def test_plot_endpoint_returns_generated_image():
     payload = response.json()
     assert payload["plot_type"] == "speed"
     assert payload["image_base64"] == "plot:speed"
+
+
+def test_plot_endpoint_reuses_cached_image_for_same_results(make_client):
+    calc = FakeCalc()
+    calc.output_time_array = [0.0]
+    calc.result_key = "abc"
+    renders = []
+    calc.generate_plot = lambda plot_type: renders.append(plot_type) or f"plot:{plot_type}"
+    simulation_app_module.plot_cache.clear()
+    client = make_client(calc)
+
+    first = client.get("/api/robot/plot/current")
+    second = client.get("/api/robot/plot/current")
+    calc.result_key = "def"
+    third = client.get("/api/robot/plot/current")
+
+    assert first.json()["image_base64"] == second.json()["image_base64"] == third.json()["image_base64"]
+    assert renders == ["current", "current"]
+
+
+def test_plot_key_covers_overlays_outside_results():
+    from python_simulation_engine.trajectory_calculator import TrajectoryCalculator
+    from test_trajectory_calculator import make_state
+
+    calc = TrajectoryCalculator(make_state(type_of_control="Контурное"))
+    calc.create_contour_line(0.1, 0.5, 0.2, 0.6, points=10, t_start=0, t_stop=1)
+    calc.result_key = calc.simulation_key()
+    key = simulation_app_module.plot_cache.plot_key(calc, "decart_plane")
+
+    # Контур на графике изменился, а результаты расчёта — нет
+    calc.x_contur = [x + 1e-3 for x in calc.x_contur]
+
+    assert calc.simulation_key() == calc.result_key
+    assert simulation_app_module.plot_cache.plot_key(calc, "decart_plane") != key
+
+
+def test_pid_tune_applies_best_gains(make_client, monkeypatch):
+    from python_simulation_engine.trajectory_calculator import TrajectoryCalculator
+    from test_trajectory_calculator import make_state
+
+    calc = TrajectoryCalculator(make_state(t=[0.2], q1=[0.3], q2=[0.2]))
+    client = make_client(calc)
+    offloaded = []
+    run = simulation_app_module.compute_pool.run
+    monkeypatch.setattr(simulation_app_module.compute_pool, "run",
+                        lambda fn, *args: offloaded.append(fn) or run(fn, *args))
+
+    response = client.post("/api/robot/pid/tune", json={
+        "Kp": [{"min": 1, "max": 20, "steps": 2}, {"min": 5, "max": 5}],
+        "Ki": [{}, {}],
+        "Kd": [{}, {}],
+        "apply": True,
+    })
+
+    assert response.status_code == 200
+    payload = response.json()
+    assert payload["evaluated"] == 2
+    assert calc.state.Kp[:2] == payload["best"]["Kp"]
+    assert offloaded == [simulation_app_module.pid_tuning.evaluate_chunk]
+
+
+def test_pid_tune_rejects_adaptive_sessions(make_client):
+    from python_simulation_engine.trajectory_calculator import TrajectoryCalculator
+    from test_trajectory_calculator import make_state
+
+    calc = TrajectoryCalculator(make_state(integration_method="Radau"))
+    client = make_client(calc)
+
+    response = client.post("/api/robot/pid/tune", json={"Kp": [{}, {}], "Ki": [{}, {}], "Kd": [{}, {}]})
+
+    assert response.status_code == 400
+    assert "euler" in response.json()["detail"]
+
+
+def test_pid_tune_does_not_apply_when_no_candidate_qualifies(make_client, monkeypatch):
+    from python_simulation_engine.trajectory_calculator import TrajectoryCalculator
+    from test_trajectory_calculator import make_state
+
+    calc = TrajectoryCalculator(make_state())
+    client = make_client(calc)
+    point = {"Kp": [1.0, 1.0], "Ki": [0.0, 0.0], "Kd": [0.0, 0.0], "avg_error_1": 0, "avg_error_2": 0,
+             "avg_reg_time_1": 0, "avg_reg_time_2": 0, "objective": None}
+    monkeypatch.setattr(simulation_app_module.pid_tuning, "evaluate_chunk", lambda *args: [point])
+
+    response = client.post("/api/robot/pid/tune", json={
+        "Kp": [{}, {}], "Ki": [{}, {}], "Kd": [{}, {}], "objective": "avg_reg_time", "apply": True,
+    })
+
+    assert response.status_code == 422
+    assert calc.state.Kp == [5, 5, 0, 0]
+
+
+def test_calculate_stream_yields_segment_chunks(make_client):
+    import json
+
+    from python_simulation_engine.trajectory_calculator import TrajectoryCalculator
+    from test_trajectory_calculator import make_state
+
+    calc = TrajectoryCalculator(make_state())
+    client = make_client(calc)
+
+    response = client.post("/api/robot/calculate/stream")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["type"] for line in lines] == ["start", "chunk", "chunk", "chunk", "done"]
+    chunks = lines[1:-1]
+    time = [value for chunk in chunks for value in chunk["time"]]
+    assert time == calc.output_time_array.tolist()
+    assert sum(len(chunk["electrical"]["U_1"]) for chunk in chunks) == lines[0]["points"]
+    assert lines[-1]["trajectory_length"] == len(time)
+
+
+def test_calculate_stream_serves_stored_result_without_calculation(make_client, monkeypatch):
+    import json
+
+    from python_simulation_engine.trajectory_calculator import TrajectoryCalculator
+    from test_trajectory_calculator import make_state
+
+    stored = TrajectoryCalculator(make_state())
+    stored.calculate_trajectory()
+    calc = TrajectoryCalculator(make_state())
+    client = make_client(calc)
+
+    async def load_cached_result_async(calc_obj):
+        for name in simulation_app_module.RESULT_CHANNELS:
+            setattr(calc_obj, name, getattr(stored, name))
+        return True
+
+    def calculate_stream(*args):
+        raise AssertionError("готовый результат не пересчитывается")
+
+    monkeypatch.setattr(simulation_app_module, "load_cached_result_async", load_cached_result_async)
+    monkeypatch.setattr(simulation_app_module.compute_pool, "calculate_stream", calculate_stream)
+
+    lines = [json.loads(line) for line in client.post("/api/robot/calculate/stream").text.splitlines()]
+
+    assert [line["type"] for line in lines] == ["start", "chunk", "done"]
+    assert lines[1]["time"] == stored.output_time_array.tolist()
+    assert lines[0]["points"] == len(lines[1]["electrical"]["I_1"])
+
+
+def test_calculate_in_background_returns_job_id(make_client, monkeypatch):
+    calc = FakeCalc()
+    client = make_client(calc)
+    jobs = {}
+
+    def enqueue_calculation(session_id):
+        jobs["job-1"] = {"job_id": "job-1", "status": "queued", "session_id": session_id}
+        return "job-1"
+
+    monkeypatch.setattr(simulation_app_module.job_queue, "enqueue_calculation", enqueue_calculation)
+    monkeypatch.setattr(simulation_app_module.job_queue, "get_job", jobs.get)
+
+    response = client.post("/api/robot/calculate?background=true&session_id=s1")
+
+    assert response.status_code == 200
+    assert response.json() == {"success": True, "job_id": "job-1", "status": "queued"}
+    assert calc.output_time_array == []
+    status = client.get("/api/robot/jobs/job-1").json()
+    assert status["status"] == "queued" and status["session_id"] == "s1"
+    assert client.get("/api/robot/jobs/missing").status_code == 404
+
+
+def test_all_data_downsampling_keeps_current_spike(make_client, monkeypatch):
+    calc = FakeCalc()
+    client = make_client(calc)
+    n = 50001
+    calc.output_time_array = [i * 1e-3 for i in range(n)]
+    for name in ("trajectory_q_1", "trajectory_q_2", "real_trajectory_x", "real_trajectory_y",
+                 *simulation_app_module.ELECTRICAL_CHANNELS.values(),
+                 *simulation_app_module.MECHANICAL_CHANNELS.values()):
+        setattr(calc, name, [0.0] * n)
+    calc.I_array_1[31337] = 5.0
+    calc.state.q1 = calc.state.q2 = [0] * 9
+
+    payload = client.get("/api/robot/data/all?max_points=500").json()
+    # Ответ пишется мимо AllDataResponse, но соответствует ей
+    AllDataResponse.model_validate(payload)
+    schema = client.get("/openapi.json").json()["paths"]["/api/robot/data/all"]["get"]["responses"]["200"]
+    assert schema["content"]["application/json"]["schema"]["$ref"].endswith("/AllDataResponse")
+    electrical = payload["electrical"]
+    assert len(electrical["time"]) <= 500 and len(electrical["I_1"]) == len(electrical["time"])
+    assert max(electrical["I_1"]) == 5.0
+    assert electrical["time"][electrical["I_1"].index(5.0)] == calc.output_time_array[31337]
+
+    lttb = client.get("/api/robot/data/all?max_points=500&algorithm=lttb").json()
+    assert max(lttb["electrical"]["I_1"]) == 5.0 and len(lttb["mechanical"]["time"]) == 500
+    stride = client.get("/api/robot/data/all?algorithm=stride").json()
+    assert len(stride["trajectory"]["q1"]) == 10001
+    assert client.get("/api/robot/data/all?max_points=1").status_code == 422
+
+
+def test_cold_all_data_is_calculated_in_compute_pool(make_client, monkeypatch):
+    calc = FakeCalc()
+    client = make_client(calc)
+    calc.state.q1 = calc.state.q2 = [0] * 9
+    offloaded = []
+
+    def calculate(calc_obj):
+        offloaded.append(calc_obj)
+        calc_obj.output_time_array = np.arange(3) * 1e-3
+        for name in simulation_app_module.DATA_CHANNELS[1:]:
+            if hasattr(calc_obj, name):
+                setattr(calc_obj, name, np.zeros(3))
+        return calc_obj
+
+    monkeypatch.setattr(simulation_app_module.compute_pool, "calculate", calculate)
+    monkeypatch.setattr(simulation_app_module, "detached", lambda calc_obj, names: calc_obj)
+
+    payload = client.get("/api/robot/data/all").json()
+
+    assert offloaded == [calc]
+    assert payload["trajectory"]["time"] == [0.0, 0.001, 0.002]
+
+
+def test_range_data_reads_pyramid_level(make_client, monkeypatch):
+    from python_simulation_engine.pyramid import build_pyramid
+
+    calc = FakeCalc()
+    client = make_client(calc)
+    n = 100000
+    calc.output_time_array = np.arange(n) * 1e-3
+    for name in simulation_app_module.RANGE_CHANNELS.values():
+        setattr(calc, name, np.zeros(n))
+        setattr(calc, f"{name}_pyramid", build_pyramid(np.zeros(n)))
+    calc.I_array_1[70123] = -4.0
+    calc.I_array_1_pyramid = build_pyramid(calc.I_array_1)
+    # Устаревшая пирамида строится заново по каналу
+    calc.U_array_1[70123] = 2.0
+    calc.U_array_1_pyramid = np.empty(0)
+
+    payload = client.get("/api/robot/data/range?t0=60&t1=80&points=300&channels=I_1&channels=U_1").json()
+    assert set(payload["channels"]) == {"I_1", "U_1"}
+    assert payload["level"] > 0 and len(payload["time"]) <= 300
+    assert min(payload["channels"]["I_1"]["min"]) == -4.0
+    assert max(payload["channels"]["U_1"]["max"]) == 2.0
+
+    zoomed = client.get("/api/robot/data/range?t0=70.1&t1=70.2&channels=I_1").json()
+    assert zoomed["level"] == 0 and zoomed["block"] == 1
+    assert zoomed["channels"]["I_1"]["min"] == zoomed["channels"]["I_1"]["max"]
+    assert client.get("/api/robot/data/range?t0=1&t1=2&channels=bogus").status_code == 400
+    assert client.get("/api/robot/data/range?t0=2&t1=1").status_code == 400
+
+
+def test_export_streams_full_resolution_columns(make_client):
+    import io
+
+    calc = FakeCalc()
+    client = make_client(calc)
+    n = 20001
+    calc.output_time_array = np.arange(n) * 1e-3
+    calc.I_array_1 = np.sin(calc.output_time_array)
+    calc.q_error_array_2 = np.cos(calc.output_time_array)
+
+    response = client.get("/api/robot/data/export?format=npz&channels=I_1&channels=q_error_2&channels=time")
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == "attachment; filename=trajectory.npz"
+    with np.load(io.BytesIO(response.content)) as archive:
+        assert archive.files == ["time", "I_1", "q_error_2"]
+        np.testing.assert_array_equal(archive["I_1"], calc.I_array_1)
+        np.testing.assert_array_equal(archive["q_error_2"], calc.q_error_array_2)
+    assert client.get("/api/robot/data/export?channels=bogus").status_code == 400
+    assert client.get("/api/robot/data/export?format=csv").status_code == 422
@@ -0,0 +1,142 @@
+import numpy as np
+
+from python_simulation_engine.trajectory_calculator import RESULT_CHANNELS, RobotState, TrajectoryCalculator
+
+
+def make_state(**overrides):
+    params = dict(
+        robot_type="Декартовый",
+        Kp=[5, 5, 0, 0],
+        Ki=[0.5, 0.5, 0, 0],
+        Kd=[0.2, 0.2, 0, 0],
+        J=[1.0, 1.0],
+        T_e=[0.002, 0.002],
+        Umax=[24, 24],
+        Fi=[1, 1],
+        Ce=[1, 1],
+        Ra=[1, 1],
+        Cm=[1, 1],
+        t=[0.1, 0.2, 0.3],
+        q1=[0.1, 0.2, 0.3],
+        q2=[0.3, 0.2, 0.1],
+        x_max=1,
+        y_max=1,
+        massd_1=1,
+        massd_2=1,
+        momentd_1=0.1,
+    )
+    params.update(overrides)
+    return RobotState(**params)
+
+
+def test_robot_function_fills_preallocated_float64_buffer():
+    calc = TrajectoryCalculator(make_state())
+
+    result = calc.robot_function(calc.state.q1, calc.state.q2, calc.state.t)
+
+    assert tuple(result) == RESULT_CHANNELS
+    time = result["output_time_array"]
+    assert time.dtype == np.float64
+    assert time[0] == 0 and time[-1] <= 0.3
+    for values in result.values():
+        assert values.shape == time.shape
+        assert np.shares_memory(values.base, time.base)
+
+
+def test_calculate_trajectory_stores_arrays_and_quality():
+    calc = TrajectoryCalculator(make_state())
+
+    calc.calculate_trajectory()
+    calc.coordinate_transform()
+
+    assert isinstance(calc.trajectory_q_1, np.ndarray)
+    assert len(calc.real_trajectory_x) == len(calc.output_time_array)
+    assert len(calc.error_1) == 3
+    assert calc.avg_error_1 >= 0
+
+
+def test_output_decimation_keeps_every_kth_step():
+    full = TrajectoryCalculator(make_state()).robot_function([0.1, 0.2, 0.3], [0.3, 0.2, 0.1], [0.1, 0.2, 0.3])
+    calc = TrajectoryCalculator(make_state(output_decimation=7))
+
+    result = calc.robot_function(calc.state.q1, calc.state.q2, calc.state.t)
+
+    for name in RESULT_CHANNELS:
+        np.testing.assert_array_equal(result[name], full[name][::7])
+
+
+def test_integration_dt_sets_step():
+    calc = TrajectoryCalculator(make_state(integration_dt=5e-4))
+
+    result = calc.robot_function(calc.state.q1, calc.state.q2, calc.state.t)
+
+    np.testing.assert_allclose(np.diff(result["output_time_array"][:10]), 5e-4)
+
+
+def test_simulation_key_ignores_irrelevant_fields():
+    key = TrajectoryCalculator(make_state()).simulation_key()
+
+    assert TrajectoryCalculator(make_state(Kp=[5.0, 5.0, 0.0, 0.0])).simulation_key() == key
+    assert TrajectoryCalculator(make_state(q3=[1, 2, 3], line_speed=5)).simulation_key() == key
+    assert TrajectoryCalculator(make_state(Kp=[6, 5, 0, 0])).simulation_key() != key
+
+
+def test_calculate_trajectory_sets_result_key():
+    calc = TrajectoryCalculator(make_state())
+    assert calc.result_key is None
+
+    calc.calculate_trajectory()
+
+    assert calc.result_key == calc.simulation_key()
+
+
+def test_recalculation_resumes_from_checkpoint_of_unchanged_segments():
+    calc = TrajectoryCalculator(make_state(output_decimation=3))
+    calc.calculate_trajectory()
+    calc.state.q1 = [0.1, 0.2, 0.5]
+
+    assert calc.resume_segment() == 2
+    calc.calculate_trajectory()
+
+    full = TrajectoryCalculator(make_state(output_decimation=3, q1=[0.1, 0.2, 0.5]))
+    full.calculate_trajectory()
+    for name in RESULT_CHANNELS:
+        np.testing.assert_array_equal(getattr(calc, name), getattr(full, name))
+    assert calc.checkpoints == full.checkpoints
+    assert calc.error_1 == full.error_1
+
+
+def test_checkpoints_are_not_reused_after_dynamics_change():
+    calc = TrajectoryCalculator(make_state())
+    calc.calculate_trajectory()
+    calc.state.Kp = [7, 7, 0, 0]
+
+    assert calc.resume_segment() == 0
+
+
+def _quality_by_scan(q, t, trajectory, times):
+    """Эталон: полный перебор отсчётов для каждой точки"""
+    real = [int(np.argmin(np.abs(times - target))) for target in t]
+    errors = [float(abs(q[i] - trajectory[index])) for i, index in enumerate(real)]
+    regulation = []
+    for target, index in zip(t, real):
+        value = trajectory[index]
+        for sample, time in enumerate(times):
+            current = trajectory[sample]
+            if time >= target and (abs(current - value) <= 0.05 * abs(value) if value != 0 else current == 0):
+                regulation.append(float(time - target))
+                break
+    return errors, regulation
+
+
+def test_quality_of_regulation_matches_full_scan():
+    calc = TrajectoryCalculator()
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        times = np.cumsum(rng.choice([0.0, 0.1, 0.25], size=rng.integers(1, 40)))
+        trajectory = rng.choice([0.0, 1.0, 1.02, -1.0, 2.0], size=len(times))
+        # Моменты посередине между отсчётами проверяют выбор первого из равноудалённых
+        t = list(rng.choice(np.concatenate([times, times + 0.05, [-1.0, 100.0]]), size=rng.integers(1, 10)))
+        q = list(rng.normal(size=len(t)))
+
+        assert calc.quality_of_regulation(q, t, trajectory, times) == _quality_by_scan(q, t, trajectory, times)